@@ -0,0 +1,88 @@
+import random
+from datetime import date, timedelta
+
+from modules.db_handler import add_tasks
+
+# Weighted distributions, roughly matching a personal task list
+CATEGORIES = {
+    "Work": 30, "Personal": 20, "Development": 15, "Home": 12,
+    "Careers Related": 8, "Research": 7, "Setup": 4, "Configuration": 4,
+}
+PRIORITIES = {"Medium": 50, "Low": 30, "High": 20}
+STATUSES = {"Done": 55, "To Do": 30, "Doing": 15}
+RECURRENCES = {"none": 94, "daily": 2, "weekly": 3, "monthly": 1}
+
+WORDS = ("review", "update", "submit", "resume", "report", "deploy", "fix", "plan", "call", "email",
+         "invoice", "backup", "migrate", "design", "test", "refactor", "meeting", "budget", "draft", "docs")
+
+
+def _weighted(rng, distribution, count):
+    return rng.choices(list(distribution), weights=list(distribution.values()), k=count)
+
+
+def generate_tasks(count, seed=42, subtask_ratio=0.3, max_depth=8, dependency_ratio=0.1, chain_length=5):
+    """Yield synthetic task dictionaries for add_tasks.
+
+    IDs are assumed to be assigned 1..count in order (an empty database), which lets
+    parent and dependency references point at earlier rows without a lookup.
+
+    :param count: Number of tasks to generate
+    :param seed: Random seed, so every run produces the same data set
+    :param subtask_ratio: Share of tasks that are subtasks of an earlier task
+    :param max_depth: Deepest subtask level generated
+    :param dependency_ratio: Share of tasks that belong to a dependency chain
+    :param chain_length: Length of generated dependency chains
+    """
+    rng = random.Random(seed)
+    base_date = date(2024, 1, 1)
+    depth = [0] * (count + 1)
+    chain_every = max(1, round(1 / dependency_ratio)) if dependency_ratio else count + 1
+    batch = 10000
+
+    for start in range(1, count + 1, batch):
+        size = min(batch, count - start + 1)
+        categories = _weighted(rng, CATEGORIES, size)
+        priorities = _weighted(rng, PRIORITIES, size)
+        statuses = _weighted(rng, STATUSES, size)
+        recurrences = _weighted(rng, RECURRENCES, size)
+
+        for offset in range(size):
+            task_id = start + offset
+            parent_id = 0
+            if task_id > 1 and rng.random() < subtask_ratio:
+                # Prefer recent parents so deep chains form, not just wide trees
+                candidate = max(1, task_id - rng.randint(1, 50))
+                if depth[candidate] < max_depth:
+                    parent_id = candidate
+                    depth[task_id] = depth[candidate] + 1
+
+            # Every n-th block of chain_length consecutive tasks forms a dependency chain
+            dependencies = "[]"
+            if task_id > 1 and task_id % chain_length and (task_id // chain_length) % chain_every == 0:
+                dependencies = f"[{task_id - 1}]"
+
+            due_date = (base_date + timedelta(days=rng.randint(0, 730))).isoformat() if rng.random() < 0.8 else None
+            title_words = rng.sample(WORDS, 3)
+            yield {
+                "title": " ".join(title_words).capitalize() + f" #{task_id}",
+                "description": " ".join(rng.choices(WORDS, k=rng.randint(0, 30))) or None,
+                "category": categories[offset],
+                "priority": priorities[offset],
+                "status": statuses[offset],
+                "due_date": due_date,
+                "time": f"{rng.randint(7, 20):02d}:{rng.choice(('00', '15', '30', '45'))}" if due_date and rng.random() < 0.5 else None,
+                "parent_id": parent_id,
+                "recurrence": recurrences[offset] if due_date else "none",
+                "dependencies": dependencies,
+            }
+
+
+def populate(count, seed=42, **options):
+    """Fill an empty database with `count` synthetic tasks through the bulk insert path.
+
+    :return: The list of created task IDs
+    """
+    task_ids = add_tasks(generate_tasks(count, seed=seed, **options), chunk_size=5000)
+    if task_ids and task_ids[0] != 1:
+        raise RuntimeError("populate() expects an empty database so generated references line up")
+    return task_ids
@@ -0,0 +1,202 @@
+"""Benchmark the db_handler and display_handler hot paths at several table sizes.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --sizes 1000,100000 --output bench.json
+
+Results are written as JSON so runs from different releases can be compared.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.datagen import populate
+from modules.agenda_handler import agenda
+from modules.connection_handler import close_all_connections, set_db_path
+from modules.db_handler import (
+    add_task,
+    delete_task,
+    fetch_task,
+    get_descendants,
+    init_db,
+    iter_tasks,
+    list_tasks,
+    validate_dependencies,
+)
+from modules.display_handler import OUTPUT_FORMATS, display_tasks
+from modules.rank_handler import rank_tasks
+
+# Filter and sort combinations timed for list_tasks
+LIST_FILTERS = {
+    "none": {},
+    "parent_id": {"parent_id": 0},
+    "status": {"status": "To Do"},
+    "priority": {"priority": "High"},
+    "category": {"category": "Work"},
+    "status+priority": {"status": "To Do", "priority": "High"},
+    "parent_id+status": {"parent_id": 0, "status": "Doing"},
+    "task_title": {"task_title": "*resume*"},
+    "query": {"query": "resume"},
+}
+LIST_SORTS = (None, "due-date", "priority", "title", "due-date,priority")
+
+
+def _measure(function, repeat):
+    """Run `function` `repeat` times and return (timings, last result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def _record(results, size, name, timings, operations=1, **params):
+    entry = {
+        "size": size,
+        "benchmark": name,
+        "params": params,
+        "operations": operations,
+        "repeat": len(timings),
+        "min_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "ops_per_second": operations / min(timings) if min(timings) else None,
+    }
+    results.append(entry)
+    print(f"  {name:<28} {json.dumps(params):<55} {entry['min_seconds'] * 1000:10.2f} ms", file=sys.stderr)
+
+
+def run_size(size, repeat, render_limit, workdir, seed):
+    """Build a database with `size` tasks and time every hot path against it."""
+    results = []
+    rng = random.Random(seed)
+    set_db_path(os.path.join(workdir, f"bench_{size}.db"))
+    init_db()
+    print(f"size={size}", file=sys.stderr)
+
+    timings, task_ids = _measure(lambda: populate(size, seed=seed), 1)
+    _record(results, size, "add_tasks_bulk", timings, operations=len(task_ids))
+
+    # Single-row inserts, as the create command performs them
+    inserts = 200
+    timings, _ = _measure(lambda: [add_task(f"Bench {i}", "Single insert", "Work", "Low", "To Do", "2024-06-01", None)
+                                   for i in range(inserts)], repeat)
+    _record(results, size, "add_task", timings, operations=inserts)
+
+    lookups = [rng.randint(1, size) for _ in range(1000)]
+    timings, _ = _measure(lambda: [fetch_task(task_id) for task_id in lookups], repeat)
+    _record(results, size, "fetch_task", timings, operations=len(lookups))
+
+    for filter_name, filters in LIST_FILTERS.items():
+        for sort_by in LIST_SORTS:
+            timings, tasks = _measure(lambda: list_tasks(filters=filters, sort_by=sort_by, use_cache=False), repeat)
+            _record(results, size, "list_tasks", timings, operations=max(len(tasks), 1),
+                    filter=filter_name, sort_by=sort_by, rows=len(tasks))
+
+    # Repeated dashboard views: the first call fills the result cache, later calls hit it
+    for filter_name in ("status", "status+priority"):
+        list_tasks(filters=LIST_FILTERS[filter_name], sort_by="due-date")
+        timings, tasks = _measure(lambda: list_tasks(filters=LIST_FILTERS[filter_name], sort_by="due-date"), repeat)
+        _record(results, size, "list_tasks_cached", timings, operations=max(len(tasks), 1),
+                filter=filter_name, sort_by="due-date", rows=len(tasks))
+
+    timings, first_page = _measure(lambda: list(iter_tasks(sort_by="due-date", limit=100)), repeat)
+    _record(results, size, "iter_tasks_first_page", timings, operations=len(first_page), sort_by="due-date")
+
+    # A 48-hour window inside the generated due dates (2024-01-01 plus up to two years)
+    timings, entries = _measure(lambda: list(agenda("2024-06-01", "2024-06-03")), repeat)
+    _record(results, size, "agenda_48h", timings, operations=max(len(entries), 1), rows=len(entries))
+
+    # The next command: the ten most urgent of every open task
+    timings, ranked = _measure(lambda: rank_tasks(10, as_of=datetime(2024, 6, 1)), repeat)
+    _record(results, size, "rank_tasks_top10", timings, operations=max(len(ranked), 1), rows=len(ranked))
+
+    chained = [task_id for task_id in lookups if task_id % 5]
+    timings, _ = _measure(lambda: [validate_dependencies(task_id) for task_id in chained], repeat)
+    _record(results, size, "validate_dependencies", timings, operations=max(len(chained), 1))
+
+    rows = min(size, render_limit)
+    sink = io.StringIO()
+
+    # Rows are fetched up front so only the formatter is timed
+    tasks = list(iter_tasks(limit=rows))
+    for output_format in OUTPUT_FORMATS:
+        def render():
+            sink.seek(0)
+            sink.truncate()
+            with contextlib.redirect_stdout(sink):
+                return display_tasks(tasks, output_format=output_format)
+        timings, rendered = _measure(render, repeat)
+        _record(results, size, "display_tasks", timings, operations=rendered, rows=rendered, format=output_format)
+    del tasks
+
+    # Cascade delete of the largest subtree among a sample of top-level tasks
+    roots = [task.id for task in list_tasks(filters={"parent_id": 0}, limit=200)]
+    root = max(roots, key=lambda task_id: len(get_descendants(task_id)))
+    subtree = len(get_descendants(root)) + 1
+    timings, _ = _measure(lambda: delete_task(root), 1)
+    _record(results, size, "delete_task_cascade", timings, operations=subtree, subtree_size=subtree)
+
+    close_all_connections()
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark task manager hot paths and print JSON results.")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated table sizes (default: 1000,100000,1000000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the minimum is reported (default: 3)")
+    parser.add_argument("--render-limit", type=int, default=100000, help="Maximum rows rendered by display_tasks (default: 100000)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic data (default: 42)")
+    parser.add_argument("--workdir", help="Directory for the benchmark databases (default: a temporary directory)")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.workdir or tmpdir
+        results = []
+        for size in sizes:
+            results.extend(run_size(size, args.repeat, args.render_limit, workdir, args.seed))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,244 @@
+import io
+import json
 import logging
+import os
+import sys
 import traceback
+from datetime import datetime, timedelta
 
-from modules.cli_handler import parse_arguments
+from modules.agenda_handler import agenda
+from modules.archive_handler import archive_completed_tasks, count_archivable
+from modules.cache_handler import cache_stats
+from modules.change_handler import compact_changes, iter_changes
+from modules.cli_handler import confirm, parse_arguments
+from modules.connection_handler import get_db_path, set_db_path
 from modules.db_handler import (
     add_task,
+    check_parent,
+    count_tasks,
     delete_task,
+    explain_list_query,
     fetch_task,
+    fetch_tasks,
+    get_task_tree,
     init_db,
+    iter_tasks,
     list_tasks,
+    search_tasks,
+    summarize_subtrees,
+    summarize_tasks,
     update_task,
+    update_where,
 )
-from modules.display_handler import display_task_details, display_tasks
+from modules.dependency_handler import check_dependencies, load_dependency_graph
+from modules.display_handler import (
+    display_agenda,
+    display_query_plan,
+    display_ranked_tasks,
+    display_search_results,
+    display_subtree_rollups,
+    display_summary,
+    display_tags,
+    display_task_details,
+    display_task_tree,
+    display_tasks,
+)
+from modules.profile_handler import TIMINGS_ENV, start_profiling, stop_profiling
+from modules.rank_handler import rank_tasks
+from modules.recurrence_handler import (
+    count_due_rollovers,
+    project_task_occurrences,
+    rollover_recurring_tasks,
+)
+from modules.shard_handler import load_shards
+from modules.tag_handler import add_tags, get_task_tags, list_tags, parse_tags, remove_tags
 
-# Configure logging
-logging.basicConfig(filename='task_manager.log', level=logging.INFO,
+# Configure logging; the log file is only opened once something is logged
+logging.basicConfig(handlers=[logging.FileHandler('task_manager.log', delay=True)], level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def main():
-    # Initialize database
-    init_db()
+def _discard_stdout():
+    # Point stdout at /dev/null so the interpreter's final flush does not fail again
+    try:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    except (OSError, ValueError, io.UnsupportedOperation):
+        pass
 
+
+def main(argv=None):
     # Parse arguments
-    args = parse_arguments()
+    args = parse_arguments(argv)
+    try:
+        shards = load_shards(args.db, args.shards)
+    except ValueError as e:
+        print(f"Invalid shard configuration: {e}")
+        return
+    if shards is None:
+        args.db = args.db[0] if args.db else None
+        if isinstance(getattr(args, "task_id", None), str) or isinstance(getattr(args, "parent_id", None), str):
+            print("Shard-qualified task IDs need several databases (repeat --db or use --shards).")
+            return
+    try:
+        # serve runs until stopped; the commands it serves are profiled one by one instead
+        if args.command != "serve" and (args.profile or args.profile_file or os.environ.get(TIMINGS_ENV)):
+            return _run_profiled(args, shards)
+        return run_command(args) if shards is None else run_sharded_command(args, shards)
+    finally:
+        if shards is not None:
+            shards.close()
 
+
+def _run_profiled(args, shards=None):
+    if args.profile_file:
+        # Imported here so ordinary commands do not load cProfile
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+    if shards is None and args.db and args.db != get_db_path():
+        set_db_path(args.db)
+    # Sharded commands query through worker connections, which are not traced
+    profiler = start_profiling(trace_sql=shards is None)
     try:
-        if args.command == "create":
+        return run_command(args) if shards is None else run_sharded_command(args, shards)
+    finally:
+        stop_profiling(args.command)
+        if args.profile_file:
+            profile.disable()
+            profile.dump_stats(args.profile_file)
+            print(f"cProfile statistics saved to {args.profile_file}", file=sys.stderr)
+        if args.profile:
+            print(profiler.report(), file=sys.stderr)
+
+
+def run_sharded_command(args, shards):
+    """Run one parsed command line on a set of shard databases.
+
+    list, search and stats read every shard in parallel and show one merged
+    result; a list without --limit streams, each shard reading ahead on its own
+    worker. Commands naming a task run on that task's shard, and create writes
+    to the shard the task is routed to. Other commands run on each shard in turn.
+    """
+    args.db = None
+    try:
+        shards.map(init_db)
+        if args.command in ("serve", "watch", "backup", "restore"):
+            print(f"{args.command} works on a single database; run it with one --db per shard.")
+
+        elif args.command == "create":
+            # Subtasks go to their parent's shard, other tasks by --shard or category
+            name = shards.route(args.shard, args.category, args.parent_id)
+            if args.parent_id:
+                args.parent_id = shards.resolve(args.parent_id, name)[1]
+            print(f"Shard: {name}")
+            shards.run(name, run_command, args)
+
+        elif args.shard is not None or getattr(args, "task_id", None) is not None:
+            # A command on one task, or restricted to one shard
+            name = args.shard
+            if getattr(args, "task_id", None) is not None:
+                name, args.task_id = shards.resolve(args.task_id, args.shard)
+            if getattr(args, "parent_id", None):
+                args.parent_id = shards.resolve(args.parent_id, name)[1]
+            shards.run(name, run_command, args)
+
+        elif args.command == "list" and not args.explain:
+            filters = _list_filters(args)
+            tasks = shards.list_tasks(filters=filters, sort_by=args.sort_by, limit=args.limit, offset=args.offset,
+                                      include_archived=args.include_archived)
+            if not display_tasks(tasks, output_format=args.format) and args.format == "grid":
+                print("No tasks found matching the criteria.")
+            logging.info("Listed tasks of shards %s with filters: %s and sort option: %s", shards.names, filters, args.sort_by)
+
+        elif args.command == "search":
+            results = shards.search_tasks(args.query, limit=args.limit, include_archived=args.include_archived)
+            if results:
+                display_search_results(results)
+            else:
+                print("No tasks found matching the search.")
+
+        elif args.command in ("stats", "report") and not args.rollup:
+            summary = shards.summarize_tasks(args.group_by, filters=_stats_filters(args))
+            if summary:
+                display_summary(summary)
+            else:
+                print("No tasks found matching the criteria.")
+
+        else:
+            for name in shards.names:
+                print(f"== {name} ==")
+                shards.run(name, run_command, args)
+
+    except BrokenPipeError:
+        _discard_stdout()
+
+    except ValueError as e:
+        logging.error("Invalid input: %s", e)
+        print(f"Invalid input: {e}")
+
+
+def _list_filters(args):
+    # list filters from the command line
+    filters = {}
+    if args.task_title:
+        filters["task_title"] = args.task_title
+    if args.query:
+        filters["query"] = args.query
+    if args.parent_id is not None:
+        filters["parent_id"] = args.parent_id
+    if args.status:
+        filters["status"] = args.status
+    if args.priority:
+        filters["priority"] = args.priority
+    if args.category:
+        filters["category"] = args.category
+    if getattr(args, "tag", None):
+        filters["tag"] = " AND ".join(f"({expression})" for expression in args.tag)
+    return filters
+
+
+def _stats_filters(args):
+    filters = {field: getattr(args, field) for field in ("status", "priority", "category", "parent_id")
+               if getattr(args, field) is not None}
+    if args.tag:
+        filters["tag"] = " AND ".join(f"({expression})" for expression in args.tag)
+    return filters
+
+
+def run_command(args):
+    """Run one parsed command line."""
+    # Initialize database (a no-op once the schema is current)
+    if args.db and args.db != get_db_path():
+        set_db_path(args.db)
+    init_db()
+
+    try:
+        if args.command == "serve":
+            # Imported here so ordinary commands do not load socketserver
+            from modules.server_handler import serve
+            serve(main, args.socket)
+
+        elif args.command == "create" and args.from_file:
+            # Stream the file into the bulk insert path
+            from modules.import_handler import import_tasks
+            logging.info("Importing tasks from file: %s", args.from_file)
+            task_ids = import_tasks(args.from_file, chunk_size=args.chunk_size)
+            if task_ids:
+                logging.info("Imported %d tasks from %s", len(task_ids), args.from_file)
+                print(f"Imported {len(task_ids)} tasks. Task IDs: {task_ids[0]}-{task_ids[-1]}")
+            else:
+                logging.error("Task import failed for file: %s", args.from_file)
+                print("No tasks were imported. Check logs for details.")
+
+        elif args.command == "create":
             # Log task creation attempt
             logging.info("Attempting to create task with title: %s", args.task_title)
 
+            # Dependencies must refer to existing tasks
+            dependencies = check_dependencies(args.dependencies)
+            tags = parse_tags(args.tags)
+
             # Add task and capture the created task ID
             task_id = add_task(
                 title=args.task_title,
@@ -40,9 +250,11 @@ def main():
                 time=args.time,
                 parent_id=args.parent_id,
                 recurrence=args.recurrence,
-                dependencies=args.dependencies or "[]"
+                dependencies=dependencies
             )
 
+            if task_id and tags:
+                add_tags(task_id, tags)
             if task_id:
                 logging.info("Task created successfully with title: %s, ID: %s, Parent ID: %s", args.task_title, task_id, args.parent_id)
                 print(f"Task created successfully! Task ID: {task_id}, Parent ID: {args.parent_id}")
@@ -51,18 +263,6 @@ def main():
                 print("Task creation failed. Check logs for details.")
 
         elif args.command == "update":
-            # Fetch the task to update
-            task = fetch_task(args.task_id)
-            if task is None:
-                logging.warning("Update failed. Task with ID %s not found", args.task_id)
-                print(f"Task not found for ID {args.task_id}.")
-                return
-
-            # Display current task details
-            logging.info("Attempting to update task ID %s", args.task_id)
-            print("Current Task Details:")
-            display_task_details(task)
-
             # Prepare updates based on arguments
             updates = {}
             if args.task_title:
@@ -79,8 +279,51 @@ def main():
                 updates["due_date"] = args.due_date
             if args.time:
                 updates["time"] = args.time
+
+            if args.where:
+                # Set-based update of every task matching the list filters
+                filters = dict(args.where)
+                if args.parent_id is not None or args.dependencies is not None:
+                    print("Parent and dependencies can only be changed one task at a time (use --task-id).")
+                    return
+                if not updates:
+                    print("No changes were given.")
+                    return
+                count = count_tasks(filters)
+                if count is None:
+                    return
+                selection = " and ".join(f"{field}={value}" for field, value in args.where)
+                changes = ", ".join(f"{field}={value}" for field, value in updates.items())
+                print(f"{count} task(s) match {selection}; proposed change: {changes}.")
+                if args.dry_run or count == 0:
+                    return
+                if args.yes or confirm(f"Do you want to update these {count} task(s)? (y/n): "):
+                    updated = update_where(filters, updates)
+                    if updated is not None:
+                        print(f"Updated {updated} task(s).")
+                else:
+                    logging.info("Bulk update canceled for filters %s", filters)
+                    print("Update canceled.")
+                return
+
+            # Fetch the task to update
+            task = fetch_task(args.task_id)
+            if task is None:
+                logging.warning("Update failed. Task with ID %s not found", args.task_id)
+                print(f"Task not found for ID {args.task_id}.")
+                return
+
+            # Display current task details
+            logging.info("Attempting to update task ID %s", args.task_id)
+            print("Current Task Details:")
+            display_task_details(task)
+
             if args.parent_id is not None:
+                check_parent(args.task_id, args.parent_id)
                 updates["parent_id"] = args.parent_id
+            if args.dependencies is not None:
+                # Reject missing tasks and dependency cycles before asking for confirmation
+                updates["dependencies"] = json.dumps(check_dependencies(args.dependencies, task_id=args.task_id))
 
             # Check if there are updates
             if not updates:
@@ -91,37 +334,191 @@ def main():
             # Confirm update
             print("\nUpdated Task Details (Proposed):")
             display_task_details({**task, **updates})
-            confirm = input("Do you want to update this task? (y/n): ").strip().lower()
-            if confirm == 'y':
-                update_task(args.task_id, updates)
-                logging.info("Task ID %s updated successfully", args.task_id)
-                print(f"Task ID {args.task_id} updated successfully!")
+            if args.dry_run:
+                return
+            if args.yes or confirm("Do you want to update this task? (y/n): "):
+                if update_task(args.task_id, updates) is not None:
+                    logging.info("Task ID %s updated successfully", args.task_id)
+                    print(f"Task ID {args.task_id} updated successfully!")
             else:
                 logging.info("Task update canceled for ID %s", args.task_id)
                 print(f"Task update canceled for ID {args.task_id}.")
 
         elif args.command == "list":
             # Prepare filters and sorting
-            filters = {}
-            if args.task_title:
-                filters["task_title"] = args.task_title
-            if args.parent_id is not None:
-                filters["parent_id"] = args.parent_id
-            if args.status:
-                filters["status"] = args.status
-            if args.priority:
-                filters["priority"] = args.priority
-            if args.category:
-                filters["category"] = args.category
+            filters = _list_filters(args)
+
+            # Show the query plan instead of running the query
+            if args.explain:
+                display_query_plan(explain_list_query(filters=filters, sort_by=args.sort_by, include_archived=args.include_archived))
+                return
 
-            # Fetch tasks with filters and sorting
-            tasks = list_tasks(filters=filters, sort_by=args.sort_by)
-            if tasks:
-                display_tasks(tasks)
+            if args.limit is not None:
+                # A bounded page is served from the result cache when the same view is shown again
+                tasks = list_tasks(filters=filters, sort_by=args.sort_by, limit=args.limit, offset=args.offset,
+                                   include_archived=args.include_archived)
             else:
+                # Stream tasks with filters and sorting, rendering page by page
+                tasks = iter_tasks(filters=filters, sort_by=args.sort_by, offset=args.offset,
+                                   include_archived=args.include_archived)
+            if not display_tasks(tasks, output_format=args.format) and args.format == "grid":
                 print("No tasks found matching the criteria.")
             logging.info("Listed tasks with filters: %s and sort option: %s", filters, args.sort_by)
 
+        elif args.command == "search":
+            results = search_tasks(args.query, limit=args.limit, include_archived=args.include_archived)
+            if results:
+                display_search_results(results)
+            else:
+                print("No tasks found matching the search.")
+            logging.info("Searched tasks for: %s (%d results)", args.query, len(results))
+
+        elif args.command == "tree":
+            if args.task_id is not None and fetch_task(args.task_id) is None:
+                print(f"Task not found for ID {args.task_id}.")
+                return
+            if not display_task_tree(get_task_tree(args.task_id, max_depth=args.depth)):
+                print("No tasks found.")
+            logging.info("Displayed task tree for root: %s", args.task_id)
+
+        elif args.command == "ready":
+            # Order open tasks so dependencies come first
+            graph = load_dependency_graph()
+            task_ids = graph.topological_order() if args.all else graph.ready_tasks()
+            if not display_tasks(fetch_tasks(task_ids)):
+                print("No tasks are ready to start." if not args.all else "No open tasks.")
+            logging.info("Listed %d %s tasks", len(task_ids), "open" if args.all else "ready")
+
+        elif args.command == "rollover":
+            if args.dry_run:
+                count = count_due_rollovers(args.as_of)
+                print(f"{count} recurring task(s) would roll over.")
+                return
+            rolled = rollover_recurring_tasks(args.as_of)
+            if rolled is not None:
+                print(f"Rolled over {rolled} recurring task(s).")
+
+        elif args.command == "occurrences":
+            task = fetch_task(args.task_id)
+            if task is None or task["recurrence"] == "none":
+                print(f"Task {args.task_id} does not exist or does not recur.")
+                return
+            dates = project_task_occurrences(args.task_id, args.from_date, args.to_date, args.count)
+            print(f"Upcoming {task['recurrence']} occurrences of '{task['title']}':")
+            for day in dates:
+                print(f"  {day:%Y-%m-%d (%a)}")
+
+        elif args.command == "agenda":
+            start = datetime.fromisoformat(args.from_date) if args.from_date else datetime.now().replace(second=0, microsecond=0)
+            if args.to_date:
+                end = datetime.fromisoformat(args.to_date)
+                if len(args.to_date) == len("YYYY-MM-DD"):
+                    end += timedelta(days=1)
+            else:
+                end = start + timedelta(days=args.days)
+            if not display_agenda(agenda(start, end, include_done=args.all)):
+                print(f"Nothing due between {start:%Y-%m-%d %H:%M} and {end:%Y-%m-%d %H:%M}.")
+            logging.info("Showed agenda from %s to %s", start, end)
+
+        elif args.command == "watch":
+            # Imported here so ordinary commands do not load the watch session
+            from modules.watch_handler import watch_tasks
+            watch_tasks(_list_filters(args), args.sort_by, args.interval)
+
+        elif args.command == "next":
+            as_of = datetime.fromisoformat(args.as_of) if args.as_of else None
+            ranked = rank_tasks(args.count, dict(args.weight or ()), as_of)
+            if not display_ranked_tasks(ranked):
+                print("No open tasks.")
+            logging.info("Ranked the next %d open tasks", len(ranked))
+
+        elif args.command in ("stats", "report"):
+            if args.rollup:
+                rollups = summarize_subtrees(args.task_id)
+                if rollups:
+                    display_subtree_rollups(rollups)
+                else:
+                    print("No tasks with subtasks found.")
+                return
+
+            filters = _stats_filters(args)
+            summary = summarize_tasks(args.group_by, filters=filters)
+            if summary:
+                display_summary(summary)
+            else:
+                print("No tasks found matching the criteria.")
+            logging.info("Summarized tasks by %s with filters: %s", args.group_by, filters)
+
+        elif args.command == "archive":
+            if args.dry_run:
+                count = count_archivable(args.older_than)
+                print(f"{count} task(s) would be archived.")
+                return
+            archived = archive_completed_tasks(args.older_than, batch_size=args.batch_size)
+            if archived is not None:
+                print(f"Archived {archived} task(s) completed more than {args.older_than} days ago.")
+
+        elif args.command == "changes":
+            if args.compact:
+                removed = compact_changes(args.through, purge_deleted=args.purge_deleted)
+                if removed is not None:
+                    print(f"Removed {removed} change log entries.")
+                return
+            # One JSON object per line; the seq of the last line is the next --since
+            for change in iter_changes(args.since, args.limit):
+                sys.stdout.write(json.dumps(change) + "\n")
+
+        elif args.command == "backup":
+            # Imported here so ordinary commands do not load gzip and hashlib
+            from modules.backup_handler import backup_database, export_snapshot
+            if args.format == "snapshot":
+                snapshot = export_snapshot(args.file)
+                if snapshot is not None:
+                    print(f"Exported {snapshot['rows'].get('tasks', 0)} task(s) to {args.file} (sha256 {snapshot['sha256']}).")
+            else:
+                pages = backup_database(args.file, pages=args.step_pages)
+                if pages is not None:
+                    print(f"Backed up the database to {args.file} ({pages} pages).")
+
+        elif args.command == "restore":
+            # The file is verified as it is restored; nothing changes if it is damaged
+            from modules.backup_handler import restore_database
+            if args.yes or confirm(f"Do you want to replace all {count_tasks()} task(s) in {get_db_path()} with the contents of {args.file}? (y/n): "):
+                tasks = restore_database(args.file)
+                if tasks is not None:
+                    print(f"Restored {tasks} task(s) from {args.file}.")
+            else:
+                print("Restore canceled.")
+
+        elif args.command == "verify":
+            from modules.backup_handler import verify_backup
+            backup = verify_backup(args.file)
+            print(f"{args.file}: OK, {backup['kind']} backup of {backup['tasks']} task(s) at schema version {backup['schema_version']}.")
+
+        elif args.command == "cache-stats":
+            stats = cache_stats()
+            for name, value in stats.items():
+                print(f"{name:<14} {value:.1%}" if name == "hit_rate" else f"{name:<14} {value}")
+
+        elif args.command == "tag":
+            if fetch_task(args.task_id) is None:
+                print(f"Task not found for ID {args.task_id}.")
+                return
+            if args.add:
+                add_tags(args.task_id, parse_tags(args.add))
+            if args.remove:
+                remove_tags(args.task_id, parse_tags(args.remove))
+            tags = get_task_tags(args.task_id)
+            print(f"Tags of task {args.task_id}: {', '.join(tags) if tags else '(none)'}")
+            logging.info("Tagged task %s: +%s -%s", args.task_id, args.add, args.remove)
+
+        elif args.command == "tags":
+            tags = list_tags()
+            if tags:
+                display_tags(tags)
+            else:
+                print("No tags in use.")
+
         elif args.command == "delete":
             try:
                 # Ensure the task ID is an integer
@@ -142,19 +539,16 @@ def main():
             print("Task to be deleted:")
             display_task_details(task)
 
-            # Fetch and display subtasks, if any
-            subtasks = [t for t in list_tasks() if t["parent_id"] == task_id_int]
+            # Fetch and display subtasks at every level, if any
+            subtasks = get_task_tree(task_id_int)[1:]
             if subtasks:
                 print("\nThis task has the following subtasks:")
-                display_tasks(subtasks)
+                display_task_tree(subtasks)
 
             # Confirm deletion
-            confirm = input("Do you want to delete this task and its subtasks? (y/n): ").strip().lower()
-            if confirm == 'y':
-                # Delete the main task and its subtasks
+            if confirm("Do you want to delete this task and its subtasks? (y/n): "):
+                # Delete the main task and all of its subtasks in one statement
                 delete_task(task_id_int)
-                for subtask in subtasks:
-                    delete_task(subtask["id"])  # Delete each subtask
                 logging.info("Task ID %s and its subtasks deleted successfully.", task_id_int)
                 print(f"Task ID {task_id_int} and its subtasks deleted successfully!")
             else:
@@ -165,6 +559,14 @@ def main():
             logging.error("Invalid command received: %s", args.command)
             print("Invalid command. Use --help for usage information.")
 
+    except BrokenPipeError:
+        # The reader of a pipe (head, grep -m) exited early; that is not an error
+        _discard_stdout()
+
+    except ValueError as e:
+        logging.error("Invalid input: %s", e)
+        print(f"Invalid input: {e}")
+
     except Exception as e:
         logging.error("An error occurred: %s", str(e))
         logging.error("Traceback: %s", traceback.format_exc())
@@ -0,0 +1,94 @@
+import heapq
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+
+from modules.connection_handler import get_connection
+from modules.recurrence_handler import DUE_FOR_ROLLOVER_SQL, project_occurrences
+from modules.task_model import TASK_COLUMNS, Task
+
+# due_date and time combined into one sortable timestamp ("YYYY-MM-DD HH:MM:SS"). A task
+# without a time is due at midnight; one whose date is not a valid YYYY-MM-DD has none.
+DUE_AT_SQL = "coalesce(datetime(due_date || ' ' || time), datetime(due_date))"
+DUE_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Default length of the agenda window
+DEFAULT_AGENDA_DAYS = 7
+
+_TASK_SELECT = ", ".join(f"tasks.{column}" for column in TASK_COLUMNS)
+
+# Range scan of idx_tasks_due_at; the index is ordered by (due_at, id), so no sort step
+AGENDA_SQL = f'''SELECT {_TASK_SELECT}, tasks.due_at FROM tasks
+                 WHERE tasks.due_at >= ? AND tasks.due_at < ?{{status}}
+                 ORDER BY tasks.due_at, tasks.id'''
+OPEN_TASKS_SQL = " AND tasks.status IS NOT 'Done'"
+
+# Recurring series with an occurrence after their current one on or before a date
+# (the rollover condition, served by idx_tasks_next_occurrence)
+AGENDA_SERIES_SQL = f'''SELECT {_TASK_SELECT}, coalesce(tasks.recurrence_anchor, tasks.due_date) FROM tasks
+                        WHERE {DUE_FOR_ROLLOVER_SQL}'''
+
+
+def add_due_at_column(conn):
+    """Add the due_at generated column and its index.
+
+    A generated column is recomputed by SQLite on every insert and update, so every
+    write path (add_task, update_task, bulk updates, imports, rollover) keeps it in sync.
+    """
+    conn.execute(f"ALTER TABLE tasks ADD COLUMN due_at TEXT GENERATED ALWAYS AS ({DUE_AT_SQL}) VIRTUAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due_at ON tasks (due_at)")
+
+
+def _due_at(day, time):
+    # Python twin of DUE_AT_SQL for projected occurrences
+    try:
+        return datetime.fromisoformat(f"{day}T{time}").strftime(DUE_AT_FORMAT)
+    except (TypeError, ValueError):
+        return f"{day} 00:00:00"
+
+
+def _projected(task, anchor, start, end):
+    """Yield (due_at, task, True) for the occurrences of a series after its current one, inside [start, end)."""
+    first = max(task["next_occurrence"], start[:10])
+    for day in project_occurrences(task["recurrence"], anchor, first, end[:10]):
+        due_at = _due_at(day.isoformat(), task["time"])
+        if due_at >= end:
+            return
+        if due_at >= start:
+            yield due_at, task._replace(due_date=day.isoformat(), next_occurrence=None), True
+
+
+# Function to list what is due in a time window
+def agenda(start=None, end=None, include_done=False):
+    """Yield the tasks due in [start, end) in chronological order, with upcoming occurrences of recurring tasks.
+
+    Stored tasks come from an index range scan on due_at, so the cost is
+    O(log n + k) for k tasks in the window. Occurrences of recurring tasks that
+    have not been rolled over yet are projected in Python and merged in.
+
+    :param start: Window start as a datetime or "YYYY-MM-DD[ HH:MM]" (default: now)
+    :param end: Window end, exclusive (default: DEFAULT_AGENDA_DAYS after start)
+    :param include_done: Also list completed tasks (default: False)
+    :return: A generator of (due_at, task, projected) tuples; projected entries are
+             future occurrences of a series, with due_date set to that occurrence
+    """
+    start = _to_timestamp(start or datetime.now().replace(second=0, microsecond=0))
+    end = _to_timestamp(end or datetime.strptime(start, DUE_AT_FORMAT) + timedelta(days=DEFAULT_AGENDA_DAYS))
+    conn = get_connection()
+    try:
+        stored = conn.execute(AGENDA_SQL.format(status="" if include_done else OPEN_TASKS_SQL), (start, end))
+        series = conn.execute(AGENDA_SERIES_SQL, (end[:10],)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error loading agenda: {e}")
+        logging.error("Error loading agenda: %s", e)
+        return
+    streams = [((row[-1], Task._make(row[:-1]), False) for row in stored)]
+    streams.extend(_projected(Task._make(row[:-1]), row[-1], start, end) for row in series)
+    yield from heapq.merge(*streams, key=lambda entry: (entry[0], entry[1][0]))
+
+
+def _to_timestamp(value):
+    # Dates and datetimes (or their text forms) as DUE_AT_FORMAT text
+    if isinstance(value, datetime):
+        return value.strftime(DUE_AT_FORMAT)
+    return datetime.fromisoformat(str(value)).strftime(DUE_AT_FORMAT)
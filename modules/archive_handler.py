@@ -0,0 +1,157 @@
+import json
+import logging
+import sqlite3
+
+from modules.cache_handler import bump_generation
+from modules.change_handler import CHANGE_LOG_UPDATE_TRIGGER_SQL
+from modules.connection_handler import get_connection, transaction
+from modules.task_model import TASK_COLUMNS
+
+# Completed tasks are archived this many days after completion by default
+DEFAULT_ARCHIVE_DAYS = 90
+
+# Task trees moved per transaction, so archiving years of history never holds the write lock for long
+ARCHIVE_BATCH_SIZE = 500
+
+# Format of completed_at and archived_at, as written by the triggers below
+TIMESTAMP_SQL = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
+# Every column of a task row, including the ones Task records do not carry
+ARCHIVE_COLUMNS = TASK_COLUMNS + ("recurrence_anchor", "completed_at")
+ARCHIVE_COLUMN_LIST = ", ".join(ARCHIVE_COLUMNS)
+
+# completed_at is stamped by triggers whenever a task becomes Done (and cleared when it is
+# reopened), so every write path records it. Archived rows keep their columns in
+# tasks_archive, with their own full-text index so archived tasks stay searchable.
+ARCHIVE_SCHEMA_SQL = (
+    f'''CREATE TRIGGER IF NOT EXISTS tasks_completed_insert AFTER INSERT ON tasks
+        WHEN new.status = 'Done' AND new.completed_at IS NULL BEGIN
+            UPDATE tasks SET completed_at = {TIMESTAMP_SQL} WHERE id = new.id;
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS tasks_completed_update AFTER UPDATE OF status ON tasks
+        WHEN new.status IS NOT old.status BEGIN
+            UPDATE tasks SET completed_at = CASE WHEN new.status = 'Done' THEN {TIMESTAMP_SQL} END WHERE id = new.id;
+        END''',
+    "CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks (completed_at) WHERE status = 'Done'",
+    f'''CREATE TABLE IF NOT EXISTS tasks_archive (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT,
+            category TEXT,
+            priority TEXT,
+            status TEXT,
+            due_date TEXT,
+            time TEXT,
+            parent_id INTEGER DEFAULT 0,
+            recurrence TEXT DEFAULT 'none',
+            next_occurrence TEXT,
+            dependencies TEXT DEFAULT '[]',
+            recurrence_anchor TEXT,
+            completed_at TEXT,
+            archived_at TEXT NOT NULL DEFAULT ({TIMESTAMP_SQL})
+        )''',
+)
+
+ARCHIVE_SEARCH_INDEX_SQL = (
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS tasks_archive_fts USING fts5(
+           title, description, content='tasks_archive', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+       )''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_archive_fts_insert AFTER INSERT ON tasks_archive BEGIN
+           INSERT INTO tasks_archive_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_archive_fts_delete AFTER DELETE ON tasks_archive BEGIN
+           INSERT INTO tasks_archive_fts (tasks_archive_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+       END''',
+)
+
+# A task can be archived once it has been Done for the retention period, unless it is a
+# recurring series that will come round again
+ARCHIVABLE_SQL = '''(tasks.status IS 'Done' AND coalesce(tasks.completed_at <= :cutoff, 0)
+                     AND (tasks.recurrence = 'none' OR tasks.next_occurrence IS NULL))'''
+
+# Archivable tasks whose whole subtree is archivable, so no open subtask loses its parent.
+# Only the roots of those subtrees are returned; each is moved together with its subtree.
+ARCHIVE_CANDIDATES_SQL = f'''WITH RECURSIVE kept(id) AS (
+                                 SELECT tasks.parent_id FROM tasks WHERE tasks.parent_id != 0 AND NOT {ARCHIVABLE_SQL}
+                                 UNION
+                                 SELECT tasks.parent_id FROM tasks JOIN kept ON tasks.id = kept.id WHERE tasks.parent_id != 0
+                             ),
+                             candidates(id, parent_id) AS (
+                                 SELECT tasks.id, tasks.parent_id FROM tasks
+                                 WHERE {ARCHIVABLE_SQL} AND tasks.id NOT IN kept
+                             )'''
+ARCHIVE_ROOTS_SQL = ARCHIVE_CANDIDATES_SQL + '''
+                    SELECT id FROM candidates WHERE parent_id NOT IN (SELECT id FROM candidates) ORDER BY id'''
+COUNT_ARCHIVABLE_SQL = ARCHIVE_CANDIDATES_SQL + " SELECT COUNT(*) FROM candidates"
+
+# The subtrees below a batch of roots (a JSON array of IDs), still archivable when moved
+ARCHIVE_BATCH_IDS_SQL = f'''WITH RECURSIVE subtree(id) AS (
+                                SELECT value FROM json_each(:roots)
+                                UNION ALL
+                                SELECT tasks.id FROM tasks JOIN subtree ON tasks.parent_id = subtree.id
+                            )
+                            SELECT tasks.id FROM tasks JOIN subtree ON tasks.id = subtree.id WHERE {ARCHIVABLE_SQL}'''
+COPY_TO_ARCHIVE_SQL = f'''INSERT INTO tasks_archive ({ARCHIVE_COLUMN_LIST})
+                          SELECT {ARCHIVE_COLUMN_LIST} FROM tasks WHERE id IN (SELECT value FROM json_each(?))'''
+DELETE_ARCHIVED_SQL = "DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))"
+
+
+def create_archive(conn):
+    """Add completed_at to tasks (stamped now for tasks already Done) and create tasks_archive."""
+    conn.execute("ALTER TABLE tasks ADD COLUMN completed_at TEXT")
+    conn.execute(f"UPDATE tasks SET completed_at = {TIMESTAMP_SQL} WHERE status = 'Done'")
+    for statement in ARCHIVE_SCHEMA_SQL:
+        conn.execute(statement)
+    # Change logs created before completed_at existed log updates of every column
+    conn.execute("DROP TRIGGER IF EXISTS task_changes_update")
+    conn.execute(CHANGE_LOG_UPDATE_TRIGGER_SQL)
+    # Archived tasks are searchable wherever the live ones are
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'").fetchone():
+        for statement in ARCHIVE_SEARCH_INDEX_SQL:
+            conn.execute(statement)
+
+
+def _cutoff(conn, older_than_days):
+    return conn.execute("SELECT strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?)", (f"-{older_than_days} days",)).fetchone()[0]
+
+
+def count_archivable(older_than_days=DEFAULT_ARCHIVE_DAYS):
+    """Return how many tasks archive_completed_tasks(older_than_days) would move."""
+    conn = get_connection()
+    return conn.execute(COUNT_ARCHIVABLE_SQL, {"cutoff": _cutoff(conn, older_than_days)}).fetchone()[0]
+
+
+# Function to move old completed tasks out of the tasks table
+def archive_completed_tasks(older_than_days=DEFAULT_ARCHIVE_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move tasks that have been Done for `older_than_days` days into tasks_archive.
+
+    A task is moved together with its subtasks, and only when all of them qualify,
+    so open work never loses its parent. Recurring series are kept. Each batch of
+    `batch_size` task trees is its own transaction: readers and writers can run
+    between batches, and an interrupted run keeps the batches already moved.
+    Archived tasks leave list, search and the dependency graph (a dependency on
+    one counts as satisfied) unless --include-archived is given, and appear in
+    the change log as deletions.
+
+    :param older_than_days: Minimum days since completion (0 archives every completed task)
+    :param batch_size: Task trees moved per transaction
+    :return: The number of tasks archived (None on failure)
+    """
+    archived = 0
+    try:
+        conn = get_connection()
+        cutoff = _cutoff(conn, older_than_days)
+        roots = [row[0] for row in conn.execute(ARCHIVE_ROOTS_SQL, {"cutoff": cutoff})]
+        for start in range(0, len(roots), batch_size):
+            with transaction() as conn:
+                batch = json.dumps(roots[start:start + batch_size])
+                task_ids = json.dumps([row[0] for row in conn.execute(ARCHIVE_BATCH_IDS_SQL, {"roots": batch, "cutoff": cutoff})])
+                conn.execute(COPY_TO_ARCHIVE_SQL, (task_ids,))
+                archived += conn.execute(DELETE_ARCHIVED_SQL, (task_ids,)).rowcount
+                bump_generation(conn)
+        logging.info("Archived %d tasks completed more than %s days ago", archived, older_than_days)
+        return archived
+    except sqlite3.Error as e:
+        print(f"Error archiving tasks (archived {archived} before the error): {e}")
+        logging.error("Error archiving tasks after %d were archived: %s", archived, e)
+        return None
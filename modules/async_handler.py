@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import db_handler
+from modules.connection_handler import close_connection, get_connection, transaction
+
+# Writes queued within this many seconds of the first one share a transaction
+DEFAULT_BATCH_WINDOW = 0.002
+
+# Upper bound on writes per transaction, so one commit never holds the lock for long
+DEFAULT_MAX_BATCH = 500
+
+DEFAULT_READERS = 4
+
+_STOP = object()
+
+
+class AsyncTaskStore:
+    """Asyncio front end for db_handler that never blocks the event loop.
+
+    Reads run on a small thread pool, each thread with its own connection, so they
+    proceed in parallel under WAL. Writes go to a single writer thread, which
+    gathers every write queued within `batch_window` seconds into one transaction
+    and commits once: hundreds of concurrent writers cost a handful of fsyncs, and
+    no two connections of this process ever compete for the write lock. Each write
+    runs in its own savepoint, so a failing write is rolled back alone and reports
+    its error to its caller, while the rest of the batch commits.
+
+    Results are delivered only after the batch commits. The methods return what
+    the db_handler functions of the same name return.
+
+        store = AsyncTaskStore()
+        task_id = await store.add_task("Call bank", None, "Personal", "High", "To Do", None, None)
+        task = await store.fetch_task(task_id)
+        await store.close()
+
+    The database must already be initialized (init_db).
+    """
+
+    def __init__(self, readers=DEFAULT_READERS, batch_window=DEFAULT_BATCH_WINDOW, max_batch=DEFAULT_MAX_BATCH):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._reader_connections = []
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="task-store-reader",
+                                           initializer=self._open_reader)
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="task-store-writer", daemon=True)
+        self._writer.start()
+        self._closed = False
+
+    def _open_reader(self):
+        # Open the reader thread's connection up front so close() can find it
+        self._reader_connections.append(get_connection())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # Function to run any blocking read on the reader pool
+    async def read(self, function, *args, **kwargs):
+        """Run a read-only db_handler function on a reader thread and return its result."""
+        if self._closed:
+            raise RuntimeError("AsyncTaskStore is closed")
+        return await asyncio.get_running_loop().run_in_executor(self._readers, lambda: function(*args, **kwargs))
+
+    # Function to queue any write for the writer thread
+    async def write(self, function, *args, **kwargs):
+        """Run a db_handler write function in the next batch and return its result once committed."""
+        if self._closed:
+            raise RuntimeError("AsyncTaskStore is closed")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._writes.put((function, args, kwargs, loop, future))
+        return await future
+
+    async def add_task(self, title, description, category, priority, status, due_date, time, parent_id=0,
+                       recurrence="none", dependencies="[]"):
+        return await self.write(db_handler.add_task, title, description, category, priority, status, due_date,
+                                time, parent_id, recurrence, dependencies)
+
+    async def fetch_task(self, task_id):
+        return await self.read(db_handler.fetch_task, task_id)
+
+    async def update_task(self, task_id, updates):
+        return await self.write(db_handler.update_task, task_id, updates)
+
+    async def delete_task(self, task_id):
+        return await self.write(db_handler.delete_task, task_id)
+
+    async def list_tasks(self, filters=None, sort_by=None, limit=None, offset=None):
+        return await self.read(db_handler.list_tasks, filters, sort_by, limit, offset)
+
+    async def close(self):
+        """Finish queued writes, then stop the writer thread and the reader pool."""
+        if self._closed:
+            return
+        self._closed = True
+        self._writes.put(_STOP)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer.join)
+        await loop.run_in_executor(None, self._readers.shutdown)
+        for conn in self._reader_connections:
+            close_connection(conn)
+
+    def _next_batch(self):
+        """Block for one write, then collect whatever else arrives within the batch window."""
+        batch = [self._writes.get()]
+        deadline = time.monotonic() + self.batch_window
+        while batch[-1] is not _STOP and len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._writes.get(timeout=remaining) if remaining > 0 else self._writes.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self._commit_batch(batch)
+            if stop:
+                close_connection()
+                return
+
+    def _commit_batch(self, batch):
+        results = []
+        try:
+            with transaction():
+                for function, args, kwargs, loop, future in batch:
+                    try:
+                        # A savepoint per write: an error undoes only that write
+                        with transaction():
+                            results.append((True, function(*args, **kwargs)))
+                    except Exception as e:
+                        results.append((False, e))
+        except Exception as e:
+            # The commit itself failed, so none of the writes were stored
+            logging.error("Error committing a batch of %d writes: %s", len(batch), e)
+            conn = get_connection()
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(False, e)] * len(batch)
+
+        for (function, args, kwargs, loop, future), (ok, value) in zip(batch, results):
+            try:
+                loop.call_soon_threadsafe(_resolve, future, ok, value)
+            except RuntimeError:
+                # The caller's event loop has already been closed
+                pass
+
+
+def _resolve(future, ok, value):
+    # The awaiting coroutine may have been cancelled while the batch was running
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
@@ -0,0 +1,357 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import zlib
+from datetime import datetime, timezone
+
+from modules.connection_handler import close_all_connections, get_connection, get_db_path, transaction
+from modules.db_handler import CREATE_TASKS_SQL, MIGRATIONS, SCHEMA_VERSION, init_db
+
+# Database pages copied per backup step (4 MB with the default 4 KB pages); writers can
+# commit between steps
+BACKUP_PAGES_PER_STEP = 1024
+
+# Snapshot files: gzip-compressed JSON Lines. A header line lists the tables and columns,
+# each following line holds up to SNAPSHOT_BLOCK_ROWS rows of one table stored column by
+# column, and a trailer line records the row counts and the SHA-256 of every line before it.
+SNAPSHOT_FORMAT = "task-manager-snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_BLOCK_ROWS = 10000
+# Level 1 compresses 1M tasks about 5x faster than the default level, for a ~40% larger file
+SNAPSHOT_COMPRESSLEVEL = 1
+
+# First bytes of each kind of file restore accepts
+SQLITE_MAGIC = b"SQLite format 3\x00"
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Tables with rows of their own. Full-text indexes and their shadow tables are rebuilt
+# from the tables they index; sqlite_sequence keeps AUTOINCREMENT from reusing the IDs of
+# deleted tasks.
+VIRTUAL_TABLES_SQL = "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%'"
+DATA_TABLES_SQL = '''SELECT name FROM sqlite_master
+                     WHERE type = 'table' AND (name NOT LIKE 'sqlite_%' OR name = 'sqlite_sequence')
+                       AND sql NOT LIKE 'CREATE VIRTUAL TABLE%' ORDER BY rootpage'''
+# Indexes and triggers are dropped while a snapshot loads and created again afterwards
+DEFERRED_SCHEMA_SQL = "SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"
+
+
+def _quote(name):
+    return f'"{name}"'
+
+
+def _remove_database_files(path):
+    for leftover in (path, path + "-journal", path + "-wal", path + "-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+def _scratch_path(path, suffix):
+    # A file next to `path`, on the same filesystem, replacing any left by an interrupted run
+    scratch = f"{path}.{suffix}"
+    _remove_database_files(scratch)
+    return scratch
+
+
+def _data_tables(conn):
+    """Return [(table, columns)] for every table a snapshot stores, skipping generated columns."""
+    virtual = [row[0] for row in conn.execute(VIRTUAL_TABLES_SQL)]
+    tables = []
+    for (name,) in conn.execute(DATA_TABLES_SQL).fetchall():
+        if any(name.startswith(f"{table}_") for table in virtual):
+            continue
+        # hidden is 2 or 3 for generated columns, which SQLite computes on insert
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_xinfo({_quote(name)})") if row[6] == 0]
+        tables.append((name, columns))
+    # sqlite_sequence last: loading tasks with their IDs would otherwise overwrite it
+    tables.sort(key=lambda table: table[0] == "sqlite_sequence")
+    return tables
+
+
+# Function to copy the database to a file while it stays in use
+def backup_database(destination, pages=BACKUP_PAGES_PER_STEP):
+    """Copy the database to `destination` with SQLite's online backup API.
+
+    Pages are copied `pages` at a time, so writers only wait for one step, never for
+    the whole copy. If another connection commits mid-backup SQLite restarts the
+    copy, so the file always holds one consistent state. The copy is written next
+    to `destination` and renamed into place once complete, and is left in
+    rollback-journal mode so it is a single self-contained file.
+
+    :param destination: Path of the backup file (replaced if it exists)
+    :param pages: Pages copied per step (-1 copies everything in one step)
+    :return: The number of pages copied (None on failure)
+    """
+    try:
+        scratch = _scratch_path(destination, "part")
+        target = sqlite3.connect(scratch, isolation_level=None)
+        try:
+            get_connection().backup(target, pages=pages)
+            target.execute("PRAGMA journal_mode = DELETE")
+            page_count = target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
+        os.replace(scratch, destination)
+        logging.info("Backed up %s to %s (%d pages)", get_db_path(), destination, page_count)
+        return page_count
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error backing up database: {e}")
+        logging.error("Error backing up database to %s: %s", destination, e)
+        return None
+
+
+# Function to export every table to a compressed snapshot file
+def export_snapshot(destination):
+    """Write the database to a gzip-compressed, column-oriented snapshot file.
+
+    Every table is read inside one read transaction, so the snapshot is consistent
+    and, in WAL mode, writers are not blocked while it is written. Derived data (the
+    full-text indexes and every index) is not stored; restore_database rebuilds it.
+
+    :param destination: Path of the snapshot file, conventionally *.jsonl.gz (replaced if it exists)
+    :return: Dictionary with the rows written per table and the SHA-256 (None on failure)
+    """
+    conn = get_connection()
+    checksum = hashlib.sha256()
+    counts = {}
+    try:
+        scratch = _scratch_path(destination, "part")
+        conn.execute("BEGIN")
+        try:
+            tables = _data_tables(conn)
+            header = {
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "schema_version": conn.execute("PRAGMA user_version").fetchone()[0],
+                "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "tables": [{"name": name, "columns": columns} for name, columns in tables],
+            }
+            with gzip.open(scratch, "wb", compresslevel=SNAPSHOT_COMPRESSLEVEL) as f:
+                def write(record):
+                    line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+                    checksum.update(line)
+                    f.write(line)
+
+                write(header)
+                for name, columns in tables:
+                    counts[name] = 0
+                    cursor = conn.execute(f"SELECT {', '.join(map(_quote, columns))} FROM {_quote(name)}")
+                    while True:
+                        rows = cursor.fetchmany(SNAPSHOT_BLOCK_ROWS)
+                        if not rows:
+                            break
+                        write({"table": name, "columns": list(zip(*rows))})
+                        counts[name] += len(rows)
+                # The trailer is not part of its own checksum
+                f.write(json.dumps({"rows": counts, "sha256": checksum.hexdigest()}).encode("utf-8") + b"\n")
+        finally:
+            conn.execute("COMMIT")
+        os.replace(scratch, destination)
+        logging.info("Exported snapshot of %s to %s: %s", get_db_path(), destination, counts)
+        return {"rows": counts, "sha256": checksum.hexdigest()}
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error exporting snapshot: {e}")
+        logging.error("Error exporting snapshot to %s: %s", destination, e)
+        return None
+
+
+def _read_snapshot(path):
+    """Yield a snapshot's header, then its blocks, checking the checksum and row counts at the end.
+
+    :raise ValueError: If the file is not a snapshot, is truncated or does not match its checksum
+    """
+    checksum = hashlib.sha256()
+    counts = {}
+    trailer = None
+    try:
+        with gzip.open(path, "rb") as f:
+            first = f.readline()
+            checksum.update(first)
+            try:
+                header = json.loads(first)
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+                raise ValueError(f"{path} is not a task manager snapshot")
+            if header["version"] > SNAPSHOT_VERSION:
+                raise ValueError(f"{path} was written by a newer version of the task manager (snapshot format {header['version']})")
+            yield header
+            for line in f:
+                record = json.loads(line)
+                if "sha256" in record:
+                    trailer = record
+                    break
+                checksum.update(line)
+                counts[record["table"]] = counts.get(record["table"], 0) + len(record["columns"][0])
+                yield record
+    except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+        raise ValueError(f"{path} is damaged: {e}")
+    if trailer is None:
+        raise ValueError(f"{path} is truncated: the checksum trailer is missing")
+    if checksum.hexdigest() != trailer["sha256"]:
+        raise ValueError(f"{path} does not match its checksum (expected {trailer['sha256']}, got {checksum.hexdigest()})")
+    if {name: count for name, count in trailer["rows"].items() if count} != counts:
+        raise ValueError(f"{path} has different row counts than its trailer records")
+
+
+# Function to check a backup or snapshot file without restoring it
+def verify_backup(path, full=True):
+    """Check that a backup or snapshot file is complete and undamaged.
+
+    Snapshots are checked against their SHA-256 and row counts; SQLite backups with
+    PRAGMA integrity_check.
+
+    :param path: A file written by backup_database or export_snapshot
+    :param full: False runs PRAGMA quick_check on SQLite backups instead, which skips
+                 matching every index against its table and is several times faster
+    :return: Dictionary with the file's "kind", "schema_version" and "tasks" count
+    :raise ValueError: If the file is damaged or of an unknown kind
+    """
+    kind = _backup_kind(path)
+    if kind == "snapshot":
+        tasks = 0
+        records = _read_snapshot(path)
+        schema_version = next(records)["schema_version"]
+        for record in records:
+            if record["table"] == "tasks":
+                tasks += len(record["columns"][0])
+        return {"kind": kind, "schema_version": schema_version, "tasks": tasks}
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check" if full else "PRAGMA quick_check")]
+        if problems != ["ok"]:
+            raise ValueError(f"{path} is damaged: {'; '.join(problems[:5])}")
+        return {"kind": kind,
+                "schema_version": conn.execute("PRAGMA user_version").fetchone()[0],
+                "tasks": conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]}
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"{path} is not a readable database: {e}")
+    finally:
+        conn.close()
+
+
+def _backup_kind(path):
+    try:
+        with open(path, "rb") as f:
+            magic = f.read(len(SQLITE_MAGIC))
+    except OSError as e:
+        raise ValueError(f"cannot read {path}: {e.strerror}")
+    if magic.startswith(GZIP_MAGIC):
+        return "snapshot"
+    if magic == SQLITE_MAGIC:
+        return "sqlite"
+    raise ValueError(f"{path} is neither a SQLite backup nor a snapshot")
+
+
+def _load_snapshot(path, scratch):
+    """Build a complete database at `scratch` from a snapshot, migrated to the current schema.
+
+    The schema the snapshot was taken with is created first, so its columns line up.
+    Indexes and triggers are dropped while the rows are inserted, then created in one
+    pass each, and the full-text indexes are rebuilt from the restored tables.
+    """
+    records = _read_snapshot(path)
+    header = next(records)
+    version = header["schema_version"]
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"{path} has schema version {version}, newer than this version of the task manager ({SCHEMA_VERSION})")
+
+    conn = sqlite3.connect(scratch, isolation_level=None)
+    try:
+        # The file is discarded if the load fails, so it needs no journal and no fsyncs,
+        # and it must match the live database's page size to be copied into it
+        conn.execute(f"PRAGMA page_size = {get_connection().execute('PRAGMA page_size').fetchone()[0]}")
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -262144")
+        # The rows passed the CHECK constraints when first written; re-checking them
+        # doubles the cost of each insert
+        conn.execute("PRAGMA ignore_check_constraints = ON")
+        # Lets CREATE INDEX sort with helper threads on multi-core machines
+        conn.execute("PRAGMA threads = 4")
+        conn.execute("BEGIN")
+        conn.execute(CREATE_TASKS_SQL)
+        for migration in MIGRATIONS[:version]:
+            migration(conn)
+        deferred = conn.execute(DEFERRED_SCHEMA_SQL).fetchall()
+        for kind, name, _ in deferred:
+            conn.execute(f"DROP {kind.upper()} {_quote(name)}")
+
+        statements = {table["name"]: f"INSERT INTO {_quote(table['name'])} ({', '.join(map(_quote, table['columns']))}) "
+                                     f"VALUES ({', '.join('?' * len(table['columns']))})" for table in header["tables"]}
+        loaded = set()
+        for record in records:
+            if record["table"] not in loaded:
+                # Drop the rows the migrations seeded (generation counters, sequence numbers)
+                conn.execute(f"DELETE FROM {_quote(record['table'])}")
+                loaded.add(record["table"])
+            conn.executemany(statements[record["table"]], zip(*record["columns"]))
+
+        # Each index is built with one sort of the loaded rows
+        for _, _, sql in deferred:
+            conn.execute(sql)
+        for name, sql in conn.execute(VIRTUAL_TABLES_SQL).fetchall():
+            if "fts5" in sql.lower():
+                conn.execute(f"INSERT INTO {_quote(name)} ({_quote(name)}) VALUES ('rebuild')")
+        for migration in MIGRATIONS[version:]:
+            migration(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+        # Planner statistics for the new indexes, sampled rather than read in full
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+
+# Function to replace the database with the contents of a backup or snapshot
+def restore_database(path):
+    """Replace every table of the database with the contents of a backup or snapshot file.
+
+    A snapshot is first loaded into a scratch database next to the live one (see
+    _load_snapshot); a SQLite backup is checked with PRAGMA quick_check. The result is copied
+    into the live database with the backup API, in one write transaction, so other
+    connections see either the old or the restored data. Backups from an older schema
+    are migrated. The list cache generation is moved past every value it had before,
+    so no result cached before the restore can be served again, and every
+    connection is reopened.
+
+    :param path: A file written by backup_database or export_snapshot
+    :return: The number of tasks restored (None on failure)
+    :raise ValueError: If the file is damaged, of an unknown kind or from a newer schema
+    """
+    kind = _backup_kind(path)
+    if kind == "sqlite":
+        verify_backup(path, full=False)
+    source = path
+    try:
+        if kind == "snapshot":
+            source = _scratch_path(get_db_path(), "restore")
+            _load_snapshot(path, source)
+        conn = get_connection()
+        generations = dict(conn.execute("SELECT name, generation FROM table_generations"))
+        restored = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        try:
+            if restored.execute("PRAGMA user_version").fetchone()[0] > SCHEMA_VERSION:
+                raise ValueError(f"{path} has a newer schema than this version of the task manager ({SCHEMA_VERSION})")
+            restored.backup(conn)
+        finally:
+            restored.close()
+        close_all_connections()
+        init_db()
+        with transaction() as conn:
+            for name, generation in generations.items():
+                conn.execute("UPDATE table_generations SET generation = max(generation, ?) + 1 WHERE name = ?", (generation, name))
+            tasks = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        logging.info("Restored %s from %s (%s, %d tasks)", get_db_path(), path, kind, tasks)
+        return tasks
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error restoring database: {e}")
+        logging.error("Error restoring database from %s: %s", path, e)
+        return None
+    finally:
+        if source != path:
+            _remove_database_files(source)
@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+
+# Bounds of the list_tasks result cache: number of cached queries and total cached rows
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_ROWS = 100000
+
+# One counter per table, bumped by every write path in the same transaction as the
+# write. Stored in the database, so a write made by any process invalidates the
+# cached results of every other process. Counters start at a random value so a
+# database recreated at the same path never repeats an old generation.
+GENERATIONS_SCHEMA_SQL = '''CREATE TABLE IF NOT EXISTS table_generations (
+                                name TEXT PRIMARY KEY,
+                                generation INTEGER NOT NULL
+                            ) WITHOUT ROWID'''
+SEED_GENERATION_SQL = "INSERT OR IGNORE INTO table_generations (name, generation) VALUES (?, abs(random() % 1000000000000))"
+GET_GENERATION_SQL = "SELECT generation FROM table_generations WHERE name = ?"
+BUMP_GENERATION_SQL = "UPDATE table_generations SET generation = generation + 1 WHERE name = ?"
+
+
+def table_generation(conn, table="tasks"):
+    """Return the current generation of `table` (None if the database has no counter for it)."""
+    row = conn.execute(GET_GENERATION_SQL, (table,)).fetchone()
+    return row[0] if row else None
+
+
+def bump_generation(conn, table="tasks"):
+    """Mark every cached result for `table` stale; call inside the writing transaction."""
+    conn.execute(BUMP_GENERATION_SQL, (table,))
+
+
+class QueryCache:
+    """Thread-safe LRU cache of query results, validated against a table generation.
+
+    An entry is served only while the table's generation still equals the one
+    recorded when the entry was stored; a stale entry is dropped on lookup. The
+    cache holds at most `max_entries` results and `max_rows` rows in total; larger
+    results are not cached at all.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_rows=DEFAULT_MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = self.evictions = 0
+
+    def get(self, key, generation):
+        """Return the cached rows for `key` if still current, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._discard(key)
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, generation, rows):
+        """Store a result, evicting the least recently used entries to stay within bounds."""
+        rows = tuple(rows)
+        if generation is None or len(rows) > self.max_rows:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (generation, rows)
+            self._rows += len(rows)
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key):
+        self._rows -= len(self._entries.pop(key)[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size as a dictionary."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "rows": self._rows,
+                "max_entries": self.max_entries,
+                "max_rows": self.max_rows,
+            }
+
+
+# Shared cache for list_tasks results
+list_cache = QueryCache()
+
+
+def cache_stats():
+    """Return the statistics of the list_tasks cache."""
+    return list_cache.stats()
@@ -0,0 +1,123 @@
+import logging
+import sqlite3
+
+from modules.connection_handler import get_connection, transaction
+from modules.task_model import TASK_COLUMNS, Task
+
+# Only edits of these columns are logged; bookkeeping columns that triggers maintain
+# (completed_at) would otherwise log every status change twice
+LOGGED_COLUMNS = TASK_COLUMNS[1:] + ("recurrence_anchor",)
+CHANGE_LOG_UPDATE_TRIGGER_SQL = f'''CREATE TRIGGER IF NOT EXISTS task_changes_update AFTER UPDATE OF {", ".join(LOGGED_COLUMNS)} ON tasks BEGIN
+                                     INSERT INTO task_changes (task_id, operation) VALUES (new.id, 'update');
+                                 END'''
+
+# Append-only log of every insert, update and delete on tasks, written by triggers so
+# no write path can bypass it (tag edits are logged as updates by add_tags and
+# remove_tags). seq is AUTOINCREMENT, so it only ever grows and is never reused, even
+# when compaction deletes the newest entry.
+CHANGE_LOG_SCHEMA_SQL = (
+    '''CREATE TABLE IF NOT EXISTS task_changes (
+           seq INTEGER PRIMARY KEY AUTOINCREMENT,
+           task_id INTEGER NOT NULL,
+           operation TEXT NOT NULL CHECK(operation IN ('insert', 'update', 'delete')),
+           changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+       )''',
+    '''CREATE TRIGGER IF NOT EXISTS task_changes_insert AFTER INSERT ON tasks BEGIN
+           INSERT INTO task_changes (task_id, operation) VALUES (new.id, 'insert');
+       END''',
+    CHANGE_LOG_UPDATE_TRIGGER_SQL,
+    '''CREATE TRIGGER IF NOT EXISTS task_changes_delete AFTER DELETE ON tasks BEGIN
+           INSERT INTO task_changes (task_id, operation) VALUES (old.id, 'delete');
+       END''',
+)
+
+# The latest change of every task changed after a given seq, with the task's current
+# row (NULL once deleted). Several edits to one task collapse into one entry, so a
+# consumer's work is proportional to the number of tasks that changed.
+CHANGES_SINCE_SQL = f'''SELECT latest.seq, task_changes.operation, task_changes.changed_at,
+                               latest.task_id, {", ".join(f"tasks.{column}" for column in TASK_COLUMNS)}
+                        FROM (SELECT task_id, max(seq) AS seq FROM task_changes WHERE seq > ? GROUP BY task_id) AS latest
+                        JOIN task_changes ON task_changes.seq = latest.seq
+                        LEFT JOIN tasks ON tasks.id = latest.task_id
+                        ORDER BY latest.seq'''
+
+# Entries at or below a seq that a later entry for the same task supersedes
+COMPACT_CHANGES_SQL = '''DELETE FROM task_changes
+                         WHERE seq <= ? AND seq NOT IN (SELECT max(seq) FROM task_changes GROUP BY task_id)'''
+PURGE_DELETED_SQL = "DELETE FROM task_changes WHERE seq <= ? AND operation = 'delete'"
+
+# Rows fetched from SQLite per round trip while streaming changes
+CHANGE_FETCH_SIZE = 1000
+
+
+def create_change_log(conn):
+    """Create the change log and its triggers, seeding one entry per existing task.
+
+    The seed entries mean a consumer starting from seq 0 receives every task.
+    """
+    for statement in CHANGE_LOG_SCHEMA_SQL:
+        conn.execute(statement)
+    conn.execute("INSERT INTO task_changes (task_id, operation) SELECT id, 'insert' FROM tasks ORDER BY id")
+
+
+def latest_change_seq():
+    """Return the highest seq in the change log (0 if it is empty)."""
+    return get_connection().execute("SELECT coalesce(max(seq), 0) FROM task_changes").fetchone()[0]
+
+
+# Function to stream the changes made after a sequence number
+def iter_changes(since=0, limit=None):
+    """Yield the latest change of each task changed after `since`, oldest first.
+
+    Each change is a dictionary: {"seq", "op" ("insert", "update" or "delete"),
+    "changed_at", "task_id", "task"}, where "task" is the task's current row as a
+    dictionary, or None if it was deleted. A consumer stores the last seq it has
+    applied and passes it as `since` next time.
+
+    :param since: Last seq the consumer has already applied (default: 0, everything)
+    :param limit: Maximum number of changes to yield
+    :return: A generator of change dictionaries
+    """
+    cursor = get_connection().execute(CHANGES_SINCE_SQL if limit is None else CHANGES_SINCE_SQL + " LIMIT ?",
+                                      (since,) if limit is None else (since, limit))
+    while True:
+        rows = cursor.fetchmany(CHANGE_FETCH_SIZE)
+        if not rows:
+            return
+        for row in rows:
+            yield {
+                "seq": row[0],
+                "op": row[1],
+                "changed_at": row[2],
+                "task_id": row[3],
+                "task": Task._make(row[4:]).to_dict() if row[4] is not None else None,
+            }
+
+
+# Function to drop change log entries no consumer needs any more
+def compact_changes(through_seq=None, purge_deleted=False):
+    """Shrink the change log without changing what iter_changes returns.
+
+    Entries at or below `through_seq` that a later entry for the same task
+    supersedes are deleted, so every task keeps exactly its latest entry and a
+    consumer at any position still syncs correctly.
+
+    :param through_seq: Compact entries up to this seq (default: the whole log)
+    :param purge_deleted: Also drop deletions at or below `through_seq`. Only safe
+                          once every consumer has read past `through_seq`; a consumer
+                          further behind would not learn that those tasks were deleted.
+    :return: The number of entries removed (None on failure)
+    """
+    try:
+        with transaction() as conn:
+            if through_seq is None:
+                through_seq = conn.execute("SELECT coalesce(max(seq), 0) FROM task_changes").fetchone()[0]
+            removed = conn.execute(COMPACT_CHANGES_SQL, (through_seq,)).rowcount
+            if purge_deleted:
+                removed += conn.execute(PURGE_DELETED_SQL, (through_seq,)).rowcount
+        logging.info("Compacted change log through seq %s: %d entries removed", through_seq, removed)
+        return removed
+    except sqlite3.Error as e:
+        print(f"Error compacting change log: {e}")
+        logging.error("Error compacting change log: %s", e)
+        return None
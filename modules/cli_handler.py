@@ -1,7 +1,91 @@
 import argparse
+from datetime import datetime
+from functools import lru_cache
 
+from modules.rank_handler import DEFAULT_RANK_WEIGHTS
+from modules.task_model import TASK_REF_PATTERN
 
-def parse_arguments():
+
+# update --where fields: the list command's filters, with the value type or allowed values
+WHERE_FIELDS = {
+    "task-title": str,
+    "query": str,
+    "parent-id": int,
+    "status": ("To Do", "Doing", "Done"),
+    "priority": ("High", "Medium", "Low"),
+    "category": str,
+    "tag": str,
+}
+
+
+def parse_where(text):
+    """Parse an update --where FIELD=VALUE argument into a (list_tasks filter key, value) pair."""
+    field, sep, value = text.partition("=")
+    field = field.strip()
+    kind = WHERE_FIELDS.get(field)
+    if not sep or kind is None:
+        raise argparse.ArgumentTypeError(f"expected FIELD=VALUE with FIELD one of {', '.join(WHERE_FIELDS)}, got '{text}'")
+    if isinstance(kind, tuple):
+        if value not in kind:
+            raise argparse.ArgumentTypeError(f"invalid {field} '{value}' (choose from {', '.join(kind)})")
+    else:
+        try:
+            value = kind(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"{field} must be a number, got '{value}'")
+    return field.replace("-", "_"), value
+
+
+def parse_task_ref(text):
+    """argparse type for a task ID, optionally qualified by its shard: "12" -> 12, "work:12" stays "work:12"."""
+    match = TASK_REF_PATTERN.match(text.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"expected a task ID or SHARD:ID (e.g., 12 or work:12), got '{text}'")
+    task_id = int(match["task_id"])
+    return task_id if match["shard"] is None else f"{match['shard']}:{task_id}"
+
+
+def parse_date(text):
+    """argparse type for YYYY-MM-DD dates."""
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a date in YYYY-MM-DD format, got '{text}'")
+
+
+def parse_time(text):
+    """argparse type for HH:MM times; single-digit hours are padded ("9:30" -> "09:30")."""
+    try:
+        return datetime.strptime(text, "%H:%M").strftime("%H:%M")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a time in HH:MM format, got '{text}'")
+
+
+def parse_datetime(text):
+    """argparse type for "YYYY-MM-DD" or "YYYY-MM-DD HH:MM"; returns the text normalized."""
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(text, fmt).strftime(fmt)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD or 'YYYY-MM-DD HH:MM', got '{text}'")
+
+
+def parse_weight(text):
+    """argparse type for a next --weight KEY=VALUE argument; returns a (weight name, float) pair."""
+    key, sep, value = text.partition("=")
+    key = key.strip().replace("-", "_")
+    if not sep or key not in DEFAULT_RANK_WEIGHTS:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE with KEY one of {', '.join(DEFAULT_RANK_WEIGHTS)}, got '{text}'")
+    try:
+        return key, float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{key} must be a number, got '{value}'")
+
+
+# The parser is built once per process and reused by every command the server runs
+@lru_cache(maxsize=None)
+def _build_parser():
     parser = argparse.ArgumentParser(
         description="Personal Task Manager: Manage your tasks effectively with advanced filtering, sorting, recurrence, and dependencies.",
         epilog="""
@@ -12,14 +96,44 @@ Examples of Usage:
   2. Update an existing task:
      py main.py update -tid 1 -tt "Updated Task Title" -s "Doing"
 
+     py main.py update --where priority=High --where category=Work -s "Doing" --yes
+
   3. List tasks with multiple filters and sorting:
      py main.py list --task-title "*Recruitment*" --parent-id 2 --status "To Do" --sort-by "priority,due-date"
+     py main.py list --status "To Do" --format jsonl | jq .title
+     py main.py list --tag "work AND urgent AND NOT blocked"
+
+     py main.py next -n 5 --weight blocking=5
+     py main.py watch --status "To Do" --sort-by priority,due-date
 
-  4. Delete a task along with its subtasks:
+  4. Search titles and descriptions:
+     py main.py search "resume OR cv"
+
+  5. Delete a task along with its subtasks:
      py main.py delete -tid 5
+
+  6. Bulk-create tasks from a CSV or JSON Lines file:
+     py main.py create --from-file tasks.csv
+
+  7. Back up the database while it is in use, and restore it:
+     py main.py backup tasks-backup.db
+     py main.py backup tasks.jsonl.gz --format snapshot
+     py main.py restore tasks.jsonl.gz
+
+  8. Keep a server running and send it commands from scripts:
+     py main.py serve &
+     py task_client.py list --status "To Do"
 """
     )
 
+    parser.add_argument("--db", action="append", help="Path to the SQLite database file (default: db/tasks.db or $TASK_MANAGER_DB); "
+                                                      "repeat to work on several databases as shards named after their files")
+    parser.add_argument("--shards", metavar="CONFIG", help="Shard configuration file listing the databases and how tasks are routed to them "
+                                                           "(default: $TASK_MANAGER_SHARDS)")
+    parser.add_argument("--shard", metavar="NAME", help="With several databases, run the command on this shard only and create tasks in it")
+    parser.add_argument("--profile", action="store_true", help="Print a breakdown of where the command spent its time (phases and SQL statements) to stderr")
+    parser.add_argument("--profile-file", metavar="PATH", help="Run the command under cProfile and save the statistics to PATH (read with pstats)")
+
     # Subparsers for different commands
     subparsers = parser.add_subparsers(dest="command", help="Task management commands")
 
@@ -28,35 +142,41 @@ Examples of Usage:
         "create",
         help="Create a new task. Supports recurrence and dependencies for advanced task management."
     )
-    create_parser.add_argument("-tt", "--task-title", required=True, help="Title of the task (e.g., 'Submit Resume')")
+    create_parser.add_argument("-tt", "--task-title", help="Title of the task (e.g., 'Submit Resume')")
     create_parser.add_argument("-td", "--description", help="Description of the task (e.g., 'Send CV to agencies')")
-    create_parser.add_argument("-c", "--category", choices=[
-        'Work', 'Personal', 'Careers Related', 'Home', 'Development', 'Research', 'Setup', 'Configuration'
-    ], required=True, help="Category of the task (e.g., 'Careers Related')")
-    create_parser.add_argument("-p", "--priority", choices=['High', 'Medium', 'Low'], required=True, help="Priority level")
-    create_parser.add_argument("-s", "--status", choices=['To Do', 'Doing', 'Done'], required=True, help="Task status")
-    create_parser.add_argument("-dd", "--due-date", help="Due date for the task in YYYY-MM-DD format (e.g., '2024-11-19')")
-    create_parser.add_argument("-ti", "--time", help="Time for the task in HH:MM format (e.g., '14:00')")
-    create_parser.add_argument("-pid", "--parent-id", type=int, default=0, help="Parent ID if this is a subtask (default is 0)")
+    create_parser.add_argument("-c", "--category", help="Category of the task (e.g., 'Careers Related'); also one of its tags")
+    create_parser.add_argument("-p", "--priority", choices=['High', 'Medium', 'Low'], help="Priority level")
+    create_parser.add_argument("-s", "--status", choices=['To Do', 'Doing', 'Done'], help="Task status")
+    create_parser.add_argument("-dd", "--due-date", type=parse_date, help="Due date for the task in YYYY-MM-DD format (e.g., '2024-11-19')")
+    create_parser.add_argument("-ti", "--time", type=parse_time, help="Time for the task in HH:MM format (e.g., '14:00')")
+    create_parser.add_argument("-pid", "--parent-id", type=parse_task_ref, default=0, help="Parent ID if this is a subtask (default is 0); SHARD:ID with several databases")
     create_parser.add_argument("-rec", "--recurrence", choices=["none", "daily", "weekly", "monthly"], default="none", help="Set recurrence for the task")
+    create_parser.add_argument("-tg", "--tags", help="Comma-separated tags (e.g., 'urgent,client-a')")
     create_parser.add_argument("-dep", "--dependencies", help="Comma-separated list of task IDs this task depends on (e.g., '3,4')")
+    create_parser.add_argument("-f", "--from-file", help="Bulk-create tasks from a .csv, .json or .jsonl file instead of the flags above")
+    create_parser.add_argument("--chunk-size", type=int, default=1000, help="Rows written per transaction with --from-file (default: 1000)")
 
     # --- Update command ---
     update_parser = subparsers.add_parser(
         "update",
         help="Update an existing task. Provide only the fields to be updated."
     )
-    update_parser.add_argument("-tid", "--task-id", type=int, required=True, help="ID of the task to update")
+    update_target = update_parser.add_mutually_exclusive_group(required=True)
+    update_target.add_argument("-tid", "--task-id", type=parse_task_ref, help="ID of the task to update (SHARD:ID with several databases)")
+    update_target.add_argument("-w", "--where", type=parse_where, action="append", metavar="FIELD=VALUE",
+                               help="Update every task matching FIELD=VALUE instead, using the list filters "
+                                    f"({', '.join(WHERE_FIELDS)}); repeat to combine with AND")
     update_parser.add_argument("-tt", "--task-title", help="New title of the task")
     update_parser.add_argument("-td", "--description", help="New description of the task")
-    update_parser.add_argument("-c", "--category", choices=[
-        'Work', 'Personal', 'Careers Related', 'Home', 'Development', 'Research', 'Setup', 'Configuration'
-    ], help="New category of the task")
+    update_parser.add_argument("-c", "--category", help="New category of the task")
     update_parser.add_argument("-p", "--priority", choices=['High', 'Medium', 'Low'], help="New priority level")
     update_parser.add_argument("-s", "--status", choices=['To Do', 'Doing', 'Done'], help="New status")
-    update_parser.add_argument("-dd", "--due-date", help="New due date for the task in YYYY-MM-DD format")
-    update_parser.add_argument("-ti", "--time", help="New time for the task in HH:MM format")
-    update_parser.add_argument("-pid", "--parent-id", type=int, help="New parent ID if this is a subtask")
+    update_parser.add_argument("-dd", "--due-date", type=parse_date, help="New due date for the task in YYYY-MM-DD format")
+    update_parser.add_argument("-ti", "--time", type=parse_time, help="New time for the task in HH:MM format")
+    update_parser.add_argument("-pid", "--parent-id", type=parse_task_ref, help="New parent ID if this is a subtask")
+    update_parser.add_argument("-dep", "--dependencies", help="Replace the task's dependencies with this comma-separated list of task IDs ('' clears them)")
+    update_parser.add_argument("--dry-run", action="store_true", help="Only show what would change")
+    update_parser.add_argument("-y", "--yes", action="store_true", help="Apply without asking for confirmation")
 
     # --- List command ---
     list_parser = subparsers.add_parser(
@@ -65,19 +185,232 @@ Examples of Usage:
     )
     list_parser.add_argument("-a", "--all", action="store_true", help="List all tasks")
     list_parser.add_argument("-tt", "--task-title", help="Filter by task title (supports wildcard '*')")
+    list_parser.add_argument("-q", "--query", help="Full-text filter over titles and descriptions (results ranked by relevance)")
     list_parser.add_argument("-pid", "--parent-id", type=int, help="Filter by parent ID")
     list_parser.add_argument("-s", "--status", choices=["To Do", "Doing", "Done"], help="Filter by status")
     list_parser.add_argument("-p", "--priority", choices=["High", "Medium", "Low"], help="Filter by priority")
-    list_parser.add_argument("-c", "--category", choices=[
-        "Work", "Personal", "Careers Related", "Home", "Development", "Research", "Setup", "Configuration"
-    ], help="Filter by category")
+    list_parser.add_argument("-c", "--category", help="Filter by category")
+    list_parser.add_argument("-tg", "--tag", action="append", metavar="EXPR",
+                             help="Filter by tags, e.g. 'work AND urgent AND NOT blocked' (AND, OR, NOT, parentheses; "
+                                  "quote tags with spaces); repeat to combine with AND")
     list_parser.add_argument("-sb", "--sort-by", help="Comma-separated fields to sort by (e.g., 'due-date,priority')")
+    list_parser.add_argument("-l", "--limit", type=int, help="Show at most this many tasks (page size when used with --page)")
+    list_parser.add_argument("-o", "--offset", type=int, default=0, help="Skip this many matching tasks")
+    list_parser.add_argument("-pg", "--page", type=int, help="Show this page of results, 1-based (page size: --limit, default 50)")
+    list_parser.add_argument("-fmt", "--format", choices=["grid", "plain", "tsv", "jsonl"], default="grid", help="Output format: a grid table, aligned plain text, tab-separated values or JSON Lines (default: grid)")
+    list_parser.add_argument("--explain", action="store_true", help="Print SQLite's query plan for these filters instead of listing tasks")
+    list_parser.add_argument("--include-archived", action="store_true", help="Also list tasks moved to the archive")
+
+    # --- Search command ---
+    search_parser = subparsers.add_parser(
+        "search",
+        help="Full-text search over task titles and descriptions, best matches first."
+    )
+    search_parser.add_argument("query", help="Search terms; supports prefix* matching, OR, NOT and \"quoted phrases\"")
+    search_parser.add_argument("-l", "--limit", type=int, default=20, help="Maximum number of results (default: 20)")
+    search_parser.add_argument("--include-archived", action="store_true", help="Also search tasks moved to the archive")
+
+    # --- Tree command ---
+    tree_parser = subparsers.add_parser(
+        "tree",
+        help="Show tasks as a nested tree of subtasks."
+    )
+    tree_parser.add_argument("-tid", "--task-id", type=parse_task_ref, help="Show only this task and its subtasks (default: all top-level tasks)")
+    tree_parser.add_argument("-d", "--depth", type=int, default=1000, help="Deepest subtask level to show (default: all)")
+
+    # --- Ready command ---
+    ready_parser = subparsers.add_parser(
+        "ready",
+        help="List open tasks whose dependencies are all done, in dependency order."
+    )
+    ready_parser.add_argument("-a", "--all", action="store_true", help="List every open task in dependency (topological) order, including blocked ones")
+
+    # --- Rollover command ---
+    rollover_parser = subparsers.add_parser(
+        "rollover",
+        help="Advance recurring tasks whose next occurrence has arrived. Safe to run repeatedly (e.g. from cron)."
+    )
+    rollover_parser.add_argument("--as-of", help="Roll over as of this date in YYYY-MM-DD format (default: today)")
+    rollover_parser.add_argument("--dry-run", action="store_true", help="Only report how many tasks would roll over")
+
+    # --- Occurrences command ---
+    occurrences_parser = subparsers.add_parser(
+        "occurrences",
+        help="Show the upcoming dates of a recurring task without changing it."
+    )
+    occurrences_parser.add_argument("-tid", "--task-id", type=parse_task_ref, required=True, help="ID of the recurring task")
+    occurrences_parser.add_argument("-n", "--count", type=int, default=10, help="Number of occurrences to show (default: 10)")
+    occurrences_parser.add_argument("--from", dest="from_date", help="First date to include in YYYY-MM-DD format (default: today)")
+    occurrences_parser.add_argument("--to", dest="to_date", help="Last date to include in YYYY-MM-DD format")
+
+    # --- Agenda command ---
+    agenda_parser = subparsers.add_parser(
+        "agenda",
+        help="List what is due in a time window, including upcoming occurrences of recurring tasks."
+    )
+    agenda_parser.add_argument("--from", dest="from_date", type=parse_datetime, help="Start of the window, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM' (default: now)")
+    agenda_parser.add_argument("--to", dest="to_date", type=parse_datetime, help="End of the window; a date alone includes that whole day (default: --days after the start)")
+    agenda_parser.add_argument("-n", "--days", type=int, default=7, help="Length of the window in days when --to is not given (default: 7)")
+    agenda_parser.add_argument("-a", "--all", action="store_true", help="Include completed tasks")
+
+    # --- Watch command ---
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="Keep a live list of tasks on screen, updated as tasks change; filter and sort it by typing commands."
+    )
+    watch_parser.add_argument("-tt", "--task-title", help="Filter by task title (supports wildcard '*')")
+    watch_parser.add_argument("-q", "--query", help="Only tasks whose title or description contains all these words")
+    watch_parser.add_argument("-pid", "--parent-id", type=int, help="Filter by parent ID")
+    watch_parser.add_argument("-s", "--status", choices=["To Do", "Doing", "Done"], help="Filter by status")
+    watch_parser.add_argument("-p", "--priority", choices=["High", "Medium", "Low"], help="Filter by priority")
+    watch_parser.add_argument("-c", "--category", help="Filter by category")
+    watch_parser.add_argument("-sb", "--sort-by", help="Comma-separated fields to sort by (e.g., 'due-date,priority')")
+    watch_parser.add_argument("-i", "--interval", type=float, default=1.0, help="Seconds between checks for changes (default: 1)")
+
+    # --- Next command ---
+    next_parser = subparsers.add_parser(
+        "next",
+        help="Show the open tasks to work on next, most urgent first (priority, due date, open subtasks, tasks blocked)."
+    )
+    next_parser.add_argument("-n", "--count", type=int, default=10, help="Number of tasks to show (default: 10)")
+    next_parser.add_argument("-w", "--weight", type=parse_weight, action="append", metavar="KEY=VALUE",
+                             help="Change a score weight, e.g. blocking=5 or horizon_days=7; repeatable. Keys: "
+                                  + ", ".join(f"{key} ({value:g})" for key, value in DEFAULT_RANK_WEIGHTS.items()))
+    next_parser.add_argument("--as-of", type=parse_datetime, help="Score due dates as of 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM' (default: now)")
+
+    # --- Tag command ---
+    tag_parser = subparsers.add_parser(
+        "tag",
+        help="Show, add or remove the tags of a task."
+    )
+    tag_parser.add_argument("-tid", "--task-id", type=parse_task_ref, required=True, help="ID of the task")
+    tag_parser.add_argument("-a", "--add", help="Comma-separated tags to add")
+    tag_parser.add_argument("-r", "--remove", help="Comma-separated tags to remove")
+
+    # --- Tags command ---
+    subparsers.add_parser(
+        "tags",
+        help="List every tag in use with its number of tasks."
+    )
 
     # --- Delete command ---
     delete_parser = subparsers.add_parser(
         "delete",
         help="Delete a task along with its subtasks. Asks for confirmation before deletion."
     )
-    delete_parser.add_argument("-tid", "--task-id", type=int, required=True, help="ID of the task to delete")
+    delete_parser.add_argument("-tid", "--task-id", type=parse_task_ref, required=True, help="ID of the task to delete (SHARD:ID with several databases)")
+
+    # --- Stats command ---
+    stats_parser = subparsers.add_parser(
+        "stats",
+        aliases=["report"],
+        help="Count tasks by status, category or priority, including overdue tasks and completion rates."
+    )
+    stats_parser.add_argument("-g", "--group-by", default="status", help="Comma-separated fields to group by: status, category, priority, due-date, parent-id, recurrence (default: status; '' for one total row)")
+    stats_parser.add_argument("-s", "--status", choices=["To Do", "Doing", "Done"], help="Only count tasks with this status")
+    stats_parser.add_argument("-p", "--priority", choices=["High", "Medium", "Low"], help="Only count tasks with this priority")
+    stats_parser.add_argument("-c", "--category", help="Only count tasks in this category")
+    stats_parser.add_argument("-tg", "--tag", action="append", metavar="EXPR", help="Only count tasks matching this tag expression (as in list)")
+    stats_parser.add_argument("-pid", "--parent-id", type=int, help="Only count direct subtasks of this task")
+    stats_parser.add_argument("-r", "--rollup", action="store_true", help="Show the percentage of Done subtasks for each top-level task tree instead")
+    stats_parser.add_argument("-tid", "--task-id", type=parse_task_ref, help="With --rollup, show only this task's tree")
+
+    # --- Archive command ---
+    archive_parser = subparsers.add_parser(
+        "archive",
+        help="Move tasks completed long ago out of the working set into the archive."
+    )
+    archive_parser.add_argument("-d", "--older-than", type=int, default=90, metavar="DAYS", help="Archive tasks Done for at least this many days (default: 90)")
+    archive_parser.add_argument("-b", "--batch-size", type=int, default=500, help="Task trees moved per transaction (default: 500)")
+    archive_parser.add_argument("--dry-run", action="store_true", help="Only report how many tasks would be archived")
+
+    # --- Changes command ---
+    changes_parser = subparsers.add_parser(
+        "changes",
+        help="Print tasks changed since a sequence number as JSON Lines, for syncing other systems."
+    )
+    changes_parser.add_argument("--since", type=int, default=0, help="Last sequence number already synced (default: 0, every task)")
+    changes_parser.add_argument("-l", "--limit", type=int, help="Print at most this many changes")
+    changes_parser.add_argument("--compact", action="store_true", help="Instead of printing, drop log entries superseded by later changes")
+    changes_parser.add_argument("--through", type=int, help="With --compact, only compact entries up to this sequence number")
+    changes_parser.add_argument("--purge-deleted", action="store_true", help="With --compact, also drop deletions (only once every consumer has synced past --through)")
+
+    # --- Backup, restore and verify commands ---
+    backup_parser = subparsers.add_parser(
+        "backup",
+        help="Copy the database to a file while it stays in use, or export a compressed snapshot."
+    )
+    backup_parser.add_argument("file", help="Backup file to write (replaced if it exists)")
+    backup_parser.add_argument("-f", "--format", choices=["sqlite", "snapshot"], default="sqlite",
+                               help="sqlite: a copy of the database file made with the online backup API; "
+                                    "snapshot: gzip-compressed rows with a SHA-256 checksum, smaller and restored with bulk inserts (default: sqlite)")
+    backup_parser.add_argument("--step-pages", type=int, default=1024, help="With --format sqlite, database pages copied per step (default: 1024)")
+
+    restore_parser = subparsers.add_parser(
+        "restore",
+        help="Replace every task with the contents of a backup or snapshot file. Asks for confirmation first."
+    )
+    restore_parser.add_argument("file", help="File written by the backup command (either format)")
+    restore_parser.add_argument("-y", "--yes", action="store_true", help="Restore without asking for confirmation")
+
+    verify_parser = subparsers.add_parser(
+        "verify",
+        help="Check that a backup or snapshot file is complete and undamaged, without restoring it."
+    )
+    verify_parser.add_argument("file", help="File written by the backup command (either format)")
+
+    # --- Cache stats command ---
+    subparsers.add_parser(
+        "cache-stats",
+        help="Show hit/miss statistics of the list cache (most useful against a running server)."
+    )
+
+    # --- Serve command ---
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Keep the task manager loaded and run commands sent by task_client.py over a Unix socket."
+    )
+    serve_parser.add_argument("--socket", help="Socket path to listen on (default: db/task_manager.sock or $TASK_MANAGER_SOCKET)")
+
+    return parser, subparsers.choices
+
+
+def parse_arguments(argv=None):
+    """Parse a command line.
+
+    :param argv: Arguments without the program name (default: sys.argv[1:])
+    :return: The parsed arguments
+    """
+    parser, commands = _build_parser()
+    args = parser.parse_args(argv)
+    create_parser, list_parser = commands["create"], commands["list"]
+
+    # Title, category, priority and status are required unless importing from a file
+    if args.command == "create" and not args.from_file:
+        missing = [flag for flag, value in (("--task-title", args.task_title), ("--category", args.category),
+                                            ("--priority", args.priority), ("--status", args.status)) if not value]
+        if missing:
+            create_parser.error(f"the following arguments are required: {', '.join(missing)}")
+
+    # --page N is shorthand for an offset of (N - 1) pages
+    if args.command == "list" and args.page is not None:
+        if args.page < 1:
+            list_parser.error("--page must be 1 or greater")
+        args.limit = args.limit or 50
+        args.offset += (args.page - 1) * args.limit
+
+    return args
+
+
+# Function to ask the user a yes/no question
+def confirm(prompt):
+    """Ask a yes/no question on stdin.
 
-    return parser.parse_args()
+    :param prompt: The question, e.g. "Delete this task? (y/n): "
+    :return: True only if the answer is "y"; end of input counts as "no"
+    """
+    try:
+        return input(prompt).strip().lower() == 'y'
+    except EOFError:
+        print()
+        return False
@@ -0,0 +1,72 @@
+import json
+import os
+import socket
+import sys
+
+# Socket the serve command listens on; override with TASK_MANAGER_SOCKET
+DEFAULT_SOCKET_PATH = os.path.join('db', 'task_manager.sock')
+
+# Wire protocol: one JSON object per line in each direction.
+#   client -> server: {"argv": [...], "cwd": ..., "db": ..., "tty": ...}, then {"line": ...} per input request
+#   server -> client: {"out": text}, {"err": text}, {"input": true} and finally {"exit": code}
+ENCODING = "utf-8"
+
+
+def get_socket_path():
+    """Return the path of the command server's Unix socket."""
+    return os.environ.get("TASK_MANAGER_SOCKET", DEFAULT_SOCKET_PATH)
+
+
+def send_message(stream, message):
+    stream.write(json.dumps(message) + "\n")
+    stream.flush()
+
+
+def receive_message(stream):
+    line = stream.readline()
+    return json.loads(line) if line else None
+
+
+# Function to run a command on a running task manager server
+def forward_command(argv, socket_path=None):
+    """Send a command line to the server started with `main.py serve` and relay its output.
+
+    Prompts such as delete confirmations are answered from this process's stdin, so
+    commands behave the same as when run directly.
+
+    :param argv: Command-line arguments, without the program name
+    :param socket_path: Server socket (default: $TASK_MANAGER_SOCKET or db/task_manager.sock)
+    :return: The command's exit code, or None if no server is listening
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path or get_socket_path())
+    except OSError:
+        sock.close()
+        return None
+
+    with sock, sock.makefile("r", encoding=ENCODING) as reader, sock.makefile("w", encoding=ENCODING) as writer:
+        send_message(writer, {
+            "argv": list(argv),
+            "cwd": os.getcwd(),
+            "db": os.environ.get("TASK_MANAGER_DB"),
+            "tty": sys.stdout.isatty(),
+        })
+        while True:
+            message = receive_message(reader)
+            if message is None:
+                # The server went away mid-command
+                print("Lost connection to the task manager server.", file=sys.stderr)
+                return 1
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "err" in message:
+                sys.stderr.write(message["err"])
+                sys.stderr.flush()
+            elif "input" in message:
+                send_message(writer, {"line": sys.stdin.readline()})
+            elif "exit" in message:
+                return message["exit"]
@@ -0,0 +1,166 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Default location of the task database; override with TASK_MANAGER_DB or set_db_path()
+DEFAULT_DB_PATH = os.path.join('db', 'tasks.db')
+
+# Pragmas applied once to every new connection
+PRAGMAS = {
+    "journal_mode": "WAL",        # readers never block the writer
+    "synchronous": "NORMAL",      # safe with WAL, avoids an fsync per commit
+    "cache_size": -16000,         # ~16 MB page cache per connection
+    "mmap_size": 268435456,       # memory-map up to 256 MB of the database file
+    "temp_store": "MEMORY",
+}
+
+# Number of prepared statements sqlite3 keeps per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Seconds to wait on a locked database before raising "database is locked"
+BUSY_TIMEOUT = 30.0
+
+_db_path = os.environ.get("TASK_MANAGER_DB", DEFAULT_DB_PATH)
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+# Bumped whenever connections are closed centrally so other threads reconnect
+_generation = 0
+
+
+def get_db_path():
+    """Return the path of the database the calling thread works on."""
+    return getattr(_local, "db_path", None) or _db_path
+
+
+def set_db_path(path):
+    """Point the connection layer at a different database file.
+
+    Open connections are closed; each thread reconnects lazily on its next call.
+
+    :param path: Path to the SQLite database file (or ":memory:")
+    """
+    global _db_path
+    close_all_connections()
+    _db_path = path
+
+
+def _open_connection(path):
+    directory = os.path.dirname(path)
+    if directory and path != ":memory:":
+        os.makedirs(directory, exist_ok=True)
+
+    # isolation_level=None puts sqlite3 in autocommit mode; transaction() below
+    # issues BEGIN/COMMIT explicitly so batches can span several statements.
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                           check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    logging.debug("Opened SQLite connection to %s", path)
+    return conn
+
+
+@contextmanager
+def use_database(path):
+    """Point the calling thread at another database for the duration of a block.
+
+    Other threads are unaffected, so worker threads can each query a different
+    database (see modules/shard_handler.py). Connections opened inside the block
+    stay open for the next block on the same database.
+
+    :param path: Path to the SQLite database file
+    """
+    saved = getattr(_local, "db_path", None)
+    _local.db_path = path
+    try:
+        yield
+    finally:
+        _local.db_path = saved
+
+
+def _thread_connections():
+    # The calling thread's open connections by database path, dropped after close_all_connections
+    if getattr(_local, "generation", None) != _generation:
+        _local.connections = {}
+        _local.generation = _generation
+        _local.depth = 0
+    return _local.connections
+
+
+def get_connection():
+    """Return the calling thread's connection to its database, opening it on first use.
+
+    Connections are long-lived and reused for every call made from the same thread.
+    """
+    connections = _thread_connections()
+    path = get_db_path()
+    conn = connections.get(path)
+    if conn is not None:
+        return conn
+
+    conn = _open_connection(path)
+    connections[path] = conn
+    with _connections_lock:
+        _connections.append(conn)
+    return conn
+
+
+def close_connection(conn=None):
+    """Close the calling thread's connection, if it has one.
+
+    :param conn: A specific connection to close instead, e.g. one left behind by a
+                 worker thread that has finished
+    """
+    if conn is None:
+        conn = _thread_connections().pop(get_db_path(), None)
+        if conn is None:
+            return
+    with _connections_lock:
+        if conn in _connections:
+            _connections.remove(conn)
+    conn.close()
+
+
+def close_all_connections():
+    """Close every connection opened by the connection layer, in any thread."""
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        connections = list(_connections)
+        _connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logging.warning("Error closing connection: %s", e)
+
+
+@contextmanager
+def transaction():
+    """Run a block inside a single write transaction on the thread's connection.
+
+    The outermost block issues BEGIN IMMEDIATE and commits on success; nested
+    blocks become savepoints, so a failing inner step rolls back only its own work.
+
+    :return: The thread's connection
+    """
+    conn = get_connection()
+    depth = _local.depth
+    savepoint = f"sp_{depth}"
+    conn.execute("BEGIN IMMEDIATE" if depth == 0 else f"SAVEPOINT {savepoint}")
+    _local.depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth = depth
+        if depth == 0:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+        raise
+    _local.depth = depth
+    conn.execute("COMMIT" if depth == 0 else f"RELEASE {savepoint}")
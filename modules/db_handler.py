@@ -1,226 +1,1070 @@
 import json
+import logging
 import sqlite3
-from datetime import datetime, timedelta
-
-
-# Function to calculate the next occurrence date
-def calculate_next_occurrence(recurrence, current_date):
-    if recurrence == "daily":
-        return (current_date + timedelta(days=1)).strftime("%Y-%m-%d")
-    if recurrence == "weekly":
-        return (current_date + timedelta(weeks=1)).strftime("%Y-%m-%d")
-    if recurrence == "monthly":
-        # Add one month by manipulating the month field
-        new_month = current_date.month % 12 + 1
-        year_increment = (current_date.month + 1) // 12
-        return current_date.replace(month=new_month, year=current_date.year + year_increment).strftime("%Y-%m-%d")
-    return None
-
-# Initialize database and create table
+from datetime import datetime
+
+from modules.agenda_handler import add_due_at_column
+from modules.archive_handler import create_archive
+from modules.cache_handler import (
+    GENERATIONS_SCHEMA_SQL,
+    SEED_GENERATION_SQL,
+    bump_generation,
+    list_cache,
+    table_generation,
+)
+from modules.change_handler import create_change_log
+from modules.connection_handler import get_connection, get_db_path, transaction
+from modules.dependency_handler import parse_dependencies
+from modules.profile_handler import phase, row_factory, timed
+from modules.rank_handler import PRIORITY_RANK_SQL, PRIORITY_RANKS, add_rank_counters
+from modules.recurrence_handler import calculate_next_occurrence, refresh_recurrence
+from modules.tag_handler import create_tags, tag_filter_sql
+from modules.task_model import TASK_COLUMNS, Task, task_row_factory
+
+# Explicit column list so task rows keep the Task layout as the schema grows
+TASK_SELECT = ", ".join(f"tasks.{column}" for column in TASK_COLUMNS)
+
+# Statements reused on every call; sqlite3 keeps them prepared per connection
+INSERT_TASK_SQL = '''INSERT INTO tasks (title, description, category, priority, status, due_date, time, parent_id, recurrence, next_occurrence, dependencies, recurrence_anchor)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+FETCH_TASK_SQL = f'SELECT {TASK_SELECT} FROM tasks WHERE id = ?'
+
+# Recursive queries over the parent_id hierarchy. UNION (rather than UNION ALL)
+# stops the recursion if parent links ever form a loop.
+SUBTREE_IDS_SQL = '''WITH RECURSIVE subtree(id) AS (
+                         SELECT id FROM tasks WHERE id IN (SELECT value FROM json_each(?))
+                         UNION
+                         SELECT tasks.id FROM tasks JOIN subtree ON tasks.parent_id = subtree.id
+                     )
+                     SELECT id FROM subtree'''
+DELETE_SUBTREE_SQL = f'DELETE FROM tasks WHERE id IN ({SUBTREE_IDS_SQL})'
+TREE_SQL = f'''WITH RECURSIVE tree(id, depth, path) AS (
+                  SELECT id, 0, printf('%012d', id) FROM tasks WHERE {{root_condition}}
+                  UNION
+                  SELECT tasks.id, tree.depth + 1, tree.path || '/' || printf('%012d', tasks.id)
+                  FROM tasks JOIN tree ON tasks.parent_id = tree.id
+                  WHERE tree.depth < ?
+              )
+              SELECT tree.depth, {TASK_SELECT} FROM tree JOIN tasks ON tasks.id = tree.id ORDER BY tree.path'''
+ANCESTORS_SQL = f'''WITH RECURSIVE ancestors(id, depth) AS (
+                       SELECT parent_id, 1 FROM tasks WHERE id = ?
+                       UNION
+                       SELECT tasks.parent_id, ancestors.depth + 1 FROM tasks JOIN ancestors ON tasks.id = ancestors.id
+                       WHERE ancestors.depth < ?
+                   )
+                   SELECT {TASK_SELECT} FROM ancestors JOIN tasks ON tasks.id = ancestors.id ORDER BY ancestors.depth'''
+
+# Deepest subtask level followed by the hierarchy queries
+MAX_TREE_DEPTH = 1000
+EXISTING_IDS_SQL = 'SELECT id FROM tasks WHERE id IN (SELECT value FROM json_each(?))'
+
+# Columns a caller may set through add_tasks/update_task(s)
+TASK_FIELDS = TASK_COLUMNS[1:]
+
+# Rows sent to executemany per round trip by the bulk functions
+BULK_CHUNK_SIZE = 1000
+
+# Rows fetched per query by iter_tasks
+DEFAULT_PAGE_SIZE = 500
+
+
+# Create the tasks table with columns for recurrence, next_occurrence, and dependencies
+CREATE_TASKS_SQL = '''CREATE TABLE IF NOT EXISTS tasks (
+                         id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         title TEXT NOT NULL,
+                         description TEXT,
+                         category TEXT,
+                         priority TEXT CHECK(priority IN ('High', 'Medium', 'Low')),
+                         status TEXT CHECK(status IN ('To Do', 'Doing', 'Done')),
+                         due_date TEXT,
+                         time TEXT,
+                         parent_id INTEGER DEFAULT 0,
+                         recurrence TEXT DEFAULT 'none' CHECK(recurrence IN ('none', 'daily', 'weekly', 'monthly')),
+                         next_occurrence TEXT,
+                         dependencies TEXT DEFAULT '[]'
+                       )'''
+
+# Secondary indexes matching the equality filters and sort keys list_tasks supports
+TASK_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_tasks_parent_status ON tasks (parent_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_due_priority ON tasks (due_date, priority)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_status_priority ON tasks (status, priority, due_date)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_category_status ON tasks (category, status, priority)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_priority_due ON tasks (priority, due_date)",
+)
+
+
+# Indexes whose order is (sort key, id), letting iter_tasks resume a page with an index seek
+KEYSET_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (due_date)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_status_due ON tasks (status, due_date)",
+)
+
+
+# Covers every column summarize_tasks reads, so reports scan this index instead of the table
+SUMMARY_INDEX_COLUMNS = ("status", "due_date", "time", "category", "priority")
+SUMMARY_INDEX_SQL = f"CREATE INDEX IF NOT EXISTS idx_tasks_summary ON tasks ({', '.join(SUMMARY_INDEX_COLUMNS)})"
+
+
+def _create_task_indexes(conn):
+    for statement in TASK_INDEXES:
+        conn.execute(statement)
+
+
+def _create_keyset_indexes(conn):
+    for statement in KEYSET_INDEXES:
+        conn.execute(statement)
+
+
+# Full-text index over titles and descriptions, kept in sync with tasks by triggers
+SEARCH_INDEX_SQL = (
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+           title, description, content='tasks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+       )''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+           INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+           INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+           INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+           INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+       END''',
+)
+
+# Title matches weigh more than description matches when ranking search results. Live
+# and archived matches are ranked together, so both indexes use the same weights.
+SEARCH_RANK_WEIGHTS = "10.0, 1.0"
+SEARCH_RANK_SQL = f"bm25(tasks_fts, {SEARCH_RANK_WEIGHTS})"
+ARCHIVE_SEARCH_RANK_SQL = f"bm25(tasks_archive_fts, {SEARCH_RANK_WEIGHTS})"
+
+# Live and archived tasks as one relation, for list --include-archived
+ARCHIVE_UNION_SQL = f"(SELECT {', '.join(TASK_COLUMNS)} FROM tasks UNION ALL SELECT {', '.join(TASK_COLUMNS)} FROM tasks_archive) AS tasks"
+ARCHIVE_SEARCH_UNION_SQL = f'''(SELECT {TASK_SELECT}, {SEARCH_RANK_SQL} AS rank
+                                 FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid WHERE tasks_fts MATCH ?
+                                 UNION ALL
+                                 SELECT {TASK_SELECT}, {ARCHIVE_SEARCH_RANK_SQL} AS rank
+                                 FROM tasks_archive_fts JOIN tasks_archive AS tasks ON tasks.id = tasks_archive_fts.rowid
+                                 WHERE tasks_archive_fts MATCH ?) AS tasks'''
+
+# Markers wrapped around matched terms in search snippets
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+
+def _create_search_index(conn):
+    try:
+        conn.execute(SEARCH_INDEX_SQL[0])
+    except sqlite3.OperationalError as e:
+        # SQLite builds without FTS5 fall back to LIKE matching in search_tasks
+        logging.warning("Full-text search unavailable: %s", e)
+        return
+    for statement in SEARCH_INDEX_SQL[1:]:
+        conn.execute(statement)
+    conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+def _has_search_index(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'").fetchone() is not None
+
+
+# Normalized dependency edges; triggers derive them from the tasks.dependencies list
+DEPENDENCY_SCHEMA_SQL = (
+    '''CREATE TABLE IF NOT EXISTS task_dependencies (
+           task_id INTEGER NOT NULL,
+           depends_on INTEGER NOT NULL,
+           PRIMARY KEY (task_id, depends_on)
+       ) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_task_dependencies_depends_on ON task_dependencies (depends_on, task_id)",
+    '''CREATE TRIGGER IF NOT EXISTS tasks_dependencies_insert AFTER INSERT ON tasks WHEN json_valid(new.dependencies) BEGIN
+           INSERT OR IGNORE INTO task_dependencies (task_id, depends_on) SELECT new.id, value FROM json_each(new.dependencies);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_dependencies_update AFTER UPDATE OF dependencies ON tasks BEGIN
+           DELETE FROM task_dependencies WHERE task_id = new.id;
+           INSERT OR IGNORE INTO task_dependencies (task_id, depends_on)
+               SELECT new.id, value FROM json_each(CASE WHEN json_valid(new.dependencies) THEN new.dependencies ELSE '[]' END);
+       END''',
+    # Replaced by RELEASE_DEPENDENTS_TRIGGER_SQL in migration 13
+    '''CREATE TRIGGER IF NOT EXISTS tasks_dependencies_delete AFTER DELETE ON tasks BEGIN
+           DELETE FROM task_dependencies WHERE task_id = old.id OR depends_on = old.id;
+       END''',
+)
+
+
+def _create_dependency_table(conn):
+    # Rewrite legacy comma-separated lists ("3,4") as JSON so the triggers can read them
+    legacy = conn.execute("SELECT id, dependencies FROM tasks WHERE dependencies IS NOT NULL AND NOT json_valid(dependencies)").fetchall()
+    for task_id, dependencies in legacy:
+        try:
+            normalized = json.dumps(parse_dependencies(dependencies))
+        except ValueError:
+            logging.warning("Dropping unreadable dependencies %r of task %s", dependencies, task_id)
+            normalized = "[]"
+        conn.execute("UPDATE tasks SET dependencies = ? WHERE id = ?", (normalized, task_id))
+
+    for statement in DEPENDENCY_SCHEMA_SQL:
+        conn.execute(statement)
+    conn.execute('''INSERT OR IGNORE INTO task_dependencies (task_id, depends_on)
+                    SELECT tasks.id, dep.value FROM tasks, json_each(tasks.dependencies) AS dep
+                    WHERE json_valid(tasks.dependencies)''')
+
+
+# Deleting a task releases the tasks waiting on it: its ID leaves their dependency lists,
+# which the update trigger mirrors into task_dependencies. Archived tasks stay in the
+# lists (they are Done); only their edges go, as with every task that leaves tasks.
+RELEASE_DEPENDENTS_TRIGGER_SQL = '''CREATE TRIGGER IF NOT EXISTS tasks_dependencies_delete AFTER DELETE ON tasks BEGIN
+                                      UPDATE tasks SET dependencies = (SELECT json_group_array(value) FROM json_each(tasks.dependencies) WHERE value != old.id)
+                                      WHERE id IN (SELECT task_id FROM task_dependencies WHERE depends_on = old.id)
+                                        AND NOT EXISTS (SELECT 1 FROM tasks_archive WHERE id = old.id);
+                                      DELETE FROM task_dependencies WHERE task_id = old.id OR depends_on = old.id;
+                                  END'''
+
+# Dependency lists naming a task that is neither live nor archived
+STALE_DEPENDENCY_SQL = '''NOT EXISTS (SELECT 1 FROM tasks AS known WHERE known.id = dep.value)
+                          AND NOT EXISTS (SELECT 1 FROM tasks_archive AS known WHERE known.id = dep.value)'''
+DROP_STALE_DEPENDENCIES_SQL = f'''UPDATE tasks SET dependencies = (SELECT json_group_array(dep.value) FROM json_each(tasks.dependencies) AS dep
+                                                                 WHERE NOT ({STALE_DEPENDENCY_SQL}))
+                                  WHERE json_valid(dependencies)
+                                    AND EXISTS (SELECT 1 FROM json_each(tasks.dependencies) AS dep WHERE {STALE_DEPENDENCY_SQL})'''
+
+
+def _release_deleted_dependencies(conn):
+    # Earlier deletes dropped the edges but left the deleted IDs in the lists
+    conn.execute(DROP_STALE_DEPENDENCIES_SQL)
+    conn.execute("DROP TRIGGER IF EXISTS tasks_dependencies_delete")
+    conn.execute(RELEASE_DEPENDENTS_TRIGGER_SQL)
+
+
+def _add_recurrence_anchor(conn):
+    conn.execute("ALTER TABLE tasks ADD COLUMN recurrence_anchor TEXT")
+    conn.execute("UPDATE tasks SET recurrence_anchor = due_date WHERE recurrence != 'none'")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_next_occurrence ON tasks (next_occurrence) WHERE recurrence != 'none'")
+
+
+def _create_generation_table(conn):
+    conn.execute(GENERATIONS_SCHEMA_SQL)
+    conn.execute(SEED_GENERATION_SQL, ("tasks",))
+
+
+def _create_summary_index(conn):
+    conn.execute(SUMMARY_INDEX_SQL)
+
+
+# Schema migrations applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = (
+    _create_task_indexes,  # 1: secondary indexes for list_tasks filters and sorts
+    _create_search_index,  # 2: FTS5 index over title and description
+    _create_keyset_indexes,  # 3: (sort key, id) indexes for paginated listing
+    _create_dependency_table,  # 4: task_dependencies edge table
+    _add_recurrence_anchor,  # 5: recurrence_anchor column and rollover index
+    _create_generation_table,  # 6: per-table write counters for the list_tasks cache
+    _create_summary_index,  # 7: covering index for summarize_tasks
+    create_change_log,  # 8: task_changes log and its triggers
+    create_archive,  # 9: completed_at stamps and the tasks_archive table
+    add_due_at_column,  # 10: due_at timestamp generated from due_date and time, indexed
+    create_tags,  # 11: tags and the task_tags inverted index; category no longer limited to a fixed list
+    add_rank_counters,  # 12: open subtask/dependent counters for rank_tasks; priority sorts by urgency
+    _release_deleted_dependencies,  # 13: deleting a task removes its ID from its dependents' lists
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Initialize database, create table and bring the schema up to date
+@timed("db.init_db")
 def init_db():
     try:
-        conn = sqlite3.connect('db/tasks.db')
-        cursor = conn.cursor()
-        # Create tasks table with added columns for recurrence, next_occurrence, and dependencies
-        cursor.execute('''CREATE TABLE IF NOT EXISTS tasks (
-                               id INTEGER PRIMARY KEY AUTOINCREMENT,
-                               title TEXT NOT NULL,
-                               description TEXT,
-                               category TEXT CHECK(category IN ('Work', 'Personal', 'Careers Related', 'Home', 'Development', 'Research', 'Setup', 'Configuration')),
-                               priority TEXT CHECK(priority IN ('High', 'Medium', 'Low')),
-                               status TEXT CHECK(status IN ('To Do', 'Doing', 'Done')),
-                               due_date TEXT,
-                               time TEXT,
-                               parent_id INTEGER DEFAULT 0,
-                               recurrence TEXT DEFAULT 'none' CHECK(recurrence IN ('none', 'daily', 'weekly', 'monthly')),
-                               next_occurrence TEXT,
-                               dependencies TEXT DEFAULT '[]'
-                             )''')
-        conn.commit()
+        # Fast path for every run after the first: a current schema needs no DDL and no write lock
+        if get_connection().execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return
+        with transaction() as conn:
+            conn.execute(CREATE_TASKS_SQL)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for migration in MIGRATIONS[version:]:
+                migration(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            bump_generation(conn)
+        if version < SCHEMA_VERSION:
+            # Refresh planner statistics for any new indexes
+            conn.execute("PRAGMA optimize")
+            logging.info("Migrated database schema from version %s to %s", version, SCHEMA_VERSION)
     except sqlite3.Error as e:
         print(f"Error initializing database: {e}")
-    finally:
-        conn.close()
+        logging.error("Error initializing database: %s", e)
+
+# Build the INSERT parameters for a task, deriving next_occurrence from the recurrence
+def _task_values(title, description, category, priority, status, due_date, time, parent_id=0, recurrence="none", dependencies="[]"):
+    # Calculate the initial next occurrence based on recurrence interval
+    next_occurrence = None
+    if recurrence != "none" and due_date:
+        current_date = datetime.strptime(due_date, "%Y-%m-%d")
+        next_occurrence = calculate_next_occurrence(recurrence, current_date)
+    # Store dependencies as a JSON list; triggers mirror it into task_dependencies
+    dependencies = json.dumps(parse_dependencies(dependencies))
+    # The first due date anchors the series so monthly tasks keep their day of month
+    recurrence_anchor = due_date if next_occurrence else None
+    return (title, description, category, priority, status, due_date, time, parent_id, recurrence, next_occurrence, dependencies, recurrence_anchor)
 
 # Add a new task to the database
-# Add a new task to the database
+@timed("db.add_task")
 def add_task(title, description, category, priority, status, due_date, time, parent_id=0, recurrence="none", dependencies="[]"):
     try:
-        conn = sqlite3.connect('db/tasks.db')
-        cursor = conn.cursor()
-
-        # Calculate the initial next occurrence based on recurrence interval
-        next_occurrence = None
-        if recurrence != "none" and due_date:
-            current_date = datetime.strptime(due_date, "%Y-%m-%d")
-            next_occurrence = calculate_next_occurrence(recurrence, current_date)
-
         # Insert the task into the database
-        cursor.execute('''INSERT INTO tasks (title, description, category, priority, status, due_date, time, parent_id, recurrence, next_occurrence, dependencies)
-                          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                       (title, description, category, priority, status, due_date, time, parent_id, recurrence, next_occurrence, dependencies))
-        conn.commit()
+        with transaction() as conn:
+            cursor = conn.execute(INSERT_TASK_SQL,
+                                  _task_values(title, description, category, priority, status, due_date, time, parent_id, recurrence, dependencies))
+            bump_generation(conn)
 
         # Fetch and return the last inserted task ID
         task_id = cursor.lastrowid
         return task_id
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         print(f"Error adding task: {e}")
         logging.error("Error adding task: %s", e)
         return None
-    finally:
-        conn.close()
 
 # Fetch a task by ID
+@timed("db.fetch_task")
 def fetch_task(task_id):
-    conn = sqlite3.connect('db/tasks.db')
-    cursor = conn.cursor()
-
-    # Fetch the task as a tuple
-    cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
-    task_tuple = cursor.fetchone()
-    conn.close()
+    conn = get_connection()
 
-    if task_tuple:
-        # Convert the tuple to a dictionary for easier access
-        columns = ["id", "title", "description", "category", "priority", "status", "due_date", "time", "parent_id", "recurrence", "next_occurrence", "dependencies"]
-        task = dict(zip(columns, task_tuple))
-        return task
-    return None
+    # Fetch the task as a Task record (None if it does not exist)
+    return _query_tasks(conn, FETCH_TASK_SQL, (task_id,)).fetchone()
 
 # Update task details
-def update_task(task_id: int, updates: dict) -> None:
-    try:
-        conn = sqlite3.connect('db/tasks.db')
-        cursor = conn.cursor()
+@timed("db.update_task")
+def update_task(task_id: int, updates: dict):
+    """Update the given columns of one task.
 
-        # Ensure updates is a dictionary and log the content
-        print(f"Updates: {updates}, Type of updates: {type(updates)}")
+    :param task_id: ID of the task to update
+    :param updates: A dictionary of column updates (e.g., {"status": "Done"})
+    :return: The number of tasks updated, 0 if the task does not exist (None on failure)
+    """
+    try:
+        if "dependencies" in updates:
+            updates = {**updates, "dependencies": json.dumps(parse_dependencies(updates["dependencies"]))}
 
-        # Generate columns with placeholders
+        # Generate columns with placeholders; task_id goes last for the WHERE clause
         columns = ', '.join(f"{k} = ?" for k in updates)
-        values = list(updates.values())  # Get the values to update
-        values.append(task_id)  # Append task_id at the end for WHERE clause
-
-        # Debugging line: print the SQL being executed
-        print(f"Executing SQL: UPDATE tasks SET {columns} WHERE id = ? with values {tuple(values)}")
+        values = (*updates.values(), task_id)
 
-        # Execute the update query
-        result = cursor.execute(f'UPDATE tasks SET {columns} WHERE id = ?', tuple(values))
-        conn.commit()
-
-        # Log the number of rows affected
-        rows_affected = result.rowcount
-        print(f"Rows affected: {rows_affected}")
-
-        if rows_affected == 0:
-            print("No rows were updated. It might be because the task's current values match the proposed updates.")
+        with transaction() as conn:
+            rows_affected = conn.execute(f'UPDATE tasks SET {columns} WHERE id = ?', values).rowcount
+            if "due_date" in updates or "recurrence" in updates:
+                refresh_recurrence(conn, [task_id])
+            bump_generation(conn)
+        return rows_affected
 
     except sqlite3.Error as e:
         print(f"Error updating task: {e}")
-    finally:
-        conn.close()
+        logging.error("Error updating task %s: %s", task_id, e)
+        return None
 
-# Delete task by ID
+# Delete task by ID, together with all of its subtasks
+@timed("db.delete_task")
 def delete_task(task_id):
+    """Delete a task and every level of subtasks below it in a single statement.
+
+    :return: The number of tasks deleted
+    """
     try:
-        conn = sqlite3.connect('db/tasks.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-        conn.commit()
+        with transaction() as conn:
+            bump_generation(conn)
+            return conn.execute(DELETE_SUBTREE_SQL, (json.dumps([task_id]),)).rowcount
     except sqlite3.Error as e:
         print(f"Error deleting task: {e}")
-    finally:
-        conn.close()
+        return 0
+
+# Split an iterable into lists of at most `size` items without materializing it
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Return the subset of `task_ids` that exist, preserving the caller's order
+def _existing_ids(conn, task_ids):
+    task_ids = list(task_ids)
+    found = {row[0] for row in conn.execute(EXISTING_IDS_SQL, (json.dumps(task_ids),))}
+    return [task_id for task_id in task_ids if task_id in found]
+
+# Add many tasks in one transaction
+@timed("db.add_tasks")
+def add_tasks(tasks, chunk_size=BULK_CHUNK_SIZE):
+    """Insert tasks in bulk using executemany inside a single transaction.
+
+    :param tasks: An iterable of dictionaries with the same keys as add_task's arguments;
+                  it is consumed lazily, `chunk_size` rows at a time
+    :param chunk_size: Number of rows handed to executemany per call
+    :return: The list of created task IDs, in input order (empty on failure)
+    """
+    try:
+        task_ids = []
+        with transaction() as conn:
+            for chunk in _chunked(tasks, chunk_size):
+                rows = [_task_values(**task) for task in chunk]
+                conn.executemany(INSERT_TASK_SQL, rows)
+                # The write lock is held for the whole transaction, so the new IDs are contiguous
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                task_ids.extend(range(last_id - len(rows) + 1, last_id + 1))
+            bump_generation(conn)
+        return task_ids
+    except (sqlite3.Error, ValueError, TypeError) as e:
+        print(f"Error adding tasks: {e}")
+        logging.error("Error adding tasks: %s", e)
+        return []
+
+# Update many tasks in one transaction
+@timed("db.update_tasks")
+def update_tasks(updates_by_id):
+    """Apply per-task updates in bulk inside a single transaction.
+
+    Tasks that change the same set of columns are sent together through executemany.
+
+    :param updates_by_id: A mapping of task ID to a dictionary of column updates
+                          (e.g., {3: {"status": "Done"}, 4: {"status": "Done", "priority": "Low"}})
+    :return: The list of task IDs that existed and were updated (empty on failure)
+    """
+    groups = {}
+    for task_id, updates in updates_by_id.items():
+        unknown = set(updates) - set(TASK_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown task fields: {', '.join(sorted(unknown))}")
+        if "dependencies" in updates:
+            updates = {**updates, "dependencies": json.dumps(parse_dependencies(updates["dependencies"]))}
+        if updates:
+            columns = tuple(sorted(updates))
+            groups.setdefault(columns, []).append(tuple(updates[c] for c in columns) + (task_id,))
+
+    try:
+        with transaction() as conn:
+            updated_ids = _existing_ids(conn, updates_by_id)
+            for columns, rows in groups.items():
+                assignments = ', '.join(f"{c} = ?" for c in columns)
+                conn.executemany(f'UPDATE tasks SET {assignments} WHERE id = ?', rows)
+                if "due_date" in columns or "recurrence" in columns:
+                    refresh_recurrence(conn, [row[-1] for row in rows])
+            bump_generation(conn)
+        return updated_ids
+    except sqlite3.Error as e:
+        print(f"Error updating tasks: {e}")
+        logging.error("Error updating tasks: %s", e)
+        return []
+
+# Delete many tasks in one transaction
+@timed("db.delete_tasks")
+def delete_tasks(task_ids):
+    """Delete tasks and all of their subtasks in a single transaction.
+
+    :param task_ids: An iterable of task IDs
+    :return: The IDs that were deleted: the requested IDs that existed, in order,
+             followed by their subtasks (empty on failure)
+    """
+    task_ids = list(task_ids)
+    try:
+        with transaction() as conn:
+            requested = json.dumps(task_ids)
+            deleted_ids = _existing_ids(conn, task_ids)
+            seen = set(deleted_ids)
+            deleted_ids += [row[0] for row in conn.execute(SUBTREE_IDS_SQL, (requested,)) if row[0] not in seen]
+            conn.execute(DELETE_SUBTREE_SQL, (requested,))
+            bump_generation(conn)
+        return deleted_ids
+    except sqlite3.Error as e:
+        print(f"Error deleting tasks: {e}")
+        logging.error("Error deleting tasks: %s", e)
+        return []
+
+# Walk the subtask hierarchy depth-first
+@timed("db.get_task_tree")
+def get_task_tree(task_id=None, max_depth=MAX_TREE_DEPTH):
+    """Return a task and all of its subtasks, or the whole forest of top-level tasks.
+
+    Runs one recursive query; children follow their parent, ordered by ID.
+
+    :param task_id: Root task ID (default: every task with parent_id 0)
+    :param max_depth: Deepest subtask level to include
+    :return: A list of (depth, Task) pairs in depth-first order; the root has depth 0
+    """
+    if task_id is None:
+        query, values = TREE_SQL.format(root_condition="parent_id = 0"), (max_depth,)
+    else:
+        query, values = TREE_SQL.format(root_condition="id = ?"), (task_id, max_depth)
+    return [(row[0], Task._make(row[1:])) for row in get_connection().execute(query, values)]
+
+def get_descendants(task_id):
+    """Return every subtask below `task_id`, at any depth, in depth-first order."""
+    return [task for depth, task in get_task_tree(task_id) if depth > 0]
+
+def get_ancestors(task_id):
+    """Return the parent chain of `task_id`, nearest parent first."""
+    return _query_tasks(get_connection(), ANCESTORS_SQL, (task_id, MAX_TREE_DEPTH)).fetchall()
+
+def check_parent(task_id, parent_id):
+    """Make sure moving `task_id` under `parent_id` keeps the hierarchy a tree.
+
+    :raises ValueError: If the parent does not exist or is the task itself or one of its subtasks
+    """
+    if parent_id == 0:
+        return
+    if fetch_task(parent_id) is None:
+        raise ValueError(f"Parent task {parent_id} does not exist")
+    if parent_id == task_id or any(task.id == parent_id for task in get_descendants(task_id)):
+        raise ValueError(f"Task {parent_id} is a subtask of task {task_id} and cannot become its parent")
+
+# Sort keys accepted by list_tasks, mapped to their column (CLI spellings use hyphens)
+SORT_COLUMNS = {
+    "id": "id",
+    "title": "title",
+    "category": "category",
+    "priority": "priority",
+    "status": "status",
+    "due-date": "due_date",
+    "due_date": "due_date",
+    "time": "time",
+    "parent-id": "parent_id",
+    "parent_id": "parent_id",
+    "recurrence": "recurrence",
+    "next-occurrence": "next_occurrence",
+    "next_occurrence": "next_occurrence",
+}
+
+
+def _parse_sort(sort_by):
+    """Translate a comma-separated sort string into a list of column names."""
+    if not sort_by:
+        return []
+    columns = []
+    for field in sort_by.split(","):
+        field = field.strip().lower()
+        if field not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by '{field}'. Choose from: {', '.join(sorted(SORT_COLUMNS))}")
+        columns.append(SORT_COLUMNS[field])
+    return columns
+
+
+def list_sort_key(filters=None, sort_by=None):
+    """Return a key function that orders Task records the way list_tasks does, for merging sorted results.
+
+    NULLs sort first, as in SQLite. Returns None when list_tasks orders by full-text
+    relevance, which has no per-row key.
+    """
+    columns = _parse_sort(sort_by)
+    if not columns and filters and filters.get("query"):
+        return None
+    sort_values = _sort_values(columns)
+    return lambda task: tuple((value is not None, value) for value in sort_values(task))
+
+
+def _sort_terms(columns):
+    """Return the ORDER BY terms for the sort columns, ending with the id tiebreaker.
+
+    Priority sorts by urgency (High, Medium, Low) rather than alphabetically.
+    """
+    return [PRIORITY_RANK_SQL if column == "priority" else f"tasks.{column}" for column in columns if column != "id"] + ["tasks.id"]
+
+
+def _sort_values(columns):
+    """Return a function giving a Task's values for the terms _sort_terms(columns) returns."""
+    getters = []
+    for column in [column for column in columns if column != "id"] + ["id"]:
+        index = TASK_COLUMNS.index(column)
+        if column == "priority":
+            getters.append(lambda task, index=index: PRIORITY_RANKS.get(task[index]))
+        else:
+            getters.append(lambda task, index=index: task[index])
+    return lambda task: [getter(task) for getter in getters]
+
+
+def _list_query_parts(filters=None, sort_by=None, include_archived=False):
+    """Split the list_tasks query into FROM clause, WHERE conditions, parameters and ORDER BY terms."""
+    # Base query; archived tasks are read through a UNION ALL named "tasks", so the
+    # conditions below apply unchanged and SQLite pushes them into both tables
+    from_clause = ARCHIVE_UNION_SQL if include_archived else "tasks"
+    conditions = []
+    values = []
+    rank_order = None
+
+    # Apply filters
+    if filters:
+        if filters.get("query") and include_archived and _has_search_index(get_connection()):
+            # Rank live and archived matches together
+            from_clause = ARCHIVE_SEARCH_UNION_SQL
+            values.extend([filters["query"]] * 2)
+            rank_order = "tasks.rank"
+        elif filters.get("query"):
+            if _has_search_index(get_connection()):
+                # Drive the query from the full-text index and rank by relevance
+                from_clause = "tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid"
+                conditions.append("tasks_fts MATCH ?")
+                values.append(filters["query"])
+                rank_order = SEARCH_RANK_SQL
+            else:
+                conditions.append("(tasks.title LIKE ? OR tasks.description LIKE ?)")
+                values.extend([f"%{filters['query']}%"] * 2)
+        if "task_title" in filters:
+            conditions.append("tasks.title LIKE ?")
+            values.append(filters["task_title"].replace("*", "%"))  # Support wildcards
+        if "parent_id" in filters:
+            conditions.append("tasks.parent_id = ?")
+            values.append(filters["parent_id"])
+        if "status" in filters:
+            conditions.append("tasks.status = ?")
+            values.append(filters["status"])
+        if "priority" in filters:
+            conditions.append("tasks.priority = ?")
+            values.append(filters["priority"])
+        if "category" in filters:
+            conditions.append("tasks.category = ?")
+            values.append(filters["category"])
+        if filters.get("tag"):
+            # Matched through the task_tags posting lists
+            condition, tag_values = tag_filter_sql(filters["tag"])
+            conditions.append(condition)
+            values.extend(tag_values)
+
+    # Apply sorting; the id tiebreaker keeps pages stable. Full-text matches
+    # default to relevance order.
+    sort_columns = _parse_sort(sort_by)
+    if sort_columns or not rank_order:
+        order_by = _sort_terms(sort_columns)
+    else:
+        order_by = [rank_order]
+
+    return from_clause, conditions, values, order_by
+
+
+def _build_list_query(filters=None, sort_by=None, limit=None, offset=None, include_archived=False):
+    """Build the SELECT statement and parameters for list_tasks.
+
+    Identical filter/sort combinations produce identical SQL, so the statement is
+    served from the connection's prepared statement cache on repeated calls.
+    """
+    from_clause, conditions, values, order_by = _list_query_parts(filters, sort_by, include_archived)
+    query = f"SELECT {TASK_SELECT} FROM {from_clause}"
+
+    # Add conditions to query
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY " + ", ".join(order_by)
+
+    # Apply paging
+    if limit is not None or offset:
+        query += " LIMIT ? OFFSET ?"
+        values = values + [-1 if limit is None else limit, offset or 0]
+
+    return query, tuple(values)
+
+
+# Fields update_where refuses: their cycle checks are per task (see check_parent and check_dependencies)
+PER_TASK_FIELDS = ("parent_id", "dependencies")
+
+
+def _filter_clause(filters):
+    """Return a WHERE clause selecting the tasks that list_tasks(filters) lists, and its parameters."""
+    from_clause, conditions, values, _ = _list_query_parts(filters)
+    if from_clause != "tasks":
+        # Full-text matches come from a join, which UPDATE and DELETE cannot use directly
+        return f"tasks.id IN (SELECT tasks.id FROM {from_clause} WHERE {' AND '.join(conditions)})", values
+    return " AND ".join(conditions) or "1", values
+
+
+# Count the tasks matching list_tasks filters
+@timed("db.count_tasks")
+def count_tasks(filters=None):
+    """Return how many tasks list_tasks(filters) would list (None on failure)."""
+    try:
+        where, values = _filter_clause(filters)
+        return get_connection().execute(f"SELECT COUNT(*) FROM tasks WHERE {where}", values).fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Error counting tasks: {e}")
+        logging.error("Error counting tasks: %s", e)
+        return None
+
+
+# Update every task matching list_tasks filters with one statement
+@timed("db.update_where")
+def update_where(filters, updates):
+    """Apply the same updates to every task selected by `filters`, in one UPDATE statement.
+
+    :param filters: list_tasks filters selecting the tasks (e.g., {"priority": "High", "category": "Work"});
+                    must not be empty, so a missing filter never updates every task
+    :param updates: A dictionary of column updates (e.g., {"status": "Doing"}); parent_id
+                    and dependencies need per-task checks and are rejected
+    :return: The number of tasks updated (None on failure)
+    """
+    if not filters:
+        raise ValueError("update_where needs at least one filter")
+    unknown = set(updates) - set(TASK_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown task fields: {', '.join(sorted(unknown))}")
+    per_task = set(updates) & set(PER_TASK_FIELDS)
+    if per_task:
+        raise ValueError(f"Cannot bulk-update {', '.join(sorted(per_task))}; update those tasks one at a time")
+    if not updates:
+        return 0
+
+    assignments = ', '.join(f"{column} = ?" for column in updates)
+    try:
+        where, values = _filter_clause(filters)
+        with transaction() as conn:
+            task_ids = None
+            if "due_date" in updates or "recurrence" in updates:
+                # Collect the selection first: the update may change what the filters match
+                task_ids = [row[0] for row in conn.execute(f"SELECT tasks.id FROM tasks WHERE {where}", values)]
+            updated = conn.execute(f"UPDATE tasks SET {assignments} WHERE {where}",
+                                   (*updates.values(), *values)).rowcount
+            if task_ids:
+                refresh_recurrence(conn, task_ids)
+            if updated:
+                bump_generation(conn)
+        logging.info("Updated %d tasks matching %s with %s", updated, filters, updates)
+        return updated
+    except sqlite3.Error as e:
+        print(f"Error updating tasks: {e}")
+        logging.error("Error updating tasks matching %s: %s", filters, e)
+        return None
+
+
+# Run a query selecting TASK_SELECT columns; the cursor builds Task records directly
+def _query_tasks(conn, query, values=()):
+    cursor = conn.cursor()
+    cursor.row_factory = row_factory(task_row_factory)
+    return cursor.execute(query, values)
+
 
-# List tasks with optional sorting
 # List tasks with optional filtering and sorting
-def list_tasks(filters=None, sort_by=None):
+@timed("db.list_tasks")
+def list_tasks(filters=None, sort_by=None, limit=None, offset=None, use_cache=True, include_archived=False):
     """Fetch tasks from the database with optional filters and sorting.
 
-    :param filters: A dictionary of filters (e.g., {"parent_id": 2, "status": "To Do"})
+    Results are cached per query and served again until a write (from any
+    process) bumps the tasks table's generation; see modules/cache_handler.py.
+
+    :param filters: A dictionary of filters (e.g., {"parent_id": 2, "status": "To Do"});
+                    {"query": "resume"} matches titles and descriptions through the full-text index
     :param sort_by: A comma-separated string of fields to sort by (e.g., "due-date,priority")
-    :return: A list of tasks matching the criteria
+    :param limit: Maximum number of tasks to return (default: all)
+    :param offset: Number of matching tasks to skip (default: 0)
+    :param use_cache: Serve repeated queries from the result cache (default: True)
+    :param include_archived: Also list tasks moved to the archive (default: False)
+    :return: A list of Task records matching the criteria
     """
     try:
-        conn = sqlite3.connect('db/tasks.db')
-        cursor = conn.cursor()
-
-        # Base query
-        query = "SELECT * FROM tasks"
-        conditions = []
-        values = []
-
-        # Apply filters
-        if filters:
-            if "task_title" in filters:
-                conditions.append("title LIKE ?")
-                values.append(filters["task_title"].replace("*", "%"))  # Support wildcards
-            if "parent_id" in filters:
-                conditions.append("parent_id = ?")
-                values.append(filters["parent_id"])
-            if "status" in filters:
-                conditions.append("status = ?")
-                values.append(filters["status"])
-            if "priority" in filters:
-                conditions.append("priority = ?")
-                values.append(filters["priority"])
-            if "category" in filters:
-                conditions.append("category = ?")
-                values.append(filters["category"])
-
-        # Add conditions to query
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-
-        # Apply sorting
-        if sort_by:
-            sort_fields = ", ".join(sort_by.split(","))
-            query += f" ORDER BY {sort_fields}"
+        conn = get_connection()
+
+        # Identical filters and sorting build identical SQL, which makes a normalized cache key
+        query, values = _build_list_query(filters, sort_by, limit, offset, include_archived)
+        if not use_cache:
+            return _query_tasks(conn, query, values).fetchall()
+
+        key = (get_db_path(), query, values)
+        generation = table_generation(conn)
+        tasks = list_cache.get(key, generation)
+        if tasks is not None:
+            return list(tasks)
 
         # Execute the query
-        cursor.execute(query, tuple(values))
-        tasks = cursor.fetchall()
-
-        # Convert tuples to dictionaries
-        task_list = []
-        for task in tasks:
-            task_dict = {
-                "id": task[0],
-                "title": task[1],
-                "description": task[2],
-                "category": task[3],
-                "priority": task[4],
-                "status": task[5],
-                "due_date": task[6],
-                "time": task[7],
-                "parent_id": task[8],
-                "recurrence": task[9],
-                "next_occurrence": task[10],
-                "dependencies": task[11]
-            }
-            task_list.append(task_dict)
-
-        return task_list
+        tasks = _query_tasks(conn, query, values).fetchall()
+        list_cache.put(key, generation, tasks)
+        return tasks
 
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         print(f"Error listing tasks: {e}")
         return []
-    finally:
-        conn.close()
+
+
+def _keyset_condition(order_by, last_values):
+    """Build a WHERE condition selecting rows that sort after `last_values`.
+
+    NULLs sort first in SQLite, so a row value comparison is only valid when none of
+    the last values is NULL; otherwise the comparison is expanded term by term.
+    """
+    if None not in last_values:
+        placeholders = ", ".join("?" * len(order_by))
+        return f"({', '.join(order_by)}) > ({placeholders})", list(last_values)
+
+    alternatives = []
+    values = []
+    for index, (column, last_value) in enumerate(zip(order_by, last_values)):
+        terms = []
+        for prefix_column, prefix_value in zip(order_by[:index], last_values[:index]):
+            terms.append(f"{prefix_column} IS ?")
+            values.append(prefix_value)
+        if last_value is None:
+            terms.append(f"{column} IS NOT NULL")
+        else:
+            terms.append(f"{column} > ?")
+            values.append(last_value)
+        alternatives.append("(" + " AND ".join(terms) + ")")
+    return "(" + " OR ".join(alternatives) + ")", values
+
+
+# Stream tasks page by page
+def iter_tasks(filters=None, sort_by=None, page_size=DEFAULT_PAGE_SIZE, limit=None, offset=None, include_archived=False):
+    """Yield tasks matching the filters one page at a time.
+
+    Pages are fetched with keyset pagination on (sort key, id): each page resumes
+    after the last row of the previous one, so cost per page does not grow with
+    the position in the table and only one page is held in memory. Full-text
+    queries ordered by relevance fall back to LIMIT/OFFSET paging.
+
+    :param filters: Same as list_tasks
+    :param sort_by: Same as list_tasks
+    :param page_size: Number of rows fetched per query
+    :param limit: Maximum number of tasks to yield (default: all)
+    :param offset: Number of matching tasks to skip before the first one yielded
+    :param include_archived: Same as list_tasks
+    :return: A generator of Task records
+    """
+    conn = get_connection()
+    from_clause, conditions, values, order_by = _list_query_parts(filters, sort_by, include_archived)
+    keyset = order_by[-1] == "tasks.id"
+    sort_values = _sort_values(_parse_sort(sort_by)) if keyset else None
+
+    remaining = limit
+    last_values = None
+    offset = offset or 0
+    while remaining is None or remaining > 0:
+        page_conditions = list(conditions)
+        page_values = list(values)
+        if last_values is not None:
+            condition, condition_values = _keyset_condition(order_by, last_values)
+            page_conditions.append(condition)
+            page_values.extend(condition_values)
+
+        fetch = page_size if remaining is None else min(page_size, remaining)
+        query = f"SELECT {TASK_SELECT} FROM {from_clause}"
+        if page_conditions:
+            query += " WHERE " + " AND ".join(page_conditions)
+        query += " ORDER BY " + ", ".join(order_by) + " LIMIT ? OFFSET ?"
+        with phase("db.iter_tasks"):
+            rows = _query_tasks(conn, query, page_values + [fetch, offset]).fetchall()
+        yield from rows
+        if len(rows) < fetch:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
+        if keyset:
+            last_values = sort_values(rows[-1])
+            offset = 0
+        else:
+            offset += len(rows)
+
+# Show how SQLite will execute a list_tasks call
+def explain_list_query(filters=None, sort_by=None, include_archived=False):
+    """Return SQLite's EXPLAIN QUERY PLAN for the query list_tasks would run.
+
+    :param filters: Same as list_tasks
+    :param sort_by: Same as list_tasks
+    :param include_archived: Same as list_tasks
+    :return: A list of (id, parent, detail) rows, e.g. (3, 0, "SEARCH tasks USING INDEX idx_tasks_parent_status (parent_id=?)")
+    """
+    query, values = _build_list_query(filters, sort_by, include_archived=include_archived)
+    rows = get_connection().execute("EXPLAIN QUERY PLAN " + query, values).fetchall()
+    return [(row[0], row[1], row[3]) for row in rows]
+
+
+# Full-text matches with a highlighted snippet, best first
+SEARCH_SQL = f'''SELECT {TASK_SELECT}, snippet(tasks_fts, -1, ?, ?, '…', 12)
+                 FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid
+                 WHERE tasks_fts MATCH ?
+                 ORDER BY {SEARCH_RANK_SQL} LIMIT ?'''
+# Live and archived matches ranked together; the rank column is dropped again by the outer SELECT
+SEARCH_ARCHIVED_SQL = f'''SELECT {", ".join(TASK_COLUMNS)}, snippet FROM (
+                            SELECT {TASK_SELECT}, snippet(tasks_fts, -1, ?, ?, '…', 12) AS snippet, {SEARCH_RANK_SQL} AS rank
+                            FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid WHERE tasks_fts MATCH ?
+                            UNION ALL
+                            SELECT {TASK_SELECT}, snippet(tasks_archive_fts, -1, ?, ?, '…', 12), {ARCHIVE_SEARCH_RANK_SQL}
+                            FROM tasks_archive_fts JOIN tasks_archive AS tasks ON tasks.id = tasks_archive_fts.rowid
+                            WHERE tasks_archive_fts MATCH ?
+                        ) ORDER BY rank LIMIT ?'''
+
+
+# Quote every term so punctuation in user input is not parsed as FTS5 syntax
+def _quote_search_terms(query):
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+# Full-text search over titles and descriptions
+@timed("db.search_tasks")
+def search_tasks(query, limit=20, include_archived=False):
+    """Search task titles and descriptions, best matches first.
+
+    FTS5 query syntax (prefix*, OR, NOT, "phrases") is supported; input that is not
+    valid FTS5 syntax is retried as a plain list of terms.
+
+    :param query: The text to search for
+    :param limit: Maximum number of results
+    :param include_archived: Also search tasks moved to the archive (default: False)
+    :return: A list of (task, snippet) pairs ranked by bm25; matched terms in the
+             snippet are wrapped in HIGHLIGHT_START/HIGHLIGHT_END
+    """
+    conn = get_connection()
+    try:
+        if _has_search_index(conn):
+            sql = SEARCH_ARCHIVED_SQL if include_archived else SEARCH_SQL
+            arms = 2 if include_archived else 1
+            try:
+                rows = conn.execute(sql, (HIGHLIGHT_START, HIGHLIGHT_END, query) * arms + (limit,)).fetchall()
+            except sqlite3.OperationalError:
+                quoted = _quote_search_terms(query)
+                rows = conn.execute(sql, (HIGHLIGHT_START, HIGHLIGHT_END, quoted) * arms + (limit,)).fetchall()
+        else:
+            pattern = f"%{query}%"
+            source = ARCHIVE_UNION_SQL if include_archived else "tasks"
+            rows = conn.execute(f'''SELECT {TASK_SELECT}, coalesce(tasks.description, tasks.title) FROM {source}
+                                   WHERE tasks.title LIKE ? OR tasks.description LIKE ? ORDER BY tasks.id LIMIT ?''',
+                                (pattern, pattern, limit)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error searching tasks: {e}")
+        logging.error("Error searching tasks: %s", e)
+        return []
+    return [(Task._make(row[:-1]), row[-1]) for row in rows]
+
+# Fetch several tasks by ID with one query
+@timed("db.fetch_tasks")
+def fetch_tasks(task_ids):
+    """Fetch tasks by ID, keeping the order of `task_ids` and skipping IDs that do not exist.
+
+    :param task_ids: An iterable of task IDs
+    :return: A list of Task records
+    """
+    task_ids = list(task_ids)
+    query = f"SELECT {TASK_SELECT} FROM tasks WHERE id IN (SELECT value FROM json_each(?))"
+    by_id = {task.id: task for task in _query_tasks(get_connection(), query, (json.dumps(task_ids),))}
+    return [by_id[task_id] for task_id in task_ids if task_id in by_id]
 
 # Validate task dependencies
 def validate_dependencies(task_id):
-    task = fetch_task(task_id)
-    dependencies = json.loads(task[11])  # dependencies column
-    for dep_id in dependencies:
-        dep_task = fetch_task(dep_id)
-        if dep_task is None or dep_task[5] != "Done":  # Status column
-            return False
-    return True
+    """Return True when every task that `task_id` depends on is Done.
+
+    Runs as a single query over task_dependencies. Deleting or archiving a task
+    removes its edges, so a dependency on it no longer blocks anything.
+    """
+    conn = get_connection()
+    blocked = conn.execute('''SELECT 1 FROM task_dependencies
+                              JOIN tasks ON tasks.id = task_dependencies.depends_on
+                              WHERE task_dependencies.task_id = ? AND tasks.status IS NOT 'Done'
+                              LIMIT 1''', (task_id,)).fetchone()
+    return blocked is None
 
 def mark_task_as_done_with_dependencies(task_id):
+    """Mark a task Done if its dependencies are complete.
+
+    :return: True if the task was marked Done
+    """
     if validate_dependencies(task_id):
-        mark_task_as_done(task_id)
-    else:
-        print("Cannot mark this task as done. One or more dependencies are incomplete.")
+        update_task(task_id, {"status": "Done"})
+        return True
+    print("Cannot mark this task as done. One or more dependencies are incomplete.")
+    return False
+
+# Columns summarize_tasks can group by (CLI spellings use hyphens)
+SUMMARY_COLUMNS = {
+    "status": "status",
+    "category": "category",
+    "priority": "priority",
+    "due-date": "due_date",
+    "due_date": "due_date",
+    "parent-id": "parent_id",
+    "parent_id": "parent_id",
+    "recurrence": "recurrence",
+}
+
+# Status counts and overdue detection in one pass. A task is overdue when it is not
+# Done and its due date has passed, or it is due today at a time that has passed.
+SUMMARY_SELECT = '''COUNT(*),
+                    SUM(tasks.status = 'To Do'),
+                    SUM(tasks.status = 'Doing'),
+                    SUM(tasks.status = 'Done'),
+                    SUM(tasks.status != 'Done' AND (tasks.due_date < ? OR (tasks.due_date = ? AND tasks.time < ?)))'''
+SUMMARY_FIELDS = ("total", "to_do", "doing", "done", "overdue")
+
+# Progress of every subtree: each root with the number of tasks below it and how many are Done.
+# The recursion walks idx_tasks_parent_status (parent_id, status) without touching the table.
+ROLLUP_SQL = '''WITH RECURSIVE subtree(root, id, status, depth) AS (
+                    SELECT id, id, status, 0 FROM tasks WHERE {root_condition}
+                    UNION ALL
+                    SELECT subtree.root, tasks.id, tasks.status, subtree.depth + 1
+                    FROM tasks JOIN subtree ON tasks.parent_id = subtree.id
+                    WHERE subtree.depth < ?
+                )
+                SELECT tasks.id, tasks.title, tasks.status, rollup.subtasks, rollup.done
+                FROM (SELECT root, COUNT(*) - 1 AS subtasks, SUM(status = 'Done' AND depth > 0) AS done
+                      FROM subtree GROUP BY root) AS rollup
+                JOIN tasks ON tasks.id = rollup.root
+                WHERE rollup.subtasks > 0
+                ORDER BY tasks.id'''
+
+
+def _parse_group_by(group_by):
+    """Translate a comma-separated group-by string into a list of column names."""
+    if not group_by:
+        return []
+    columns = []
+    for field in group_by.split(","):
+        field = field.strip().lower()
+        if field not in SUMMARY_COLUMNS:
+            raise ValueError(f"Cannot group by '{field}'. Choose from: {', '.join(sorted(SUMMARY_COLUMNS))}")
+        columns.append(SUMMARY_COLUMNS[field])
+    return columns
+
+# Count tasks per group in SQLite
+@timed("db.summarize_tasks")
+def summarize_tasks(group_by=None, filters=None, as_of=None):
+    """Aggregate tasks with a single GROUP BY query instead of loading them.
+
+    :param group_by: Comma-separated columns to group by (e.g., "status" or "category,priority");
+                     None summarizes all matching tasks in one row
+    :param filters: Same as list_tasks
+    :param as_of: The moment overdue is measured against (datetime, default: now)
+    :return: A list of dictionaries, one per group, with the group columns and
+             total, to_do, doing, done, overdue and percent_done
+    """
+    columns = _parse_group_by(group_by)
+    as_of = as_of or datetime.now()
+    today = as_of.strftime("%Y-%m-%d")
+
+    from_clause, conditions, values, _ = _list_query_parts(filters)
+    group_terms = [f"tasks.{column}" for column in columns]
+    query = f"SELECT {''.join(term + ', ' for term in group_terms)}{SUMMARY_SELECT} FROM {from_clause}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if group_terms:
+        # Left alone, SQLite walks a non-covering index such as (category, status, priority)
+        # to avoid sorting a handful of groups, then reads every table row. Unary +
+        # makes it scan the covering summary index and sort the groups instead.
+        covered = columns[0] != SUMMARY_INDEX_COLUMNS[0] and set(columns) <= set(SUMMARY_INDEX_COLUMNS)
+        grouping = ["+" + term for term in group_terms] if covered else group_terms
+        query += " GROUP BY " + ", ".join(grouping) + " ORDER BY " + ", ".join(group_terms)
+
+    summary = []
+    for row in get_connection().execute(query, [today, today, as_of.strftime("%H:%M")] + values):
+        counts = [count or 0 for count in row[len(columns):]]
+        if not counts[0]:
+            continue
+        entry = dict(zip(columns, row))
+        entry.update(zip(SUMMARY_FIELDS, counts))
+        entry["percent_done"] = 100.0 * entry["done"] / entry["total"]
+        summary.append(entry)
+    return summary
+
+# Roll up completion of each task's whole subtree in SQLite
+@timed("db.summarize_subtrees")
+def summarize_subtrees(task_id=None, max_depth=MAX_TREE_DEPTH):
+    """Report how far along each task tree is.
+
+    :param task_id: Report on this task's subtree only (default: every top-level task with subtasks)
+    :param max_depth: Deepest subtask level counted
+    :return: A list of dictionaries with id, title, status, subtasks (all levels),
+             done (Done subtasks) and percent_done
+    """
+    root_condition = "id = ?" if task_id is not None else "parent_id = 0"
+    query = ROLLUP_SQL.format(root_condition=root_condition)
+    values = ([task_id] if task_id is not None else []) + [max_depth]
+    return [{"id": row[0], "title": row[1], "status": row[2], "subtasks": row[3], "done": row[4],
+             "percent_done": 100.0 * row[4] / row[3]}
+            for row in get_connection().execute(query, values)]
@@ -0,0 +1,169 @@
+import heapq
+import json
+
+from modules.connection_handler import get_connection
+
+# One pass over tasks and their dependency edges builds the whole graph
+LOAD_GRAPH_SQL = '''SELECT tasks.id, tasks.status, task_dependencies.depends_on
+                    FROM tasks LEFT JOIN task_dependencies ON task_dependencies.task_id = tasks.id'''
+
+
+def parse_dependencies(dependencies):
+    """Normalize a dependency list to a sorted list of unique task IDs.
+
+    :param dependencies: A JSON list ("[3, 4]"), a comma-separated string ("3,4"),
+                         an iterable of IDs, or None
+    :return: A list of integer task IDs
+    :raises ValueError: If an entry is not an integer
+    """
+    if dependencies is None:
+        return []
+    if isinstance(dependencies, str):
+        text = dependencies.strip()
+        if text.startswith("["):
+            dependencies = json.loads(text)
+        else:
+            dependencies = [part for part in text.split(",") if part.strip()]
+    try:
+        return sorted({int(dep_id) for dep_id in dependencies})
+    except (TypeError, ValueError):
+        raise ValueError(f"Dependencies must be task IDs, got: {dependencies!r}") from None
+
+
+class DependencyGraph:
+    """In-memory view of task dependencies.
+
+    depends_on maps a task to the tasks it waits for, dependents is the reverse
+    mapping, and status holds each task's status. Every query below visits each
+    task and edge at most once, so it costs O(V + E) with no further database access.
+    Deleted and archived tasks have no edges, so they never hold up their dependents.
+    """
+
+    def __init__(self, status, depends_on):
+        self.status = status
+        self.depends_on = depends_on
+        self.dependents = {}
+        for task_id, dep_ids in depends_on.items():
+            for dep_id in dep_ids:
+                self.dependents.setdefault(dep_id, []).append(task_id)
+
+    @classmethod
+    def load(cls, conn=None):
+        """Build the graph from the database with a single query."""
+        conn = conn or get_connection()
+        status = {}
+        depends_on = {}
+        for task_id, task_status, dep_id in conn.execute(LOAD_GRAPH_SQL):
+            status[task_id] = task_status
+            if dep_id is not None:
+                depends_on.setdefault(task_id, []).append(dep_id)
+        return cls(status, depends_on)
+
+    def is_done(self, task_id):
+        # Tasks outside the graph are not Done; edges only ever lead to tasks in it
+        return self.status.get(task_id) == "Done"
+
+    def is_ready(self, task_id):
+        """Return True when every dependency of the task is Done."""
+        return all(self.is_done(dep_id) for dep_id in self.depends_on.get(task_id, ()))
+
+    def readiness(self):
+        """Return {task_id: ready} for every task in one pass."""
+        return {task_id: self.is_ready(task_id) for task_id in self.status}
+
+    def ready_tasks(self):
+        """Return the IDs of open tasks whose dependencies are all Done, lowest ID first."""
+        return [task_id for task_id in sorted(self.status) if not self.is_done(task_id) and self.is_ready(task_id)]
+
+    def topological_order(self, include_done=False):
+        """Order tasks so every task comes after the tasks it depends on.
+
+        Uses Kahn's algorithm; among tasks that are free at the same time the lowest
+        ID goes first, so the schedule is stable between runs.
+
+        :param include_done: Include tasks that are already Done
+        :return: A list of task IDs
+        :raises ValueError: If the graph contains a cycle
+        """
+        nodes = [task_id for task_id in self.status if include_done or not self.is_done(task_id)]
+        members = set(nodes)
+        pending = {task_id: sum(1 for dep_id in self.depends_on.get(task_id, ()) if dep_id in members)
+                   for task_id in nodes}
+        queue = [task_id for task_id, count in pending.items() if count == 0]
+        heapq.heapify(queue)
+
+        order = []
+        while queue:
+            task_id = heapq.heappop(queue)
+            order.append(task_id)
+            for dependent in self.dependents.get(task_id, ()):
+                if dependent in pending:
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        heapq.heappush(queue, dependent)
+
+        if len(order) != len(nodes):
+            raise ValueError(f"Dependency cycle detected: {' -> '.join(map(str, self.find_cycle()))}")
+        return order
+
+    def find_cycle(self, task_id=None, new_dependencies=()):
+        """Find a dependency cycle, optionally after giving a task new dependencies.
+
+        :param task_id: Task whose dependencies would be replaced (None to check the graph as is)
+        :param new_dependencies: Proposed dependency IDs for task_id
+        :return: The cycle as a list of IDs (first ID repeated at the end), or None
+        """
+        depends_on = self.depends_on
+        if task_id is not None:
+            depends_on = dict(depends_on)
+            depends_on[task_id] = list(new_dependencies)
+        starts = [task_id] if task_id is not None else list(depends_on)
+
+        # Iterative depth-first search with white/grey/black colouring
+        state = {}
+        for start in starts:
+            if state.get(start):
+                continue
+            path = [start]
+            state[start] = 1
+            stack = [iter(depends_on.get(start, ()))]
+            while stack:
+                next_id = next(stack[-1], None)
+                if next_id is None:
+                    state[path.pop()] = 2
+                    stack.pop()
+                elif state.get(next_id) == 1:
+                    return path[path.index(next_id):] + [next_id]
+                elif not state.get(next_id):
+                    state[next_id] = 1
+                    path.append(next_id)
+                    stack.append(iter(depends_on.get(next_id, ())))
+        return None
+
+
+def load_dependency_graph():
+    """Load the dependency graph of all tasks with a single query."""
+    return DependencyGraph.load()
+
+
+def check_dependencies(dependencies, task_id=None, graph=None):
+    """Validate a proposed dependency list before it is saved.
+
+    :param dependencies: Proposed dependencies, in any form parse_dependencies accepts
+    :param task_id: The task receiving the dependencies (None for a task being created)
+    :param graph: A loaded DependencyGraph to reuse (loaded on demand otherwise)
+    :return: The normalized list of dependency IDs
+    :raises ValueError: If a dependency does not exist, is the task itself, or would create a cycle
+    """
+    dep_ids = parse_dependencies(dependencies)
+    if not dep_ids:
+        return dep_ids
+    graph = graph or load_dependency_graph()
+    missing = [dep_id for dep_id in dep_ids if dep_id not in graph.status]
+    if missing:
+        raise ValueError(f"Dependencies refer to tasks that do not exist: {', '.join(map(str, missing))}")
+    if task_id is not None:
+        cycle = graph.find_cycle(task_id, dep_ids)
+        if cycle:
+            raise ValueError(f"Dependencies would create a cycle: {' -> '.join(map(str, cycle))}")
+    return dep_ids
@@ -1,42 +1,276 @@
-import textwrap
+import sys
+from operator import itemgetter
 
-from tabulate import tabulate
+from modules.db_handler import HIGHLIGHT_END, HIGHLIGHT_START
+from modules.profile_handler import timed
+from modules.task_model import TASK_COLUMNS
+
+
+# tabulate and textwrap are imported on first use: tabulate alone takes longer to
+# import than most commands take to run, and commands that print no table never need it
+@timed("display.tabulate")
+def _grid(rows, headers):
+    from tabulate import tabulate
+    return tabulate(rows, headers=headers, tablefmt="grid")
+
+
+@timed("display.textwrap")
+def _wrap(text, width):
+    import textwrap
+    return "\n".join(textwrap.wrap(text, width)) if text else "N/A"
+
+
+# Output formats of display_tasks
+OUTPUT_FORMATS = ("grid", "plain", "tsv", "jsonl")
+
+# Task table columns: header, field, width budget and whether values are right-aligned.
+# The grid sizes each column to its widest value in the first page, capped by the budget
+# (None means the wrap width), and wraps longer values onto extra lines.
+TASK_TABLE_COLUMNS = (
+    ("ID", "id", 7, True),
+    ("Title", "title", 40, False),
+    ("Description", "description", None, False),
+    ("Category", "category", 15, False),
+    ("Priority", "priority", 8, False),
+    ("Status", "status", 6, False),
+    ("Due Date", "due_date", 10, False),
+    ("Time", "time", 5, False),
+    ("Parent ID", "parent_id", 9, True),
+)
+
+# Characters escaped in TSV values, so every task stays on one line
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _wrap_lines(text, width):
+    """Greedy word wrap into a list of lines; several times faster than textwrap.wrap."""
+    if len(text) <= width and "\n" not in text:
+        return [text]
+    lines = []
+    line = ""
+    for word in text.split():
+        while len(word) > width:
+            if line:
+                lines.append(line)
+                line = ""
+            lines.append(word[:width])
+            word = word[width:]
+        if not line:
+            line = word
+        elif len(line) + 1 + len(word) <= width:
+            line += " " + word
+        else:
+            lines.append(line)
+            line = word
+    if line:
+        lines.append(line)
+    return lines or [""]
+
+
+_TABLE_FIELDS = [column[1] for column in TASK_TABLE_COLUMNS]
+_table_values_by_position = itemgetter(*(TASK_COLUMNS.index(field) for field in _TABLE_FIELDS))
+
+
+def _table_values(task):
+    # Values of the TASK_TABLE_COLUMNS fields; positional access is much cheaper than task['...'] on records
+    if isinstance(task, tuple):
+        return _table_values_by_position(task)
+    return [task[field] for field in _TABLE_FIELDS]
+
+
+def _task_cells(task):
+    # Cell text for one task, in TASK_TABLE_COLUMNS order
+    task_id, title, description, category, priority, status, due_date, time, parent_id = _table_values(task)
+    return [
+        str(task_id),
+        title if parent_id == 0 else f"→ {title}",  # Marker for subtasks
+        description or "N/A",
+        category or "",
+        priority or "",
+        status or "",
+        due_date or "N/A",  # Handle empty due date
+        time or "N/A",  # Handle empty time
+        str(parent_id),
+    ]
+
+
+# Plain output uses fixed column budgets instead of measured widths, with the description
+# last and on one line, so a value longer than its budget shifts the line but never breaks it
+_PLAIN_ORDER = [index for index, column in enumerate(TASK_TABLE_COLUMNS) if column[1] != "description"] + [2]
+
+
+def _plain_line(cells):
+    return "  ".join(cells[index].rjust(TASK_TABLE_COLUMNS[index][2]) if TASK_TABLE_COLUMNS[index][3]
+                     else cells[index].ljust(TASK_TABLE_COLUMNS[index][2] or 0) for index in _PLAIN_ORDER).rstrip()
+
+
+def plain_task_line(task):
+    """Return a task as one line of the plain output format."""
+    cells = _task_cells(task)
+    cells[1] = " ".join(cells[1].split())
+    cells[2] = " ".join(cells[2].split())
+    return _plain_line(cells)
+
+
+def plain_header_line():
+    """Return the header line of the plain output format."""
+    return _plain_line([column[0] for column in TASK_TABLE_COLUMNS])
+
+
+@timed("display.grid_page")
+def _grid_page(rows, widths, aligns, header=None):
+    """Render one page of the task grid: each row and the border below it.
+
+    The first page passes `header` and starts with the top border and header block;
+    later pages continue the same table.
+    """
+    border = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+    out = []
+
+    def add_row(cells):
+        columns = [_wrap_lines(cell, width) for cell, width in zip(cells, widths)]
+        for index in range(max(len(lines) for lines in columns)):
+            out.append("| " + " | ".join(
+                (lines[index] if index < len(lines) else "").rjust(width) if right
+                else (lines[index] if index < len(lines) else "").ljust(width)
+                for lines, width, right in zip(columns, widths, aligns)) + " |")
+
+    if header is not None:
+        out.append(border)
+        add_row(header)
+        out.append(border.replace("-", "="))
+    for cells in rows:
+        add_row(cells)
+        out.append(border)
+    return "\n".join(out) + "\n"
 
 
 # Function to display a list of tasks in tabular form with improved task hierarchy
-def display_tasks(tasks, wrap_width=50):
-    """Display tasks in a tabular form with wrapped descriptions for improved readability.
+@timed("display.tasks")
+def display_tasks(tasks, wrap_width=50, page_size=100, output_format="grid"):
+    """Display tasks as a table, or as plain, TSV or JSON Lines text for scripts.
+
+    Output is streamed a page at a time, so it starts as soon as the first page is
+    available and memory use does not grow with the number of tasks. The grid is one
+    table with one header, its columns sized from the first page only; plain, tsv and
+    jsonl need no sizing pass at all and write one line per task.
+
+    :param tasks: Iterable of tasks (a list or a generator such as iter_tasks)
+    :param wrap_width: The maximum width for wrapping descriptions in the grid (default: 50 characters)
+    :param page_size: Number of tasks rendered and written at a time (default: 100)
+    :param output_format: One of OUTPUT_FORMATS (default: "grid")
+    :return: The number of tasks displayed
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'. Choose from: {', '.join(OUTPUT_FORMATS)}")
+    write = sys.stdout.write
+    headers = [column[0] for column in TASK_TABLE_COLUMNS]
+    count = 0
+
+    if output_format == "jsonl":
+        import json
+
+        def format_line(task):
+            return json.dumps(task.to_dict() if hasattr(task, "to_dict") else dict(task))
+    elif output_format == "tsv":
+        separators = len(_TABLE_FIELDS) - 1
+
+        def format_line(task):
+            values = ["" if value is None else str(value) for value in _table_values(task)]
+            line = "\t".join(values)
+            # Escaping is rarely needed; check the joined line once instead of every value
+            if line.count("\t") != separators or "\n" in line or "\r" in line or "\\" in line:
+                line = "\t".join(value.translate(_TSV_ESCAPES) for value in values)
+            return line
+        write("\t".join(_TABLE_FIELDS) + "\n")
+    elif output_format == "plain":
+        format_line = plain_task_line
+        write(_plain_line(headers) + "\n")
+
+    if output_format != "grid":
+        lines = []
+        for task in tasks:
+            lines.append(format_line(task))
+            count += 1
+            if len(lines) == page_size:
+                write("\n".join(lines) + "\n")
+                lines = []
+        if lines:
+            write("\n".join(lines) + "\n")
+        return count
+
+    # Grid: size the columns from the first page, which also carries the header, then
+    # keep those widths for every later page
+    aligns = [column[3] for column in TASK_TABLE_COLUMNS]
+    budgets = [column[2] or wrap_width for column in TASK_TABLE_COLUMNS]
+    widths = None
+    page = []
+    for task in tasks:
+        page.append(_task_cells(task))
+        count += 1
+        if len(page) == page_size:
+            if widths is None:
+                widths = _grid_widths(page, headers, budgets)
+                write(_grid_page(page, widths, aligns, headers))
+            else:
+                write(_grid_page(page, widths, aligns))
+            sys.stdout.flush()
+            page = []
+    if page:
+        if widths is None:
+            write(_grid_page(page, _grid_widths(page, headers, budgets), aligns, headers))
+        else:
+            write(_grid_page(page, widths, aligns))
+    return count
+
+
+def _grid_widths(sample, headers, budgets):
+    widths = []
+    for index, (header, budget) in enumerate(zip(headers, budgets)):
+        longest = max(len(line) for cells in sample for line in cells[index].split("\n"))
+        widths.append(max(len(header), min(longest, budget)))
+    return widths
 
-    :param tasks: List of task dictionaries
+
+# Function to display tasks as a nested tree
+@timed("display.task_tree")
+def display_task_tree(tree, wrap_width=50, page_size=100):
+    """Display a task hierarchy with each subtask indented under its parent.
+
+    :param tree: Iterable of (depth, task) pairs in depth-first order, as returned by get_task_tree
     :param wrap_width: The maximum width for wrapping text (default: 50 characters)
+    :param page_size: Number of tasks rendered per table (default: 100)
+    :return: The number of tasks displayed
     """
-    # Define headers for the table
-    headers = ["ID", "Title", "Description", "Category", "Priority", "Status", "Due Date", "Time", "Parent ID"]
+    headers = ["ID", "Title", "Description", "Priority", "Status", "Due Date", "Parent ID"]
 
-    # Prepare data for tabulate
     table_data = []
-    for task in tasks:
-        # Wrap the description to the specified width
-        wrapped_description = "\n".join(textwrap.wrap(task['description'], wrap_width)) if task['description'] else "N/A"
-
-        task_data = [
-            task['id'],  # ID
-            task['title'] if task['parent_id'] == 0 else f"  → {task['title']}",  # Indentation for subtasks
-            wrapped_description,  # Wrapped Description
-            task['category'],  # Category
-            task['priority'],  # Priority
-            task['status'],  # Status
-            task['due_date'] if task['due_date'] else "N/A",  # Handle empty due date
-            task['time'] if task['time'] else "N/A",  # Handle empty time
-            task['parent_id']   # Parent ID
-        ]
-        table_data.append(task_data)
-
-    # Print the formatted table with grid
-    print(tabulate(table_data, headers=headers, tablefmt="grid"))
+    count = 0
+    for depth, task in tree:
+        wrapped_description = _wrap(task['description'], wrap_width)
+        table_data.append([
+            task['id'],
+            # Indent by depth; tabulate strips leading spaces, so draw guide lines instead
+            ("│  " * (depth - 1) + "└─ " if depth else "") + task['title'],
+            wrapped_description,
+            task['priority'],
+            task['status'],
+            task['due_date'] if task['due_date'] else "N/A",
+            task['parent_id'],
+        ])
+        count += 1
+
+        if len(table_data) == page_size:
+            print(_grid(table_data, headers), flush=True)
+            table_data = []
+
+    if table_data:
+        print(_grid(table_data, headers))
+    return count
 
 
 # Function to display individual task details
+@timed("display.task_details")
 def display_task_details(task, wrap_width=50):
     """Display detailed information about a single task with wrapped fields.
 
@@ -47,7 +281,7 @@ def display_task_details(task, wrap_width=50):
     headers = ["Field", "Value"]
 
     # Wrap the description if it exceeds the wrap width
-    wrapped_description = "\n".join(textwrap.wrap(task['description'], wrap_width)) if task['description'] else "N/A"
+    wrapped_description = _wrap(task['description'], wrap_width)
 
     task_details = [
         ["ID", task['id']],
@@ -62,4 +296,128 @@ def display_task_details(task, wrap_width=50):
     ]
 
     # Print task details in a table format
-    print(tabulate(task_details, headers=headers, tablefmt="grid"))
+    print(_grid(task_details, headers))
+
+
+# Function to display full-text search results with highlighted matches
+@timed("display.search_results")
+def display_search_results(results, wrap_width=50):
+    """Display ranked search results with the matching snippet of each task.
+
+    Matched terms are shown in bold on a terminal and between asterisks otherwise.
+
+    :param results: List of (task, snippet) pairs from search_tasks
+    :param wrap_width: The maximum width for wrapping the snippet (default: 50 characters)
+    """
+    start, end = ("\033[1m", "\033[0m") if sys.stdout.isatty() else ("*", "*")
+    headers = ["ID", "Title", "Match", "Status", "Priority", "Due Date"]
+
+    table_data = []
+    for task, snippet in results:
+        # Wrap before highlighting so the markers do not count towards the width
+        wrapped = _wrap(snippet, wrap_width)
+        table_data.append([
+            task['id'],
+            task['title'],
+            wrapped.replace(HIGHLIGHT_START, start).replace(HIGHLIGHT_END, end),
+            task['status'],
+            task['priority'],
+            task['due_date'] if task['due_date'] else "N/A",
+        ])
+
+    print(_grid(table_data, headers))
+
+
+# Function to display an EXPLAIN QUERY PLAN result as a tree
+def display_query_plan(plan):
+    """Print a query plan in the same tree layout as the sqlite3 shell.
+
+    :param plan: List of (id, parent, detail) rows from explain_list_query
+    """
+    children = {}
+    for node_id, parent, detail in plan:
+        children.setdefault(parent, []).append((node_id, detail))
+
+    print("QUERY PLAN")
+
+    def walk(parent, prefix):
+        nodes = children.get(parent, [])
+        for index, (node_id, detail) in enumerate(nodes):
+            last = index == len(nodes) - 1
+            print(f"{prefix}{'`--' if last else '|--'}{detail}")
+            walk(node_id, prefix + ("   " if last else "|  "))
+
+    walk(0, "")
+
+
+# Function to display task counts per group
+def display_summary(summary):
+    """Display the result of summarize_tasks as a table, with a total row for several groups.
+
+    :param summary: List of dictionaries from summarize_tasks
+    """
+    counts = ["total", "to_do", "doing", "done", "overdue"]
+    columns = [key for key in summary[0] if key not in counts and key != "percent_done"] if summary else []
+    headers = [column.replace("_", " ").title() for column in columns] + ["Total", "To Do", "Doing", "Done", "Overdue", "% Done"]
+
+    table_data = [[entry[column] if entry[column] is not None else "N/A" for column in columns]
+                  + [entry[count] for count in counts] + [f"{entry['percent_done']:.1f}"] for entry in summary]
+    if len(summary) > 1:
+        totals = [sum(entry[count] for entry in summary) for count in counts]
+        table_data.append(["All"] + [""] * (len(columns) - 1) + totals + [f"{100.0 * totals[3] / totals[0]:.1f}"])
+
+    print(_grid(table_data, headers))
+
+
+# Function to display tags with their task counts
+def display_tags(tags):
+    """Display the result of list_tags as a table.
+
+    :param tags: List of (name, task count) pairs
+    """
+    print(_grid([list(tag) for tag in tags], ["Tag", "Tasks"]))
+
+
+# Function to display completion of task trees
+def display_subtree_rollups(rollups):
+    """Display the result of summarize_subtrees: each task tree with its share of Done subtasks.
+
+    :param rollups: List of dictionaries from summarize_subtrees
+    """
+    headers = ["ID", "Title", "Status", "Subtasks", "Done", "% Done"]
+    table_data = [[rollup["id"], rollup["title"], rollup["status"], rollup["subtasks"], rollup["done"],
+                   f"{rollup['percent_done']:.1f}"] for rollup in rollups]
+    print(_grid(table_data, headers))
+
+
+# Function to display the agenda
+def display_agenda(entries):
+    """Display agenda entries in time order; projected occurrences of recurring tasks are marked "upcoming".
+
+    :param entries: Iterable of (due_at, task, projected) tuples from agenda
+    :return: The number of entries displayed
+    """
+    headers = ["When", "ID", "Title", "Priority", "Status", "Repeats"]
+    table_data = [[due_at[:16] if task["time"] else due_at[:10], task["id"], task["title"], task["priority"],
+                   "upcoming" if projected else task["status"],
+                   task["recurrence"] if task["recurrence"] != "none" else ""]
+                  for due_at, task, projected in entries]
+    if table_data:
+        print(_grid(table_data, headers))
+    return len(table_data)
+
+
+# Function to display the tasks to work on next
+def display_ranked_tasks(ranked):
+    """Display the result of rank_tasks, most urgent first.
+
+    :param ranked: List of dictionaries from rank_tasks
+    :return: The number of tasks displayed
+    """
+    headers = ["Score", "ID", "Title", "Priority", "Status", "Due Date", "Open Subtasks", "Blocking"]
+    table_data = [[f"{entry['score']:.1f}", entry["task"]["id"], entry["task"]["title"], entry["task"]["priority"],
+                   entry["task"]["status"], entry["task"]["due_date"] or "N/A", entry["open_subtasks"], entry["blocking"]]
+                  for entry in ranked]
+    if table_data:
+        print(_grid(table_data, headers))
+    return len(table_data)
@@ -0,0 +1,161 @@
+import csv
+import json
+import logging
+import os
+import re
+from itertools import islice
+
+from modules.db_handler import BULK_CHUNK_SIZE, add_tasks
+from modules.dependency_handler import check_dependencies, load_dependency_graph
+
+# Keys accepted in import files and the add_task argument they map to
+FIELD_ALIASES = {
+    "task_title": "title",
+    "task-title": "title",
+    "due-date": "due_date",
+    "parent-id": "parent_id",
+}
+IMPORT_FIELDS = ("title", "description", "category", "priority", "status", "due_date", "time",
+                 "parent_id", "recurrence", "dependencies")
+# Characters read at a time from a JSON array file
+JSON_READ_SIZE = 1 << 16
+_WHITESPACE = re.compile(r"\s*")
+
+
+def _normalize_row(row):
+    """Turn a raw JSON/CSV record into keyword arguments for add_task."""
+    task = {}
+    for key, value in row.items():
+        key = FIELD_ALIASES.get(key, key)
+        if key not in IMPORT_FIELDS:
+            raise ValueError(f"Unknown field in import file: {key}")
+        if value == "":
+            value = None  # CSV has no null, empty cells mean "not set"
+        task[key] = value
+
+    task.setdefault("description", None)
+    task.setdefault("due_date", None)
+    task.setdefault("time", None)
+    task.setdefault("category", None)
+    task.setdefault("priority", None)
+    task.setdefault("status", None)
+    task["parent_id"] = int(task.get("parent_id") or 0)
+    task["recurrence"] = task.get("recurrence") or "none"
+    dependencies = task.get("dependencies")
+    if isinstance(dependencies, list):
+        task["dependencies"] = json.dumps(dependencies)
+    else:
+        task["dependencies"] = dependencies or "[]"
+    return task
+
+
+def _iter_json_array(f, read_size=JSON_READ_SIZE):
+    """Yield the items of the JSON array in `f` one at a time.
+
+    The file is read `read_size` characters at a time and each item is decoded as
+    soon as it is complete, so memory holds about one block, not the whole array.
+
+    :raises ValueError: If the file does not hold a single well-formed array
+    """
+    decoder = json.JSONDecoder()
+    buffer, position = "", 0
+    expect = "["  # then "item or ]", "item", ", or ]"
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            # Everything before `position` has been consumed
+            buffer, position = f.read(read_size), 0
+            if not buffer:
+                raise ValueError("JSON import file ends before the closing ']' of its array")
+            continue
+        char = buffer[position]
+        if expect == "[":
+            if char != "[":
+                raise ValueError("A .json import file must hold an array of tasks")
+            expect, position = "item or ]", position + 1
+        elif char == "]" and expect != "item":
+            return
+        elif expect == ", or ]":
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' between tasks in JSON import file, got {char!r}")
+            expect, position = "item", position + 1
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The item may continue in the next block
+                more = f.read(read_size)
+                if not more:
+                    raise
+                buffer, position = buffer[position:] + more, 0
+                continue
+            yield item
+            expect, position = ", or ]", end
+
+
+def iter_task_rows(path):
+    """Stream task records from a JSON array, JSON Lines or CSV file.
+
+    CSV and JSON Lines files are read one line at a time, JSON arrays one item at a time.
+
+    :param path: Path to a .csv, .json, .jsonl or .ndjson file
+    :return: A generator of task dictionaries ready for add_tasks
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8") as f:
+        if extension == ".csv":
+            for row in csv.DictReader(f):
+                yield _normalize_row(row)
+        elif extension in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield _normalize_row(json.loads(line))
+        elif extension == ".json":
+            for row in _iter_json_array(f):
+                yield _normalize_row(row)
+        else:
+            raise ValueError(f"Unsupported import format '{extension}'. Use .csv, .json or .jsonl")
+
+
+def _check_chunk(chunk, first_row):
+    """Validate the parents and dependencies of a chunk of new tasks, as create does.
+
+    One dependency graph load serves the whole chunk. Parents and dependencies must
+    already exist, so tasks in earlier chunks can be referenced but not tasks in the
+    same chunk. New tasks have no dependents yet, so they cannot close a cycle.
+
+    :raises ValueError: Naming the row (counted from 1) that refers to a missing task
+    """
+    graph = load_dependency_graph()
+    for row_number, task in enumerate(chunk, first_row):
+        try:
+            if task["parent_id"] and task["parent_id"] not in graph.status:
+                raise ValueError(f"Parent task {task['parent_id']} does not exist")
+            task["dependencies"] = check_dependencies(task["dependencies"], graph=graph)
+        except ValueError as e:
+            raise ValueError(f"Row {row_number}: {e}") from None
+
+
+def import_tasks(path, chunk_size=BULK_CHUNK_SIZE):
+    """Import tasks from a file in fixed-size chunks, one transaction per chunk.
+
+    :param path: Path to a .csv, .json, .jsonl or .ndjson file
+    :param chunk_size: Number of rows written per transaction
+    :return: The list of created task IDs; stops at the first chunk that fails
+    :raises ValueError: If a row is malformed or refers to a missing parent or
+                        dependency; the chunks before it stay imported
+    """
+    rows = iter_task_rows(path)
+    task_ids = []
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        _check_chunk(chunk, len(task_ids) + 1)
+        created = add_tasks(chunk, chunk_size=chunk_size)
+        if not created:
+            logging.error("Import from %s stopped after %d tasks", path, len(task_ids))
+            break
+        task_ids.extend(created)
+        logging.debug("Imported %d tasks from %s so far", len(task_ids), path)
+    return task_ids
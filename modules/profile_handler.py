@@ -0,0 +1,211 @@
+import functools
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from threading import get_ident
+
+from modules.connection_handler import get_connection
+
+# Set to a file path (or "-" for stderr) to append one JSON line of timings per command
+TIMINGS_ENV = "TASK_MANAGER_TIMINGS"
+
+# Statements listed in the --profile report, slowest first
+REPORT_STATEMENTS = 10
+STATEMENT_WIDTH = 100
+
+# The active profiler, if a command is being profiled; checked by every timed call
+_profiler = None
+_NO_PHASE = nullcontext()
+
+
+class Profiler:
+    """Wall-clock time per named phase and per SQL statement while one command runs.
+
+    Phases nest: a phase's self time excludes the phases run inside it, so a
+    display phase that pulls pages from iter_tasks does not count their queries
+    twice. A statement's time runs from SQLite starting it (the connection's trace
+    callback) to the next statement or the end of the enclosing phase, so it
+    includes fetching and converting its rows. Not thread-safe: profile commands
+    one at a time. Only the thread that started the profiler is timed; work on
+    other threads, such as shard workers, counts towards the phase waiting for it.
+    """
+
+    def __init__(self):
+        self.thread = get_ident()
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.statements = {}
+        self._stack = []
+        self._statement = None
+        self.connection = None
+
+    @contextmanager
+    def phase(self, name):
+        frame = [time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._end_statement()
+            self._stack.pop()
+            self.add(name, time.perf_counter() - frame[0], frame[1])
+
+    def add(self, name, seconds, child_seconds=0.0, calls=1):
+        """Record time spent in `name` and charge it to the enclosing phase."""
+        stats = self.phases.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += calls
+        stats[1] += seconds
+        stats[2] += seconds - child_seconds
+        if self._stack:
+            self._stack[-1][1] += seconds
+
+    def trace(self, statement):
+        """sqlite3 trace callback: the previous statement ends where this one starts."""
+        now = time.perf_counter()
+        self._end_statement(now)
+        self._statement = (statement, now)
+
+    def _end_statement(self, now=None):
+        if self._statement is None:
+            return
+        statement, started = self._statement
+        self._statement = None
+        stats = self.statements.setdefault(statement, [0, 0.0])
+        stats[0] += 1
+        stats[1] += (now or time.perf_counter()) - started
+
+    def timed_row_factory(self, factory):
+        """Wrap a row factory so the time spent building row objects is its own phase."""
+        clock = time.perf_counter
+        add = self.add
+
+        def timed_factory(cursor, row):
+            started = clock()
+            result = factory(cursor, row)
+            add("db.rows", clock() - started)
+            return result
+        return timed_factory
+
+    def summary(self):
+        """Return the timings as a JSON-serializable dictionary (times in milliseconds).
+
+        "sql" is None when statements were not traced.
+        """
+        self._end_statement()
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "phases": {name: {"calls": calls, "total_ms": round(total * 1000, 3), "self_ms": round(own * 1000, 3)}
+                       for name, (calls, total, own) in self.phases.items()},
+            "sql": None if self.connection is None else {
+                "statements": sum(calls for calls, _ in self.statements.values()),
+                "total_ms": round(sum(seconds for _, seconds in self.statements.values()) * 1000, 3),
+            },
+        }
+
+    def report(self):
+        """Return a human-readable phase and SQL breakdown."""
+        summary = self.summary()
+        lines = [f"{'Phase':<22}{'Calls':>8}{'Total ms':>12}{'Self ms':>12}"]
+        for name, stats in sorted(summary["phases"].items(), key=lambda item: -item[1]["self_ms"]):
+            lines.append(f"{name:<22}{stats['calls']:>8}{stats['total_ms']:>12.3f}{stats['self_ms']:>12.3f}")
+        lines.append(f"{'(command total)':<22}{'':>8}{summary['total_ms']:>12.3f}")
+        lines.append("")
+        if summary["sql"] is None:
+            lines.append("SQL: not traced (statements ran on shard worker connections)")
+            return "\n".join(lines)
+        lines.append(f"SQL: {summary['sql']['statements']} statements, {summary['sql']['total_ms']:.3f} ms")
+        slowest = sorted(self.statements.items(), key=lambda item: -item[1][1])[:REPORT_STATEMENTS]
+        for statement, (calls, seconds) in slowest:
+            statement = " ".join(statement.split())
+            if len(statement) > STATEMENT_WIDTH:
+                # Keep both ends: the tables read and the WHERE/ORDER BY that follow the column list
+                half = (STATEMENT_WIDTH - 5) // 2
+                statement = f"{statement[:half]} ... {statement[-half:]}"
+            lines.append(f"{seconds * 1000:>10.3f} ms {calls:>6}x  {statement}")
+        return "\n".join(lines)
+
+
+def phase(name):
+    """Context manager timing a block as phase `name`; does nothing unless profiling."""
+    if _profiler is None or _profiler.thread != get_ident():
+        return _NO_PHASE
+    return _profiler.phase(name)
+
+
+def timed(name):
+    """Decorator timing every call of a function as phase `name` while profiling."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profiler is None or _profiler.thread != get_ident():
+                return function(*args, **kwargs)
+            with _profiler.phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def row_factory(factory):
+    """Return `factory`, timed as the db.rows phase while profiling."""
+    if _profiler is None or _profiler.thread != get_ident():
+        return factory
+    return _profiler.timed_row_factory(factory)
+
+
+# Function to start profiling the current command
+def start_profiling(trace_sql=True):
+    """Start collecting timings and trace the calling thread's SQL statements.
+
+    :param trace_sql: False to skip tracing, for commands whose statements run on
+                      other connections, as sharded commands' do
+    :return: The new Profiler
+    """
+    global _profiler
+    _profiler = Profiler()
+    if trace_sql:
+        with _profiler.phase("connect"):
+            _profiler.connection = get_connection()
+        _profiler.connection.set_trace_callback(_profiler.trace)
+    return _profiler
+
+
+# Function to stop profiling and publish the timings
+def stop_profiling(command=None):
+    """Stop collecting timings and write them to $TASK_MANAGER_TIMINGS, if set.
+
+    :param command: Command name recorded with the timings
+    :return: The Profiler that was active (None if profiling was not started)
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return None
+    try:
+        if profiler.connection is not None:
+            profiler.connection.set_trace_callback(None)
+    except sqlite3.ProgrammingError:
+        # The command closed the connection, e.g. by switching databases
+        pass
+
+    destination = os.environ.get(TIMINGS_ENV)
+    if destination:
+        line = json.dumps({"command": command, **profiler.summary()})
+        if destination == "-":
+            print(line, file=sys.stderr)
+        else:
+            _timings_logger(destination).info(line)
+    return profiler
+
+
+@functools.lru_cache(maxsize=None)
+def _timings_logger(path):
+    # A logger of its own without the log file's prefix, so every line is a JSON object
+    logger = logging.getLogger(f"task_manager.timings.{path}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.FileHandler(path))
+    return logger
@@ -0,0 +1,205 @@
+import heapq
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+
+from modules.agenda_handler import DUE_AT_SQL
+from modules.connection_handler import get_connection
+from modules.task_model import TASK_COLUMNS, Task
+
+# Priorities from most to least urgent. list sorts priority by this rank, so
+# "High" comes before "Medium" instead of after it.
+PRIORITY_RANKS = {"High": 1, "Medium": 2, "Low": 3}
+_PRIORITY_RANK_CASES = " ".join(f"WHEN '{name}' THEN {rank}" for name, rank in PRIORITY_RANKS.items())
+PRIORITY_RANK_SQL = f"CASE tasks.priority {_PRIORITY_RANK_CASES} END"
+
+# Terms of the urgency score and their default weights. A task scores its priority's
+# weight, plus `due` scaled down linearly to 0 at `horizon_days` before its due time,
+# or once overdue, `overdue` plus `overdue_per_day` for each day late (counting at
+# most `overdue_cap_days`), plus `subtasks` per open subtask and `blocking` per
+# open task that depends on it. Weights cannot be negative.
+DEFAULT_RANK_WEIGHTS = {
+    "high": 6.0,
+    "medium": 3.0,
+    "low": 1.0,
+    "due": 8.0,
+    "horizon_days": 14.0,
+    "overdue": 10.0,
+    "overdue_per_day": 0.5,
+    "overdue_cap_days": 30.0,
+    "subtasks": 0.5,
+    "blocking": 2.0,
+}
+
+DEFAULT_RANK_LIMIT = 10
+
+# Open subtasks and open dependents of every task, kept current by triggers so
+# ranking reads two columns instead of aggregating the hierarchy and the
+# dependency graph on every call. Subtask counts are adjusted by one per change;
+# dependent counts are recounted for the tasks affected, which stays correct
+# whichever order SQLite runs the status and dependency triggers in.
+OPEN_DEPENDENTS_SQL = '''(SELECT count(*) FROM task_dependencies JOIN tasks AS dependent ON dependent.id = task_dependencies.task_id
+                          WHERE task_dependencies.depends_on = tasks.id AND dependent.status IS NOT 'Done')'''
+RANK_SCHEMA_SQL = (
+    '''CREATE TRIGGER IF NOT EXISTS tasks_open_subtasks_insert AFTER INSERT ON tasks
+       WHEN new.parent_id != 0 AND new.status IS NOT 'Done' BEGIN
+           UPDATE tasks SET open_subtasks = open_subtasks + 1 WHERE id = new.parent_id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_open_subtasks_update AFTER UPDATE OF parent_id, status ON tasks
+       WHEN new.parent_id IS NOT old.parent_id OR (new.status IS 'Done') != (old.status IS 'Done') BEGIN
+           UPDATE tasks SET open_subtasks = open_subtasks - 1 WHERE id = old.parent_id AND old.status IS NOT 'Done';
+           UPDATE tasks SET open_subtasks = open_subtasks + 1 WHERE id = new.parent_id AND new.status IS NOT 'Done';
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_open_subtasks_delete AFTER DELETE ON tasks
+       WHEN old.parent_id != 0 AND old.status IS NOT 'Done' BEGIN
+           UPDATE tasks SET open_subtasks = open_subtasks - 1 WHERE id = old.parent_id;
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS task_dependencies_open_insert AFTER INSERT ON task_dependencies BEGIN
+            UPDATE tasks SET open_dependents = {OPEN_DEPENDENTS_SQL} WHERE id = new.depends_on;
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS task_dependencies_open_delete AFTER DELETE ON task_dependencies BEGIN
+            UPDATE tasks SET open_dependents = {OPEN_DEPENDENTS_SQL} WHERE id = old.depends_on;
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS tasks_open_dependents_status AFTER UPDATE OF status ON tasks
+        WHEN (new.status IS 'Done') != (old.status IS 'Done') BEGIN
+            UPDATE tasks SET open_dependents = {OPEN_DEPENDENTS_SQL}
+            WHERE id IN (SELECT depends_on FROM task_dependencies WHERE task_id = new.id);
+        END''',
+    # rank_tasks walks each (status, priority, open_subtasks, open_dependents) segment in due order
+    "CREATE INDEX IF NOT EXISTS idx_tasks_rank ON tasks (status, priority, open_subtasks, open_dependents, due_date, time)",
+    # list sorts on priority in urgency order straight from an index; the two indexes
+    # that served the alphabetical priority sorts are rebuilt on the rank instead
+    f"CREATE INDEX IF NOT EXISTS idx_tasks_priority_rank ON tasks ((CASE priority {_PRIORITY_RANK_CASES} END), due_date)",
+    "DROP INDEX IF EXISTS idx_tasks_due_priority",
+    f"CREATE INDEX idx_tasks_due_priority ON tasks (due_date, (CASE priority {_PRIORITY_RANK_CASES} END))",
+    "DROP INDEX IF EXISTS idx_tasks_status_priority",
+    f"CREATE INDEX idx_tasks_status_priority ON tasks (status, (CASE priority {_PRIORITY_RANK_CASES} END), due_date)",
+)
+
+# The due-date terms only call julianday() for tasks inside the window where the
+# score changes with time; text comparisons on due_date settle the rest
+SCORE_SQL = f'''CASE tasks.priority WHEN 'High' THEN :high WHEN 'Medium' THEN :medium WHEN 'Low' THEN :low ELSE 0 END
+                + CASE WHEN tasks.due_date IS NULL OR tasks.due_date > :horizon_end THEN 0
+                       WHEN tasks.due_date < :overdue_cap_start THEN :overdue + :overdue_per_day * :overdue_cap_days
+                       ELSE coalesce((SELECT CASE WHEN days_left < 0 THEN :overdue + :overdue_per_day * min(-days_left, :overdue_cap_days)
+                                                  ELSE :due * max(0.0, 1.0 - days_left / :horizon_days) END
+                                      FROM (SELECT julianday({DUE_AT_SQL}) - julianday(:now) AS days_left)), 0) END
+                + :subtasks * tasks.open_subtasks + :blocking * tasks.open_dependents'''
+
+# Open tasks fall into segments of equal status, priority, open_subtasks and
+# open_dependents. Inside a segment only the due-date term varies. While overdue
+# weighs at least as much as due (as with the default weights), that term never
+# increases along idx_tasks_rank's (due_date, time) order, so a segment's best
+# tasks are the first ones in that order; otherwise whole segments are scored.
+# Counters take few distinct values, so there are few segments, found by seeking
+# from one to the next in the index.
+OPEN_STATUSES = ("To Do", "Doing")
+NEXT_SUBTASKS_SQL = "SELECT min(open_subtasks) FROM tasks WHERE status = ? AND priority IS ? AND open_subtasks > ?"
+NEXT_DEPENDENTS_SQL = '''SELECT min(open_dependents) FROM tasks
+                         WHERE status = ? AND priority IS ? AND open_subtasks = ? AND open_dependents > ?'''
+RANK_WALK_SQL = f'''SELECT {SCORE_SQL} AS score, tasks.due_date, tasks.time, tasks.id FROM tasks
+                     WHERE tasks.status = :status AND tasks.priority IS :priority AND tasks.open_subtasks = :open_subtasks
+                     AND tasks.open_dependents = :open_dependents AND tasks.due_date {{due}}
+                     ORDER BY tasks.due_date, tasks.time, tasks.id LIMIT :limit'''
+FETCH_RANKED_SQL = f'''SELECT {", ".join(f"tasks.{column}" for column in TASK_COLUMNS)} FROM tasks
+                       WHERE id IN (SELECT value FROM json_each(?))'''
+
+
+def add_rank_counters(conn):
+    """Add open_subtasks and open_dependents to tasks, count them for existing tasks and index them."""
+    conn.execute("ALTER TABLE tasks ADD COLUMN open_subtasks INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE tasks ADD COLUMN open_dependents INTEGER NOT NULL DEFAULT 0")
+    conn.execute('''UPDATE tasks SET open_subtasks = counts.open
+                    FROM (SELECT parent_id, count(*) AS open FROM tasks
+                          WHERE parent_id != 0 AND status IS NOT 'Done' GROUP BY parent_id) AS counts
+                    WHERE tasks.id = counts.parent_id''')
+    conn.execute('''UPDATE tasks SET open_dependents = counts.open
+                    FROM (SELECT task_dependencies.depends_on, count(*) AS open FROM task_dependencies
+                          JOIN tasks ON tasks.id = task_dependencies.task_id
+                          WHERE tasks.status IS NOT 'Done' GROUP BY task_dependencies.depends_on) AS counts
+                    WHERE tasks.id = counts.depends_on''')
+    for statement in RANK_SCHEMA_SQL:
+        conn.execute(statement)
+
+
+def _score_parameters(weights, as_of, limit):
+    unknown = set(weights) - set(DEFAULT_RANK_WEIGHTS)
+    if unknown:
+        raise ValueError(f"Unknown rank weights: {', '.join(sorted(unknown))}. Choose from: {', '.join(DEFAULT_RANK_WEIGHTS)}")
+    parameters = {**DEFAULT_RANK_WEIGHTS, **weights}
+    if any(value < 0 for value in parameters.values()):
+        raise ValueError("Rank weights cannot be negative")
+    if parameters["horizon_days"] <= 0:
+        raise ValueError("horizon_days must be greater than 0")
+    parameters.update(
+        now=as_of.strftime("%Y-%m-%d %H:%M:%S"),
+        # Dates past the horizon score 0 and dates before the cap score the full penalty;
+        # a day's margin on both sides covers due times within the boundary dates
+        horizon_end=(as_of + timedelta(days=parameters["horizon_days"] + 1)).strftime("%Y-%m-%d"),
+        overdue_cap_start=(as_of - timedelta(days=parameters["overdue_cap_days"] + 1)).strftime("%Y-%m-%d"),
+        # LIMIT -1 reads the whole segment when the due term is not in due-date order
+        limit=limit if parameters["overdue"] >= parameters["due"] else -1,
+    )
+    return parameters
+
+
+def _segments(conn, parameters):
+    """Yield (best possible score, status, priority, open_subtasks, open_dependents) for every segment of open tasks."""
+    best_due = max(parameters["due"], parameters["overdue"] + parameters["overdue_per_day"] * parameters["overdue_cap_days"])
+    for status in OPEN_STATUSES:
+        for priority in (*PRIORITY_RANKS, None):
+            base = parameters[priority.lower()] if priority else 0
+            open_subtasks = -1
+            while (open_subtasks := conn.execute(NEXT_SUBTASKS_SQL, (status, priority, open_subtasks)).fetchone()[0]) is not None:
+                open_dependents = -1
+                while (open_dependents := conn.execute(NEXT_DEPENDENTS_SQL, (status, priority, open_subtasks, open_dependents)).fetchone()[0]) is not None:
+                    bound = base + best_due + parameters["subtasks"] * open_subtasks + parameters["blocking"] * open_dependents
+                    yield bound, status, priority, open_subtasks, open_dependents
+
+
+# Function to pick the open tasks to work on next
+def rank_tasks(limit=DEFAULT_RANK_LIMIT, weights=None, as_of=None):
+    """Return the `limit` most urgent open tasks, most urgent first.
+
+    Ties go to the task due first (undated tasks last), then the lower ID. Segments
+    of open tasks are read from idx_tasks_rank in order of the best score they could
+    hold, taking the first `limit` tasks of each, with a heap of the best scores seen
+    so far; once its worst score beats what any remaining segment could reach, the
+    rest are skipped. The work depends on the number of segments and `limit`, not on
+    the number of tasks. Weights that make an overdue task score below one due soon
+    (overdue < due) break the due-date order segments are cut by, so every open
+    task is scored instead.
+
+    :param limit: Number of tasks to return
+    :param weights: Overrides of DEFAULT_RANK_WEIGHTS (e.g., {"blocking": 5.0})
+    :param as_of: The moment due dates are measured against (datetime, default: now)
+    :return: A list of dictionaries with task (a Task), score, open_subtasks and
+             blocking (open tasks that depend on it); empty on failure
+    """
+    parameters = _score_parameters(weights or {}, as_of or datetime.now(), limit)
+    if limit <= 0:
+        return []
+    conn = get_connection()
+    try:
+        candidates = []
+        best_scores = []  # min-heap holding the `limit` highest scores found
+        for bound, status, priority, open_subtasks, open_dependents in sorted(_segments(conn, parameters), key=lambda segment: -segment[0]):
+            if parameters["limit"] > 0 and len(best_scores) == limit and best_scores[0] > bound:
+                break
+            segment = dict(parameters, status=status, priority=priority, open_subtasks=open_subtasks, open_dependents=open_dependents)
+            for due in ("IS NOT NULL", "IS NULL"):
+                for score, due_date, time, task_id in conn.execute(RANK_WALK_SQL.format(due=due), segment):
+                    candidates.append((score, due_date, time, task_id, open_subtasks, open_dependents))
+                    if len(best_scores) < limit:
+                        heapq.heappush(best_scores, score)
+                    elif score > best_scores[0]:
+                        heapq.heapreplace(best_scores, score)
+        ranked = heapq.nsmallest(limit, candidates, key=lambda candidate: (-candidate[0], candidate[1] is None, candidate[1] or "",
+                                                                           candidate[2] or "", candidate[3]))
+        tasks = {row[0]: Task._make(row) for row in conn.execute(FETCH_RANKED_SQL, (str([candidate[3] for candidate in ranked]),))}
+    except sqlite3.Error as e:
+        print(f"Error ranking tasks: {e}")
+        logging.error("Error ranking tasks: %s", e)
+        return []
+    return [{"task": tasks[task_id], "score": score, "open_subtasks": subtasks, "blocking": blocking}
+            for score, _, _, task_id, subtasks, blocking in ranked if task_id in tasks]
@@ -0,0 +1,206 @@
+import calendar
+import logging
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from modules.cache_handler import bump_generation
+from modules.connection_handler import get_connection, transaction
+
+DATE_FORMAT = "%Y-%m-%d"
+RECURRENCES = ("daily", "weekly", "monthly")
+
+# Recurring tasks whose next occurrence has arrived. Matches the partial index
+# idx_tasks_next_occurrence, so only recurring rows are visited.
+DUE_FOR_ROLLOVER_SQL = "recurrence != 'none' AND next_occurrence IS NOT NULL AND next_occurrence <= ?"
+
+# One set-based pass: every due task moves to its latest occurrence on or before the
+# rollover date, is reopened, and gets the following occurrence as next_occurrence.
+# Daily and weekly steps are plain date arithmetic in SQL; only monthly series, which
+# need month-end clamping, call back into Python.
+_ANCHOR_SQL = "coalesce(recurrence_anchor, due_date)"
+_WEEKS_SQL = f"CAST(julianday(?1) - julianday({_ANCHOR_SQL}) AS INTEGER) / 7 * 7"
+ROLLOVER_SQL = f'''UPDATE tasks SET
+                       due_date = CASE recurrence
+                           WHEN 'daily' THEN ?1
+                           WHEN 'weekly' THEN date({_ANCHOR_SQL}, '+' || ({_WEEKS_SQL}) || ' days')
+                           ELSE recurrence_latest(recurrence, {_ANCHOR_SQL}, ?1) END,
+                       next_occurrence = CASE recurrence
+                           WHEN 'daily' THEN date(?1, '+1 day')
+                           WHEN 'weekly' THEN date({_ANCHOR_SQL}, '+' || ({_WEEKS_SQL} + 7) || ' days')
+                           ELSE recurrence_after(recurrence, {_ANCHOR_SQL}, ?1) END,
+                       status = 'To Do'
+                   WHERE {DUE_FOR_ROLLOVER_SQL.replace("?", "?1")}'''
+
+# Re-derive anchor and next occurrence after due_date or recurrence was edited
+REFRESH_RECURRENCE_SQL = '''UPDATE tasks SET
+                                recurrence_anchor = CASE WHEN recurrence = 'none' THEN NULL ELSE due_date END,
+                                next_occurrence = recurrence_after(recurrence, due_date, due_date)
+                            WHERE id IN (SELECT value FROM json_each(?))'''
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def add_months(start, months, anchor_day=None):
+    """Move a date by whole months, clamping to the last day of shorter months.
+
+    :param start: The starting date
+    :param months: Number of months to add (may be negative)
+    :param anchor_day: Day of month to aim for (default: start.day); keeps a series
+                       anchored on the 31st at month end instead of drifting to the 28th
+    """
+    year, month = divmod(start.month - 1 + months, 12)
+    year += start.year
+    month += 1
+    day = min(anchor_day or start.day, calendar.monthrange(year, month)[1])
+    return start.replace(year=year, month=month, day=day)
+
+
+def occurrence(recurrence, anchor, index):
+    """Return the date of occurrence number `index` of a series (the anchor is occurrence 0)."""
+    if recurrence == "daily":
+        return anchor + timedelta(days=index)
+    if recurrence == "weekly":
+        return anchor + timedelta(weeks=index)
+    if recurrence == "monthly":
+        return add_months(anchor, index, anchor.day)
+    raise ValueError(f"Unknown recurrence: {recurrence}")
+
+
+def _latest_index(recurrence, anchor, day):
+    """Index of the last occurrence on or before `day` (-1 if the series starts later)."""
+    if day < anchor:
+        return -1
+    if recurrence == "daily":
+        return (day - anchor).days
+    if recurrence == "weekly":
+        return (day - anchor).days // 7
+    if recurrence == "monthly":
+        index = (day.year - anchor.year) * 12 + day.month - anchor.month
+        return index if occurrence(recurrence, anchor, index) <= day else index - 1
+    raise ValueError(f"Unknown recurrence: {recurrence}")
+
+
+def latest_occurrence(recurrence, anchor, day):
+    """Return the last occurrence on or before `day`, or None if the series has not started."""
+    index = _latest_index(recurrence, _to_date(anchor), _to_date(day))
+    return occurrence(recurrence, _to_date(anchor), index) if index >= 0 else None
+
+
+def occurrence_after(recurrence, anchor, day):
+    """Return the first occurrence strictly after `day`."""
+    anchor = _to_date(anchor)
+    return occurrence(recurrence, anchor, _latest_index(recurrence, anchor, _to_date(day)) + 1)
+
+
+# Function to calculate the next occurrence date
+def calculate_next_occurrence(recurrence, current_date):
+    """Return the occurrence one period after `current_date` as YYYY-MM-DD, or None for "none".
+
+    Monthly series clamp to the end of shorter months (January 31 -> February 28/29).
+    """
+    if recurrence not in RECURRENCES:
+        return None
+    return occurrence(recurrence, _to_date(current_date), 1).strftime(DATE_FORMAT)
+
+
+def project_occurrences(recurrence, anchor, start, end=None, limit=None):
+    """Yield occurrence dates of a series inside a date range without writing anything.
+
+    :param recurrence: "daily", "weekly" or "monthly"
+    :param anchor: First date of the series
+    :param start: First date of the range (inclusive)
+    :param end: Last date of the range (inclusive, default: unbounded)
+    :param limit: Maximum number of dates to yield
+    """
+    if recurrence not in RECURRENCES or anchor is None:
+        return
+    anchor, start = _to_date(anchor), _to_date(start)
+    end = _to_date(end) if end is not None else None
+    index = max(_latest_index(recurrence, anchor, start - timedelta(days=1)) + 1, 0)
+    count = 0
+    while limit is None or count < limit:
+        day = occurrence(recurrence, anchor, index)
+        if end is not None and day > end:
+            return
+        yield day
+        count += 1
+        index += 1
+
+
+def project_task_occurrences(task_id, start=None, end=None, limit=10):
+    """Project the upcoming occurrences of one recurring task.
+
+    :param task_id: ID of a recurring task
+    :param start: First date of the range (default: today)
+    :param end: Last date of the range (default: unbounded)
+    :param limit: Maximum number of dates (default: 10)
+    :return: A list of dates; empty if the task does not exist or does not recur
+    """
+    row = get_connection().execute("SELECT recurrence, coalesce(recurrence_anchor, due_date) FROM tasks WHERE id = ?",
+                                   (task_id,)).fetchone()
+    if row is None:
+        return []
+    return list(project_occurrences(row[0], row[1], start or date.today(), end, limit))
+
+
+def _sql_date_function(function):
+    # SQLite passes text dates; return text and map bad input to NULL instead of raising inside the query
+    def wrapper(recurrence, anchor, day):
+        if recurrence not in RECURRENCES or not anchor or not day:
+            return None
+        try:
+            result = function(recurrence, anchor, day)
+        except ValueError:
+            return None
+        return result.isoformat() if result else None
+    return wrapper
+
+
+def register_sql_functions(conn):
+    """Expose the recurrence arithmetic to SQL so rollover runs as a single UPDATE."""
+    conn.create_function("recurrence_latest", 3, _sql_date_function(latest_occurrence), deterministic=True)
+    conn.create_function("recurrence_after", 3, _sql_date_function(occurrence_after), deterministic=True)
+
+
+def refresh_recurrence(conn, task_ids):
+    """Recompute recurrence_anchor and next_occurrence for tasks whose due date or recurrence changed."""
+    register_sql_functions(conn)
+    conn.execute(REFRESH_RECURRENCE_SQL, (f"[{', '.join(str(int(task_id)) for task_id in task_ids)}]",))
+
+
+def count_due_rollovers(as_of=None):
+    """Return how many recurring tasks a rollover on `as_of` (default: today) would advance."""
+    as_of = _to_date(as_of or date.today()).strftime(DATE_FORMAT)
+    return get_connection().execute(f"SELECT COUNT(*) FROM tasks WHERE {DUE_FOR_ROLLOVER_SQL}", (as_of,)).fetchone()[0]
+
+
+def rollover_recurring_tasks(as_of=None):
+    """Advance every recurring task whose next occurrence has arrived, in one transaction.
+
+    Each due task gets the latest occurrence on or before `as_of` as its due date,
+    status "To Do", and the first occurrence after `as_of` as next_occurrence. A task
+    that missed several periods jumps straight to the current one. Running it again
+    for the same date changes nothing, so it is safe to schedule from cron.
+
+    :param as_of: Rollover date (date or YYYY-MM-DD, default: today)
+    :return: The number of tasks rolled over (None on failure)
+    """
+    as_of = _to_date(as_of or date.today()).strftime(DATE_FORMAT)
+    try:
+        with transaction() as conn:
+            register_sql_functions(conn)
+            rolled = conn.execute(ROLLOVER_SQL, (as_of,)).rowcount
+            if rolled:
+                bump_generation(conn)
+        logging.info("Rolled over %d recurring tasks as of %s", rolled, as_of)
+        return rolled
+    except sqlite3.Error as e:
+        print(f"Error rolling over recurring tasks: {e}")
+        logging.error("Error rolling over recurring tasks: %s", e)
+        return None
@@ -0,0 +1,180 @@
+import io
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+
+from modules.client_handler import ENCODING, get_socket_path, receive_message, send_message
+from modules.connection_handler import get_db_path, set_db_path
+
+# Output is sent to the client in chunks of at most this many characters
+OUTPUT_CHUNK_SIZE = 65536
+
+
+class _ClientOutput(io.TextIOBase):
+    """Text stream that forwards writes to the client as {"out": ...} or {"err": ...} messages."""
+
+    def __init__(self, writer, channel, tty=False):
+        self._writer = writer
+        self._channel = channel
+        self._tty = tty
+        self._buffer = []
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self._tty
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= OUTPUT_CHUNK_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            send_message(self._writer, {self._channel: "".join(self._buffer)})
+            self._buffer = []
+            self._size = 0
+
+
+class _ClientInput(io.TextIOBase):
+    """Text stream that reads each line from the client's stdin on demand."""
+
+    def __init__(self, reader, writer, outputs):
+        self._reader = reader
+        self._writer = writer
+        self._outputs = outputs
+
+    def readable(self):
+        return True
+
+    def readline(self, size=-1):
+        # Show any pending prompt before waiting for the answer
+        for output in self._outputs:
+            output.flush()
+        send_message(self._writer, {"input": True})
+        message = receive_message(self._reader)
+        return (message or {}).get("line") or ""
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    """Run one forwarded command line with stdin, stdout and stderr attached to the client."""
+
+    def handle(self):
+        reader = io.TextIOWrapper(self.rfile, encoding=ENCODING)
+        writer = io.TextIOWrapper(self.wfile, encoding=ENCODING, write_through=True)
+        try:
+            request = receive_message(reader)
+            if request is None:
+                return
+            stdout = _ClientOutput(writer, "out", tty=request.get("tty", False))
+            stderr = _ClientOutput(writer, "err")
+            code = self._run(request, stdout, stderr, _ClientInput(reader, writer, (stdout, stderr)))
+            stdout.flush()
+            stderr.flush()
+            send_message(writer, {"exit": code})
+        except (OSError, ValueError) as e:
+            # The client disconnected or sent something that is not the protocol
+            logging.warning("Dropped client connection: %s", e)
+
+    def _run(self, request, stdout, stderr, stdin):
+        argv = request.get("argv") or []
+        if argv[:1] == ["serve"]:
+            stderr.write("Already running as a server.\n")
+            return 2
+        if argv[:1] == ["watch"]:
+            stderr.write("watch needs a terminal; run it directly instead of through the server.\n")
+            return 2
+
+        db_path = get_db_path()
+        cwd = os.getcwd()
+        saved_stdin = sys.stdin
+        try:
+            # Relative paths in the command (--db, --from-file) are relative to the client
+            os.chdir(request.get("cwd") or cwd)
+            if request.get("db"):
+                set_db_path(os.path.abspath(request["db"]))
+            sys.stdin = stdin
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                self.server.run_command(argv)
+            return 0
+        except SystemExit as e:
+            # argparse exits on --help and on usage errors
+            return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        finally:
+            sys.stdin = saved_stdin
+            os.chdir(cwd)
+            if get_db_path() != db_path:
+                set_db_path(db_path)
+
+
+class _CommandServer(socketserver.UnixStreamServer):
+    # Commands redirect the process-wide stdout, so requests are handled one at a time
+    def __init__(self, socket_path, run_command):
+        self.run_command = run_command
+        super().__init__(socket_path, _CommandHandler)
+
+
+def _socket_in_use(socket_path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+# Function to serve commands over a Unix socket
+def serve(run_command, socket_path=None):
+    """Run commands sent by forward_command until interrupted.
+
+    The process keeps its imports, parsed schema and open database connection
+    between commands, so each forwarded command only pays for its own work.
+
+    :param run_command: Callable taking an argument list, e.g. main.main
+    :param socket_path: Socket to listen on (default: $TASK_MANAGER_SOCKET or db/task_manager.sock)
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        print("The serve command needs Unix domain sockets, which this platform does not support.")
+        return
+    socket_path = os.path.abspath(socket_path or get_socket_path())
+    if os.path.exists(socket_path):
+        if _socket_in_use(socket_path):
+            print(f"A server is already listening on {socket_path}.")
+            return
+        # Left behind by a server that did not shut down cleanly
+        os.unlink(socket_path)
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+    # Commands change directory to the client's; keep using the same database file
+    if get_db_path() != ":memory:":
+        set_db_path(os.path.abspath(get_db_path()))
+
+    server = _CommandServer(socket_path, run_command)
+    os.chmod(socket_path, 0o600)
+    # Background jobs ignore Ctrl+C, so stop just as cleanly on `kill`
+    signal.signal(signal.SIGTERM, _interrupt)
+    logging.info("Serving commands on %s for database %s", socket_path, get_db_path())
+    print(f"Serving on {socket_path} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        logging.info("Stopped serving on %s", socket_path)
@@ -0,0 +1,375 @@
+import heapq
+import os
+import threading
+from datetime import datetime
+from itertools import islice
+
+from modules import db_handler
+from modules.connection_handler import close_connection, get_connection, use_database
+from modules.profile_handler import phase
+from modules.task_model import TASK_REF_PATTERN
+
+# Shard configuration file, used when --shards is not given
+SHARDS_ENV = "TASK_MANAGER_SHARDS"
+
+# Config key in [routing] naming the shard for tasks no other rule places
+DEFAULT_ROUTE = "default"
+
+# Pages each shard reads ahead of the merge when a listing streams
+PREFETCH_PAGES = 4
+
+
+def parse_task_ref(ref):
+    """Split a task ID into (shard name or None, integer ID).
+
+    :param ref: An integer ID, "12" or "work:12"
+    :return: A (shard, task_id) pair
+    """
+    if isinstance(ref, int):
+        return None, ref
+    match = TASK_REF_PATTERN.match(str(ref).strip())
+    if not match:
+        raise ValueError(f"Invalid task ID '{ref}'. Use ID or SHARD:ID (e.g., 12 or work:12).")
+    return match["shard"], int(match["task_id"])
+
+
+class ShardSet:
+    """Several task databases used as one: reads fan out, writes are routed.
+
+    Each shard is an ordinary task database. Reads run on every shard at once, one
+    worker thread per shard (SQLite releases the GIL while it works, and each thread
+    has its own connections), and the per-shard results are merged. Writes go to a
+    single shard, chosen by route(). Task IDs are only unique within a shard, so
+    tasks read from a ShardSet carry shard-qualified IDs such as "work:12", and
+    those are what resolve() accepts.
+
+        shards = ShardSet.from_paths(["db/work.db", "db/home.db"])
+        tasks = shards.list_tasks(sort_by="due_date", limit=20)
+        shards.close()
+
+    Subtasks and dependencies refer to tasks in their own shard.
+    """
+
+    def __init__(self, shards, routes=None, default=None):
+        """
+        :param shards: Mapping (or pairs) of shard name to database path, in display order
+        :param routes: Mapping of category to the shard new tasks of that category go to
+        :param default: Shard for tasks no route applies to (default: the first shard)
+        """
+        self.shards = dict(shards)
+        if not self.shards:
+            raise ValueError("A shard set needs at least one database.")
+        self.routes = {category.lower(): name for category, name in (routes or {}).items()}
+        self.default = default or next(iter(self.shards))
+        for name in [self.default, *self.routes.values()]:
+            self.path(name)
+        self._pool = None
+        self._worker_connections = set()
+        self._prefetches = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_paths(cls, paths):
+        """Build a shard set from database paths, naming each shard after its file (db/work.db is "work")."""
+        shards = {}
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            if name in shards:
+                raise ValueError(f"Shard databases need distinct file names: '{name}' is used twice.")
+            shards[name] = path
+        return cls(shards)
+
+    @classmethod
+    def from_config(cls, config_path):
+        """Build a shard set from an INI file.
+
+            [shards]
+            work = work.db
+            home = /data/home.db
+
+            [routing]
+            Work = work
+            Home = home
+            default = work
+
+        Relative database paths are relative to the file. [routing] maps task
+        categories to shards; it is optional, as is its default entry.
+        """
+        # Imported here so single-database commands do not load configparser
+        import configparser
+        parser = configparser.ConfigParser()
+        if not parser.read(config_path):
+            raise ValueError(f"Shard configuration '{config_path}' cannot be read.")
+        if not parser.has_section("shards"):
+            raise ValueError(f"Shard configuration '{config_path}' has no [shards] section.")
+        directory = os.path.dirname(os.path.abspath(config_path))
+        shards = {name: os.path.join(directory, path) for name, path in parser.items("shards")}
+        routes = dict(parser.items("routing")) if parser.has_section("routing") else {}
+        return cls(shards, routes, default=routes.pop(DEFAULT_ROUTE, None))
+
+    @property
+    def names(self):
+        return list(self.shards)
+
+    def path(self, name):
+        """Return the database path of shard `name`."""
+        try:
+            return self.shards[name]
+        except KeyError:
+            raise ValueError(f"Unknown shard '{name}'. Choose from: {', '.join(self.shards)}") from None
+
+    # Function to run any db_handler function on one shard
+    def run(self, name, function, *args, **kwargs):
+        """Call `function` in the calling thread with shard `name` as its database."""
+        with use_database(self.path(name)):
+            return function(*args, **kwargs)
+
+    def _run_on_worker(self, name, function, args, kwargs):
+        with use_database(self.path(name)):
+            try:
+                return function(*args, **kwargs)
+            finally:
+                # Remember the worker's connection so close() can release it
+                with self._lock:
+                    self._worker_connections.add(get_connection())
+
+    def _submit(self, name, function, *args, **kwargs):
+        if self._pool is None:
+            # Imported here so single-database commands do not load concurrent.futures
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="shard")
+        return self._pool.submit(self._run_on_worker, name, function, args, kwargs)
+
+    # Function to run any db_handler function on every shard at once
+    def map(self, function, *args, **kwargs):
+        """Call `function` on every shard in parallel.
+
+        :return: A list of (shard name, result) pairs in shard order
+        """
+        with phase("shards.map"):
+            futures = [(name, self._submit(name, function, *args, **kwargs)) for name in self.shards]
+            return [(name, future.result()) for name, future in futures]
+
+    def close(self):
+        """Stop the worker threads and close their connections."""
+        # Release workers still reading ahead for a listing nobody finished
+        for prefetch in list(self._prefetches):
+            _stop_prefetch(*prefetch)
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        with self._lock:
+            connections, self._worker_connections = self._worker_connections, set()
+        for conn in connections:
+            close_connection(conn)
+
+    def resolve(self, ref, shard=None):
+        """Return the (shard name, task ID) a task ID refers to.
+
+        An unqualified ID is only accepted when it cannot be ambiguous: with a
+        single shard, or when `shard` names the shard to look in.
+
+        :param ref: A task ID, plain or shard-qualified ("work:12")
+        :param shard: The shard an unqualified ID belongs to
+        """
+        name, task_id = parse_task_ref(ref)
+        if name is not None:
+            self.path(name)
+            if shard is not None and shard != name:
+                raise ValueError(f"Task {ref} is not in shard '{shard}'; tasks cannot refer across shards.")
+            return name, task_id
+        if shard is not None:
+            self.path(shard)
+            return shard, task_id
+        if len(self.shards) == 1:
+            return self.default, task_id
+        raise ValueError(f"Task ID {task_id} is ambiguous across shards {', '.join(self.shards)}; use SHARD:{task_id}.")
+
+    def route(self, shard=None, category=None, parent_id=None):
+        """Return the shard a new task is written to.
+
+        A subtask goes to its parent's shard; otherwise an explicit `shard` wins,
+        then the routing rule for the task's category, then the default shard.
+        """
+        if parent_id:
+            return self.resolve(parent_id, shard)[0]
+        if shard is not None:
+            self.path(shard)
+            return shard
+        return self.routes.get((category or "").lower(), self.default)
+
+    @staticmethod
+    def qualify(name, task):
+        """Return `task` with its ID (and parent ID, for a subtask) qualified by shard `name`."""
+        if task is None:
+            return None
+        return task._replace(id=f"{name}:{task.id}", parent_id=f"{name}:{task.parent_id}" if task.parent_id else task.parent_id)
+
+    def fetch_task(self, ref):
+        """Fetch a task by shard-qualified ID; the record carries the qualified ID."""
+        name, task_id = self.resolve(ref)
+        return self.qualify(name, self.run(name, db_handler.fetch_task, task_id))
+
+    def update_task(self, ref, updates):
+        """Update a task by shard-qualified ID; returns what db_handler.update_task returns."""
+        name, task_id = self.resolve(ref)
+        return self.run(name, db_handler.update_task, task_id, updates)
+
+    def delete_task(self, ref):
+        """Delete a task and its subtasks by shard-qualified ID."""
+        name, task_id = self.resolve(ref)
+        return self.run(name, db_handler.delete_task, task_id)
+
+    def add_task(self, title, description, category, priority, status, due_date, time, parent_id=0,
+                 recurrence="none", dependencies="[]", shard=None):
+        """Add a task to the shard route() picks.
+
+        :param parent_id: Parent task, shard-qualified unless `shard` is given
+        :param dependencies: IDs of tasks in the same shard
+        :return: The new task's shard-qualified ID (None on failure)
+        """
+        name = self.route(shard, category, parent_id)
+        parent = self.resolve(parent_id, name)[1] if parent_id else 0
+        task_id = self.run(name, db_handler.add_task, title, description, category, priority, status, due_date,
+                           time, parent, recurrence, dependencies)
+        return f"{name}:{task_id}" if task_id is not None else None
+
+    # Function to list tasks from every shard in one order
+    def list_tasks(self, filters=None, sort_by=None, limit=None, offset=None, include_archived=False):
+        """List tasks of every shard as one sorted result, like db_handler.list_tasks.
+
+        With a limit, every shard returns its first offset + limit tasks in parallel,
+        already sorted by its own index. Without one, a worker per shard reads pages
+        with db_handler.iter_tasks into a queue of PREFETCH_PAGES pages, so the shards
+        are still read in parallel while the output streams and memory use does not
+        grow with the number of tasks. Either way a k-way merge interleaves the shards
+        in the order list_tasks uses, ties going to the earlier shard. Full-text
+        relevance scores are per database, so a query without sort_by interleaves
+        each shard's best matches by rank.
+
+        :return: A list of Task records with shard-qualified IDs, or a generator of
+                 them when there is no limit
+        """
+        offset = offset or 0
+        key = db_handler.list_sort_key(filters, sort_by)
+        if limit is None:
+            streams = [(name, self._prefetch_tasks(name, filters, sort_by, include_archived)) for name in self.shards]
+            return (self.qualify(name, task) for name, task in islice(_merge(streams, key), offset, None))
+        results = self.map(db_handler.list_tasks, filters, sort_by, offset + limit, None, include_archived=include_archived)
+        return [self.qualify(name, task) for name, task in islice(_merge(results, key), offset, offset + limit)]
+
+    def _prefetch_tasks(self, name, filters, sort_by, include_archived):
+        """Start reading shard `name` on a worker and return a generator of its tasks.
+
+        The worker stays busy until the generator is exhausted or closed (or the
+        shard set is closed), so map() must not be called while one is open.
+        """
+        # Imported here, with concurrent.futures, so single-database commands do not load it
+        import queue
+        prefetch = (queue.Queue(maxsize=PREFETCH_PAGES), threading.Event())
+        self._prefetches.add(prefetch)
+        self._submit(name, _read_ahead, *prefetch, filters, sort_by, include_archived)
+        return self._drain(prefetch)
+
+    def _drain(self, prefetch):
+        pages, _ = prefetch
+        try:
+            while True:
+                page = pages.get()
+                if isinstance(page, Exception):
+                    raise page
+                if not page:
+                    return
+                yield from page
+        finally:
+            _stop_prefetch(*prefetch)
+            self._prefetches.discard(prefetch)
+
+    def search_tasks(self, query, limit=20, include_archived=False):
+        """Search every shard; each shard's best matches are interleaved by rank.
+
+        :return: A list of (task, snippet) pairs with shard-qualified task IDs
+        """
+        results = self.map(db_handler.search_tasks, query, limit, include_archived=include_archived)
+        merged = _merge(results, None)
+        return [(self.qualify(name, task), snippet) for name, (task, snippet) in islice(merged, limit)]
+
+    def summarize_tasks(self, group_by=None, filters=None, as_of=None):
+        """Summarize every shard with db_handler.summarize_tasks and add up the groups."""
+        as_of = as_of or datetime.now()
+        totals = {}
+        for _, summary in self.map(db_handler.summarize_tasks, group_by, filters, as_of):
+            for entry in summary:
+                group = tuple((column, value) for column, value in entry.items()
+                              if column not in db_handler.SUMMARY_FIELDS and column != "percent_done")
+                combined = totals.setdefault(group, dict(group, **dict.fromkeys(db_handler.SUMMARY_FIELDS, 0)))
+                for field in db_handler.SUMMARY_FIELDS:
+                    combined[field] += entry[field]
+        summary = []
+        for group in sorted(totals, key=lambda group: tuple((value is not None, value) for _, value in group)):
+            entry = totals[group]
+            entry["percent_done"] = 100.0 * entry["done"] / entry["total"]
+            summary.append(entry)
+        return summary
+
+
+def _read_ahead(pages, stopped, filters, sort_by, include_archived):
+    # Runs on a worker inside the shard's database; an empty page marks the end
+    tasks = db_handler.iter_tasks(filters, sort_by, include_archived=include_archived)
+    try:
+        while not stopped.is_set():
+            page = list(islice(tasks, db_handler.DEFAULT_PAGE_SIZE))
+            pages.put(page)
+            if not page:
+                return
+    except Exception as e:
+        # Raised again in the reading thread
+        pages.put(e)
+
+
+def _stop_prefetch(pages, stopped):
+    # A worker blocked on a full queue is released by the first get and then sees
+    # `stopped`, so at most one more page arrives and the queue never fills again
+    stopped.set()
+    while not pages.empty():
+        pages.get_nowait()
+
+
+def _merge(results, key):
+    """K-way merge of per-shard sorted lists into (shard name, item) pairs.
+
+    With no key, items are interleaved by their position in their shard's list.
+    """
+    if key is None:
+        streams = [_positioned(name, items) for name, items in results]
+        return ((name, item) for _, name, item in heapq.merge(*streams, key=lambda entry: entry[0]))
+    streams = [_labelled(name, items) for name, items in results]
+    return heapq.merge(*streams, key=lambda entry: key(entry[1]))
+
+
+def _labelled(name, items):
+    for item in items:
+        yield name, item
+
+
+def _positioned(name, items):
+    for position, item in enumerate(items):
+        yield position, name, item
+
+
+# Function to build the shard set named on the command line
+def load_shards(db_paths=None, config_path=None):
+    """Return the ShardSet to use, or None when commands run on a single database.
+
+    Several --db paths form a shard set; a single one always means that database.
+    Otherwise a configuration file given with --shards or $TASK_MANAGER_SHARDS is read.
+
+    :param db_paths: The --db paths given, in order
+    :param config_path: The --shards configuration file
+    """
+    if db_paths and len(db_paths) > 1:
+        return ShardSet.from_paths(db_paths)
+    if db_paths:
+        return None
+    config_path = config_path or os.environ.get(SHARDS_ENV)
+    return ShardSet.from_config(config_path) if config_path else None
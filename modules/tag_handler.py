@@ -0,0 +1,347 @@
+import logging
+import re
+import sqlite3
+
+from modules.cache_handler import bump_generation
+from modules.connection_handler import get_connection, transaction
+
+# Tags are many-to-many. task_tags is the inverted index: clustered on (tag_id, task_id),
+# so each tag's posting list is one contiguous, sorted range of the table, and a
+# (tag, task) membership test is a single primary-key seek. tags.task_count is the
+# length of each posting list, kept exact by triggers, so filters can be planned
+# without counting. A task's category is always one of its tags.
+TAG_SCHEMA_SQL = (
+    '''CREATE TABLE IF NOT EXISTS tags (
+           id INTEGER PRIMARY KEY,
+           name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+           task_count INTEGER NOT NULL DEFAULT 0
+       )''',
+    '''CREATE TABLE IF NOT EXISTS task_tags (
+           tag_id INTEGER NOT NULL,
+           task_id INTEGER NOT NULL,
+           PRIMARY KEY (tag_id, task_id)
+       ) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_task_tags_task ON task_tags (task_id, tag_id)",
+    '''CREATE TRIGGER IF NOT EXISTS task_tags_count_insert AFTER INSERT ON task_tags BEGIN
+           UPDATE tags SET task_count = task_count + 1 WHERE id = new.tag_id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS task_tags_count_delete AFTER DELETE ON task_tags BEGIN
+           UPDATE tags SET task_count = task_count - 1 WHERE id = old.tag_id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_category_tag_insert AFTER INSERT ON tasks WHEN new.category IS NOT NULL BEGIN
+           INSERT OR IGNORE INTO tags (name) VALUES (new.category);
+           INSERT OR IGNORE INTO task_tags (tag_id, task_id) SELECT id, new.id FROM tags WHERE name = new.category;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_category_tag_update AFTER UPDATE OF category ON tasks
+       WHEN new.category IS NOT old.category BEGIN
+           DELETE FROM task_tags WHERE task_id = new.id AND tag_id = (SELECT id FROM tags WHERE name = old.category);
+           INSERT OR IGNORE INTO tags (name) SELECT new.category WHERE new.category IS NOT NULL;
+           INSERT OR IGNORE INTO task_tags (tag_id, task_id) SELECT id, new.id FROM tags WHERE name = new.category;
+       END''',
+    # Archived tasks keep their tags, so --include-archived listings can still filter on them
+    '''CREATE TRIGGER IF NOT EXISTS tasks_tags_delete AFTER DELETE ON tasks
+       WHEN NOT EXISTS (SELECT 1 FROM tasks_archive WHERE id = old.id) BEGIN
+           DELETE FROM task_tags WHERE task_id = old.id;
+       END''',
+)
+
+# A tag edit is logged as an update of the task, so change feeds and watch see it.
+# Category tags change only with the category column, which its trigger logs already.
+LOG_TAG_CHANGE_SQL = "INSERT INTO task_changes (task_id, operation) SELECT id, 'update' FROM tasks WHERE id = ?"
+
+SEED_TAGS_SQL = (
+    '''INSERT OR IGNORE INTO tags (name)
+       SELECT category FROM tasks WHERE category IS NOT NULL
+       UNION SELECT category FROM tasks_archive WHERE category IS NOT NULL''',
+    '''INSERT OR IGNORE INTO task_tags (tag_id, task_id)
+       SELECT tags.id, tasks.id FROM tasks JOIN tags ON tags.name = tasks.category
+       UNION ALL
+       SELECT tags.id, tasks_archive.id FROM tasks_archive JOIN tags ON tags.name = tasks_archive.category
+       ORDER BY 1, 2''',
+)
+
+# The CHECK constraint that limited category to a fixed list
+CATEGORY_CHECK_PATTERN = re.compile(r"\s*CHECK\s*\(\s*category\s+IN\s*\([^)]*\)\s*\)", re.IGNORECASE)
+
+# Tag expression tokens: parentheses, "quoted tags" and bare words (operators or tags)
+TOKEN_PATTERN = re.compile(r'\s*(?:([()])|"([^"]*)"|([^\s()"]+))')
+OPERATORS = ("AND", "OR", "NOT")
+
+
+def create_tags(conn):
+    """Free category from its fixed list and add tags, seeded with every task's category."""
+    _drop_category_check(conn)
+    for statement in TAG_SCHEMA_SQL:
+        conn.execute(statement)
+    for statement in SEED_TAGS_SQL:
+        conn.execute(statement)
+
+
+def _drop_category_check(conn):
+    """Rebuild the tasks table without the CHECK constraint on category.
+
+    SQLite cannot drop a constraint in place, so this is its documented table
+    rebuild: create the current definition minus the CHECK under a new name, copy
+    the rows, swap the tables and recreate the indexes and triggers. The
+    AUTOINCREMENT counter is carried over, so IDs of deleted and archived tasks
+    are never handed out again.
+    """
+    table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'").fetchone()[0]
+    table_sql, found = CATEGORY_CHECK_PATTERN.subn("", table_sql)
+    if not found:
+        return
+    dependents = [row[0] for row in conn.execute('''SELECT sql FROM sqlite_master
+                                                    WHERE tbl_name = 'tasks' AND type IN ('index', 'trigger') AND sql IS NOT NULL''')]
+    # Generated columns (hidden 2 and 3) are computed, not copied
+    columns = ", ".join(row[1] for row in conn.execute("PRAGMA table_xinfo(tasks)") if row[6] == 0)
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+
+    conn.execute(re.sub(r'^CREATE TABLE\s+(IF NOT EXISTS\s+)?"?tasks"?', "CREATE TABLE tasks_rebuilt", table_sql))
+    conn.execute(f"INSERT INTO tasks_rebuilt ({columns}) SELECT {columns} FROM tasks ORDER BY id")
+    conn.execute("DROP TABLE tasks")
+    # Leave triggers on other tables that mention tasks alone while it is being renamed
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        conn.execute("ALTER TABLE tasks_rebuilt RENAME TO tasks")
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+    for statement in dependents:
+        conn.execute(statement)
+    if sequence:
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)", sequence)
+
+
+def parse_tags(text):
+    """Split a comma-separated tag list ("work, urgent") into names, dropping blanks and duplicates."""
+    names = []
+    for name in (text or "").split(","):
+        name = " ".join(name.split())
+        if '"' in name:
+            raise ValueError(f"Tag names cannot contain '\"': {name}")
+        if name and name.lower() not in (existing.lower() for existing in names):
+            names.append(name)
+    return names
+
+
+def parse_tag_expression(text):
+    """Parse a tag filter such as 'work AND urgent AND NOT blocked' into a tree.
+
+    The syntax follows full-text search: AND, OR and NOT (upper case), parentheses,
+    and "double quotes" around tags with spaces or an operator's name. NOT binds
+    tightest, then AND, then OR; terms side by side are ANDed.
+
+    :return: ("tag", name), ("not", node), ("and", [nodes]) or ("or", [nodes])
+    """
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match:
+            raise ValueError(f"Invalid tag expression '{text}': unbalanced quote")
+        paren, quoted, word = match.groups()
+        if paren:
+            tokens.append(paren)
+        elif quoted is not None:
+            tokens.append(("tag", quoted.strip()))
+        elif word in OPERATORS:
+            tokens.append(word)
+        else:
+            tokens.append(("tag", word))
+        position = match.end()
+    if not tokens:
+        raise ValueError("Empty tag expression")
+
+    def expression(index):
+        branches = []
+        node, index = conjunction(index)
+        branches.append(node)
+        while index < len(tokens) and tokens[index] == "OR":
+            node, index = conjunction(index + 1)
+            branches.append(node)
+        return (branches[0] if len(branches) == 1 else ("or", branches)), index
+
+    def conjunction(index):
+        terms = []
+        node, index = unary(index)
+        terms.append(node)
+        while index < len(tokens) and tokens[index] not in ("OR", ")"):
+            if tokens[index] == "AND":
+                index += 1
+            node, index = unary(index)
+            terms.append(node)
+        return (terms[0] if len(terms) == 1 else ("and", terms)), index
+
+    def unary(index):
+        if index >= len(tokens):
+            raise ValueError(f"Invalid tag expression '{text}': it ends with an operator")
+        token = tokens[index]
+        if token == "NOT":
+            node, index = unary(index + 1)
+            return ("not", node), index
+        if token == "(":
+            node, index = expression(index + 1)
+            if index >= len(tokens) or tokens[index] != ")":
+                raise ValueError(f"Invalid tag expression '{text}': missing ')'")
+            return node, index + 1
+        if isinstance(token, tuple):
+            return token, index + 1
+        raise ValueError(f"Invalid tag expression '{text}': unexpected '{token}'")
+
+    node, index = expression(0)
+    if index != len(tokens):
+        raise ValueError(f"Invalid tag expression '{text}': unexpected '{tokens[index]}'")
+    return node
+
+
+def _tag_names(node):
+    if node[0] == "tag":
+        yield node[1]
+    elif node[0] == "not":
+        yield from _tag_names(node[1])
+    else:
+        for child in node[1]:
+            yield from _tag_names(child)
+
+
+class _TagPlan:
+    """Compiles a parsed tag expression into SQL, ordered by posting list length."""
+
+    def __init__(self, postings):
+        # Lower-cased tag name -> (tag id, posting list length); unknown tags match nothing
+        self.postings = postings
+        self.aliases = 0
+
+    def size(self, node):
+        """Upper bound on the tasks a node matches (None when only a table scan can enumerate them)."""
+        kind = node[0]
+        if kind == "tag":
+            return self.postings.get(node[1].lower(), (None, 0))[1]
+        if kind == "not":
+            return None
+        sizes = [self.size(child) for child in node[1]]
+        if kind == "and":
+            known = [size for size in sizes if size is not None]
+            return min(known) if known else None
+        return None if None in sizes else sum(sizes)
+
+    def probe(self, node, task_id):
+        """SQL condition testing whether the task `task_id` matches, with one index seek per tag."""
+        kind = node[0]
+        if kind == "tag":
+            tag_id = self.postings.get(node[1].lower(), (None, 0))[0]
+            return f"EXISTS (SELECT 1 FROM task_tags WHERE tag_id = ? AND task_id = {task_id})", [tag_id]
+        if kind == "not":
+            condition, values = self.probe(node[1], task_id)
+            return f"NOT {condition}", values
+        # Cheapest test first: the rarest tag rejects the most tasks
+        children = sorted(node[1], key=lambda child: float("inf") if self.size(child) is None else self.size(child))
+        parts = [self.probe(child, task_id) for child in children]
+        joiner = " AND " if kind == "and" else " OR "
+        return "(" + joiner.join(part[0] for part in parts) + ")", [value for part in parts for value in part[1]]
+
+    def driver(self, node):
+        """SELECT of the task IDs a node matches, read from posting lists; None if the node is a pure negation."""
+        kind = node[0]
+        if kind == "tag":
+            tag_id = self.postings.get(node[1].lower(), (None, 0))[0]
+            return "SELECT task_id FROM task_tags WHERE tag_id = ?", [tag_id]
+        if kind == "or":
+            parts = [self.driver(child) for child in node[1]]
+            if None in parts:
+                return None
+            return " UNION ".join(part[0] for part in parts), [value for part in parts for value in part[1]]
+        if kind == "and":
+            # Walk the shortest posting list and probe the others for each of its tasks
+            drivable = [child for child in node[1] if self.size(child) is not None]
+            if not drivable:
+                return None
+            lead = min(drivable, key=self.size)
+            lead_sql, values = self.driver(lead)
+            self.aliases += 1
+            alias = f"lead_{self.aliases}"
+            rest = [child for child in node[1] if child is not lead]
+            condition, rest_values = self.probe(("and", rest), f"{alias}.task_id")
+            return f"SELECT {alias}.task_id FROM ({lead_sql}) AS {alias} WHERE {condition}", values + rest_values
+        return None
+
+
+# Function to turn a tag filter into a WHERE condition
+def tag_filter_sql(expression, task_id="tasks.id"):
+    """Return a SQL condition (and its parameters) selecting the tasks a tag expression matches.
+
+    Evaluation starts from the shortest posting list among the tags that must be
+    present and checks every other tag with a primary-key seek per candidate, so
+    "rare AND common AND NOT blocked" costs O(len(rare) * log n) however large the
+    other lists are. Only an expression with no required tag at all (e.g. "NOT
+    blocked") falls back to testing every task.
+
+    :param expression: A tag expression (see parse_tag_expression) or its parsed tree
+    :param task_id: SQL expression for the task ID being filtered
+    """
+    node = parse_tag_expression(expression) if isinstance(expression, str) else expression
+    names = sorted({name.lower() for name in _tag_names(node)})
+    placeholders = ", ".join("?" * len(names))
+    rows = get_connection().execute(f"SELECT name, id, task_count FROM tags WHERE name IN ({placeholders})", names)
+    plan = _TagPlan({name.lower(): (tag_id, count) for name, tag_id, count in rows})
+    driver = plan.driver(node)
+    if driver is not None:
+        return f"{task_id} IN ({driver[0]})", driver[1]
+    return plan.probe(node, task_id)
+
+
+# Function to add tags to a task
+def add_tags(task_id, names):
+    """Tag a task, creating tags on first use.
+
+    :param task_id: The task to tag
+    :param names: Tag names (matched case-insensitively)
+    :return: The number of tags added (None on failure)
+    """
+    try:
+        with transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(name,) for name in names])
+            added = sum(conn.execute("INSERT OR IGNORE INTO task_tags (tag_id, task_id) SELECT id, ? FROM tags WHERE name = ?",
+                                     (task_id, name)).rowcount for name in names)
+            if added:
+                conn.execute(LOG_TAG_CHANGE_SQL, (task_id,))
+                bump_generation(conn)
+        return added
+    except sqlite3.Error as e:
+        print(f"Error tagging task: {e}")
+        logging.error("Error tagging task %s with %s: %s", task_id, names, e)
+        return None
+
+
+# Function to remove tags from a task
+def remove_tags(task_id, names):
+    """Remove tags from a task; its category's tag stays while it has that category.
+
+    :return: The number of tags removed (None on failure)
+    """
+    try:
+        with transaction() as conn:
+            removed = sum(conn.execute('''DELETE FROM task_tags WHERE task_id = ? AND tag_id =
+                                              (SELECT tags.id FROM tags JOIN tasks ON tasks.id = ?
+                                               WHERE tags.name = ? AND tags.name IS NOT tasks.category)''',
+                                       (task_id, task_id, name)).rowcount for name in names)
+            if removed:
+                conn.execute(LOG_TAG_CHANGE_SQL, (task_id,))
+                bump_generation(conn)
+        return removed
+    except sqlite3.Error as e:
+        print(f"Error untagging task: {e}")
+        logging.error("Error removing tags %s from task %s: %s", names, task_id, e)
+        return None
+
+
+def get_task_tags(task_id):
+    """Return a task's tag names, alphabetically."""
+    return [row[0] for row in get_connection().execute('''SELECT tags.name FROM task_tags JOIN tags ON tags.id = task_tags.tag_id
+                                                          WHERE task_tags.task_id = ? ORDER BY tags.name''', (task_id,))]
+
+
+def list_tags():
+    """Return (name, task count) for every tag in use, most used first."""
+    return get_connection().execute("SELECT name, task_count FROM tags WHERE task_count > 0 ORDER BY task_count DESC, name").fetchall()
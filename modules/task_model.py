@@ -0,0 +1,47 @@
+import re
+from collections import namedtuple
+
+# Column order of a task row, as selected by db_handler
+TASK_COLUMNS = ("id", "title", "description", "category", "priority", "status", "due_date", "time",
+                "parent_id", "recurrence", "next_occurrence", "dependencies")
+
+_COLUMN_INDEX = {column: index for index, column in enumerate(TASK_COLUMNS)}
+
+# A task ID, optionally qualified by the shard that stores it ("work:12")
+TASK_REF_PATTERN = re.compile(r"^(?:(?P<shard>[^:\s]+):)?(?P<task_id>\d+)$")
+
+
+class Task(namedtuple("TaskRow", TASK_COLUMNS)):
+    """A task row: a tuple with named fields that can also be read like a dictionary.
+
+    All three access styles return the same value:
+        task[1], task.title, task["title"]
+
+    Instances have no per-row __dict__ (__slots__ is empty), so a Task costs about
+    as much memory as the plain tuple sqlite3 would return. keys() makes
+    dict(task) and {**task, **updates} work.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = _COLUMN_INDEX[key]
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        index = _COLUMN_INDEX.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return TASK_COLUMNS
+
+    def to_dict(self):
+        return dict(zip(TASK_COLUMNS, self))
+
+
+def task_row_factory(cursor, row):
+    """sqlite3 row factory building a Task straight from the row tuple."""
+    return tuple.__new__(Task, row)
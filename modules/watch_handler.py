@@ -0,0 +1,305 @@
+import argparse
+import bisect
+import heapq
+import logging
+import re
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from modules.change_handler import iter_changes, latest_change_seq
+from modules.cli_handler import parse_where
+from modules.connection_handler import get_connection
+from modules.db_handler import iter_tasks, list_sort_key
+from modules.display_handler import plain_header_line, plain_task_line
+from modules.task_model import Task
+
+# Seconds between checks for changes made by other processes
+WATCH_INTERVAL = 1.0
+
+# Filters a snapshot answers from its indexes; the others are checked task by task
+INDEXED_FILTERS = ("status", "priority", "category", "parent_id")
+SCANNED_FILTERS = ("task_title", "query")
+
+# Commands typed into a watch session
+WATCH_HELP = "Commands: s FIELDS (sort), f FIELD=VALUE ... (filter), /WORDS (search), c (clear filters), q (quit)"
+
+
+class TaskSnapshot:
+    """Every live task held in memory, indexed by the list filters and kept current from the change log.
+
+    The snapshot is loaded once; refresh() then asks SQLite whether anything was
+    committed (PRAGMA data_version, which costs no I/O) and only when something was,
+    reads the change log from the last seq applied and updates just those tasks.
+    Equality filters are answered from value -> IDs indexes, and each sort order
+    used is built once and then kept sorted as tasks change.
+
+        snapshot = TaskSnapshot.load()
+        view = snapshot.view({"status": "To Do"}, sort_by="priority,due-date")
+        snapshot.refresh()
+        first_page = view.tasks(limit=50)
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.indexes = {field: {} for field in INDEXED_FILTERS}
+        self.seq = 0
+        self.data_version = None
+        self._orders = {}  # sort_by -> (key function, key by task ID, sorted keys)
+
+    @classmethod
+    def load(cls):
+        """Read every task and the change log position from one consistent snapshot of the database."""
+        snapshot = cls()
+        conn = get_connection()
+        nested = conn.in_transaction
+        if not nested:
+            conn.execute("BEGIN")
+        try:
+            snapshot.seq = latest_change_seq()
+            for task in iter_tasks():
+                snapshot._add(task)
+            snapshot.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            if not nested:
+                conn.execute("COMMIT")
+        return snapshot
+
+    def _add(self, task):
+        self.tasks[task.id] = task
+        for field, index in self.indexes.items():
+            index.setdefault(task[field], set()).add(task.id)
+        for key, keys, order in self._orders.values():
+            keys[task.id] = key(task)
+            bisect.insort(order, keys[task.id])
+
+    def _remove(self, task_id):
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return
+        for field, index in self.indexes.items():
+            ids = index[task[field]]
+            ids.discard(task_id)
+            if not ids:
+                del index[task[field]]
+        for _, keys, order in self._orders.values():
+            del order[bisect.bisect_left(order, keys.pop(task_id))]
+
+    # Function to bring the snapshot up to date
+    def refresh(self):
+        """Apply the changes committed since the last refresh.
+
+        :return: The set of IDs of tasks inserted, updated or deleted (empty if nothing changed)
+        """
+        conn = get_connection()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return set()
+        self.data_version = data_version
+        changed = set()
+        for change in iter_changes(self.seq):
+            self.seq = change["seq"]
+            self._remove(change["task_id"])
+            if change["task"] is not None:
+                self._add(Task(**change["task"]))
+            changed.add(change["task_id"])
+        return changed
+
+    def order(self, sort_by=None):
+        """Return (key by task ID, sorted keys) for a list_tasks sort order, building it on first use.
+
+        Keys are list_sort_key keys, whose last element is (True, task ID).
+        """
+        entry = self._orders.get(sort_by)
+        if entry is None:
+            key = list_sort_key(None, sort_by)
+            keys = {task_id: key(task) for task_id, task in self.tasks.items()}
+            entry = self._orders[sort_by] = (key, keys, sorted(keys.values()))
+        return entry[1], entry[2]
+
+    def candidates(self, filters):
+        """Return the set of IDs passing the indexed filters, or None when there are none (every task passes).
+
+        The set may be one of the snapshot's own indexes; do not modify it.
+        """
+        sets = [self.indexes[field].get(filters[field], set()) for field in INDEXED_FILTERS if field in filters]
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return set.intersection(*sets) if len(sets) > 1 else sets[0]
+
+    def view(self, filters=None, sort_by=None):
+        """Return a TaskView of the tasks matching `filters` in `sort_by` order (the filters and sorts of list_tasks)."""
+        return TaskView(self, filters, sort_by)
+
+
+class TaskView:
+    """The tasks of a snapshot matching a set of filters, in list_tasks order.
+
+    A view holds no copy of the tasks, so it is current after every refresh of its
+    snapshot. Reading the first page walks the snapshot's sorted order, or, when
+    the indexed filters leave few candidates, picks the smallest keys among them;
+    neither touches the database.
+    """
+
+    def __init__(self, snapshot, filters=None, sort_by=None):
+        filters = dict(filters or {})
+        unsupported = set(filters) - set(INDEXED_FILTERS) - set(SCANNED_FILTERS)
+        if unsupported:
+            raise ValueError(f"watch cannot filter by {', '.join(sorted(unsupported))}")
+        self.snapshot = snapshot
+        self.filters = filters
+        self.sort_by = sort_by
+        snapshot.order(sort_by)
+        self._title = _like_pattern(filters["task_title"]) if "task_title" in filters else None
+        self._words = filters["query"].lower().split() if "query" in filters else []
+        self._count = None  # (snapshot seq, count), so unchanged frames do not rescan
+
+    def _matches(self, task):
+        # The filters the indexes do not answer
+        if self._title is not None and not self._title.fullmatch(task.title or ""):
+            return False
+        text = f"{task.title or ''} {task.description or ''}".lower() if self._words else ""
+        return all(word in text for word in self._words)
+
+    def __len__(self):
+        if self._count is None or self._count[0] != self.snapshot.seq:
+            candidates = self.snapshot.candidates(self.filters)
+            ids = self.snapshot.tasks if candidates is None else candidates
+            if self._title is None and not self._words:
+                count = len(ids)
+            else:
+                count = sum(1 for task_id in ids if self._matches(self.snapshot.tasks[task_id]))
+            self._count = (self.snapshot.seq, count)
+        return self._count[1]
+
+    def tasks(self, limit=None):
+        """Return the tasks of the view in order, the first `limit` of them if given."""
+        tasks = self.snapshot.tasks
+        keys, order = self.snapshot.order(self.sort_by)
+        candidates = self.snapshot.candidates(self.filters)
+        if candidates is not None and (limit is None or len(candidates) * 8 < len(order)):
+            matching = [keys[task_id] for task_id in candidates if self._matches(tasks[task_id])]
+            picked = sorted(matching) if limit is None else heapq.nsmallest(limit, matching)
+            return [tasks[key[-1][1]] for key in picked]
+        page = []
+        for key in order:
+            task_id = key[-1][1]
+            if (candidates is None or task_id in candidates) and self._matches(tasks[task_id]):
+                page.append(tasks[task_id])
+                if len(page) == limit:
+                    break
+        return page
+
+
+def _like_pattern(pattern):
+    # Regular expression matching what list's title filter matches with LIKE ('*' and '%' any text, '_' one character)
+    parts = (".*" if char in "*%" else "." if char == "_" else re.escape(char) for char in pattern)
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def paint_changed_lines(lines, previous, write):
+    """Write only the screen lines that differ from `previous`, addressing each by row with ANSI escapes."""
+    for row, line in enumerate(lines):
+        if row >= len(previous) or previous[row] != line:
+            write(f"\x1b[{row + 1};1H{line}\x1b[K")
+    for row in range(len(lines), len(previous)):
+        write(f"\x1b[{row + 1};1H\x1b[K")
+
+
+def _screen_lines(view, rows, width, message):
+    # Title line, column header, then as many tasks as fit
+    filters = ", ".join(f"{field}={value}" for field, value in view.filters.items()) or "none"
+    title = f"{len(view)} task(s) | filters: {filters} | sort: {view.sort_by or 'id'} | {datetime.now():%H:%M:%S}"
+    lines = [title, plain_header_line()] + [plain_task_line(task) for task in view.tasks(max(rows - 3, 0))]
+    lines.append(message)
+    return [line[:width] for line in lines]
+
+
+def _read_command(timeout):
+    """Wait up to `timeout` seconds for a line on stdin; returns it, or None when nothing was typed."""
+    try:
+        import select
+        ready, _, _ = select.select([sys.stdin], [], [], timeout)
+    except (ImportError, OSError, ValueError):
+        # No select() on this stdin (e.g. Windows consoles): refresh only
+        time.sleep(timeout)
+        return None
+    if not ready:
+        return None
+    line = sys.stdin.readline()
+    return "q" if line == "" else line.strip()
+
+
+def _apply_command(snapshot, view, command):
+    """Return the view a session command asks for (None to quit) and a message for the status line."""
+    if command in ("q", "quit"):
+        return None, ""
+    if command == "c":
+        return snapshot.view(sort_by=view.sort_by), "Filters cleared"
+    if command.startswith("/"):
+        filters = {**view.filters, "query": command[1:].strip()}
+        if not filters["query"]:
+            del filters["query"]
+        return snapshot.view(filters, view.sort_by), ""
+    name, _, argument = command.partition(" ")
+    if name == "s":
+        return snapshot.view(view.filters, argument.strip() or None), ""
+    if name == "f":
+        filters = dict(view.filters)
+        filters.update(parse_where(term) for term in argument.split(",") if term.strip())
+        return snapshot.view(filters, view.sort_by), ""
+    return view, WATCH_HELP
+
+
+# Function to keep a live view of the tasks on screen
+def watch_tasks(filters=None, sort_by=None, interval=WATCH_INTERVAL):
+    """Show the tasks matching `filters` and keep the screen current until the user quits.
+
+    Tasks are loaded once into a TaskSnapshot. Every `interval` seconds the snapshot
+    applies the changes other processes committed, and only screen lines whose text
+    changed are rewritten. Typed commands (see WATCH_HELP) re-filter and re-sort the
+    snapshot in memory, without querying the database.
+
+    :param filters: Same as list_tasks, except tag filters
+    :param sort_by: Same as list_tasks
+    :param interval: Seconds between checks for changes
+    """
+    snapshot = TaskSnapshot.load()
+    view = snapshot.view(filters, sort_by)
+    logging.info("Watching %d tasks with filters: %s", len(snapshot.tasks), filters)
+    write = sys.stdout.write
+    previous = None
+    message = WATCH_HELP
+    try:
+        while True:
+            size = shutil.get_terminal_size()
+            lines = _screen_lines(view, size.lines, size.columns, message)
+            if previous is None:
+                write("\x1b[2J")
+            paint_changed_lines(lines, previous or [], write)
+            # Leave the cursor on the command line so typed text appears there
+            write(f"\x1b[{len(lines)};{len(lines[-1]) + 1}H")
+            sys.stdout.flush()
+            previous = lines
+
+            command = _read_command(interval)
+            if command:
+                try:
+                    view, message = _apply_command(snapshot, view, command)
+                except (ValueError, argparse.ArgumentTypeError) as e:
+                    message = f"Invalid command: {e}"
+                if view is None:
+                    break
+                # The typed line scrolled or overwrote the screen, so repaint all of it
+                previous = None
+            try:
+                snapshot.refresh()
+            except sqlite3.Error as e:
+                message = f"Error refreshing tasks: {e}"
+                logging.error("Error refreshing tasks: %s", e)
+    except KeyboardInterrupt:
+        pass
+    write("\n")
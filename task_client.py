@@ -0,0 +1,18 @@
+"""Thin client for `main.py serve`.
+
+Takes the same arguments as main.py, forwards them to the running server and prints
+its output, so scripts that call the task manager in a loop skip module imports and
+database setup on every call. Runs the command locally if no server is listening.
+"""
+import sys
+
+from modules.client_handler import forward_command
+
+
+if __name__ == "__main__":
+    code = forward_command(sys.argv[1:])
+    if code is None:
+        from main import main
+        main(sys.argv[1:])
+        code = 0
+    sys.exit(code)
@@ -1,23 +1,106 @@
 # test_task_manager.py
 
+import asyncio
+import gzip
+import io
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from contextlib import redirect_stdout
+from datetime import date, datetime
 
+from modules.agenda_handler import agenda
+from modules.archive_handler import archive_completed_tasks, count_archivable
+from modules.async_handler import AsyncTaskStore
+from modules.backup_handler import backup_database, export_snapshot, restore_database, verify_backup
+from modules.cache_handler import QueryCache, list_cache, table_generation
+from modules.change_handler import compact_changes, iter_changes, latest_change_seq
+from modules.client_handler import forward_command
+from modules.connection_handler import (
+    close_all_connections,
+    get_connection,
+    get_db_path,
+    set_db_path,
+    transaction,
+)
 from modules.db_handler import (
+    CREATE_TASKS_SQL,
+    DEFAULT_PAGE_SIZE,
+    HIGHLIGHT_END,
+    HIGHLIGHT_START,
+    MIGRATIONS,
+    SCHEMA_VERSION,
     add_task,
+    add_tasks,
+    check_parent,
+    count_tasks,
     delete_task,
+    delete_tasks,
+    explain_list_query,
     fetch_task,
+    get_ancestors,
+    get_descendants,
+    get_task_tree,
     init_db,
+    iter_tasks,
     list_tasks,
+    mark_task_as_done_with_dependencies,
+    search_tasks,
+    summarize_subtrees,
+    summarize_tasks,
     update_task,
+    update_tasks,
+    update_where,
+    validate_dependencies,
+)
+from modules.dependency_handler import check_dependencies, load_dependency_graph
+from modules.display_handler import display_tasks
+from modules.import_handler import JSON_READ_SIZE, import_tasks
+from modules.profile_handler import TIMINGS_ENV, start_profiling, stop_profiling
+from modules.rank_handler import rank_tasks
+from modules.recurrence_handler import (
+    calculate_next_occurrence,
+    project_occurrences,
+    rollover_recurring_tasks,
 )
+from modules.shard_handler import ShardSet
+from modules.tag_handler import add_tags, create_tags, get_task_tags, list_tags, parse_tag_expression, remove_tags, tag_filter_sql
+from modules.task_model import Task
+from modules.watch_handler import TaskSnapshot, paint_changed_lines
+
+
+# The command-line entry point, run in subprocesses by the end-to-end tests
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def lines_of(display, *args, **kwargs):
+    # Capture what a display function prints, as a list of lines
+    output = io.StringIO()
+    with redirect_stdout(output):
+        display(*args, **kwargs)
+    return output.getvalue().splitlines()
 
 
 class TaskManagerTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        # Initialize the database for testing
+        # Initialize a throwaway database for testing
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        set_db_path(os.path.join(cls.tmpdir.name, "tasks.db"))
         init_db()
 
+    @classmethod
+    def tearDownClass(cls):
+        close_all_connections()
+        cls.tmpdir.cleanup()
+
     def setUp(self):
         # Adding sample tasks for each test
         add_task("Sample Task", "A sample description", "Work", "Medium", "To Do", "2023-12-01", "14:00", 0)
@@ -68,5 +151,921 @@ class TaskManagerTest(unittest.TestCase):
         deleted_subtask = fetch_task(subtask[0])
         self.assertIsNone(deleted_subtask, "Subtask deletion failed when parent task deleted")
 
+
+class TempDatabaseTestCase(unittest.TestCase):
+    """Base class giving each test a fresh, initialized database file."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        set_db_path(os.path.join(self.tmpdir.name, "tasks.db"))
+        init_db()
+
+    def tearDown(self):
+        close_all_connections()
+        self.tmpdir.cleanup()
+
+
+class ConnectionHandlerTest(TempDatabaseTestCase):
+    def test_connection_is_reused(self):
+        self.assertIs(get_connection(), get_connection())
+
+    def test_pragmas_applied(self):
+        conn = get_connection()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+
+    def test_failed_transaction_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with transaction() as conn:
+                conn.execute("INSERT INTO tasks (title) VALUES ('rolled back')")
+                raise RuntimeError("boom")
+        self.assertEqual(list_tasks(), [])
+
+    def test_init_db_is_read_only_when_schema_is_current(self):
+        statements = []
+        get_connection().set_trace_callback(statements.append)
+        init_db()
+        get_connection().set_trace_callback(None)
+        self.assertEqual(statements, ["PRAGMA user_version"])
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix domain sockets")
+class ServeTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.socket_path = os.path.join(self.tmpdir.name, "tm.sock")
+        db_path = os.path.join(self.tmpdir.name, "tasks.db")
+        # Run in the temporary directory, so the server's task_manager.log is written there
+        self.server = subprocess.Popen([sys.executable, MAIN_SCRIPT, "--db", db_path, "serve", "--socket", self.socket_path],
+                                       stdout=subprocess.DEVNULL, cwd=self.tmpdir.name)
+        for _ in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait()
+        super().tearDown()
+
+    def forward(self, argv, stdin=""):
+        output = io.StringIO()
+        saved_stdin, sys.stdin = sys.stdin, io.StringIO(stdin)
+        # The server runs each command in the client's working directory
+        saved_cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        try:
+            with redirect_stdout(output):
+                code = forward_command(argv, self.socket_path)
+        finally:
+            os.chdir(saved_cwd)
+            sys.stdin = saved_stdin
+        return code, output.getvalue()
+
+    def test_commands_run_in_server(self):
+        task_id = add_task("Served", None, "Work", "High", "To Do", None, None)
+        code, output = self.forward(["list"])
+        self.assertEqual(code, 0)
+        self.assertIn("Served", output)
+
+        # Prompts are answered from the client's stdin; end of input means "no"
+        self.forward(["delete", "-tid", str(task_id)], stdin="n\n")
+        self.forward(["delete", "-tid", str(task_id)])
+        self.assertIsNotNone(fetch_task(task_id))
+        code, output = self.forward(["delete", "-tid", str(task_id)], stdin="y\n")
+        self.assertIn("deleted successfully", output)
+        self.assertIsNone(fetch_task(task_id))
+
+    def test_usage_errors_return_exit_code(self):
+        self.assertEqual(self.forward(["list", "--bogus"])[0], 2)
+        self.assertIsNone(forward_command(["list"], os.path.join(self.tmpdir.name, "missing.sock")))
+
+
+class TagTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.report = add_task("Report", None, "Work", "High", "To Do", None, None)
+        self.deploy = add_task("Deploy", None, "Work", "High", "To Do", None, None)
+        self.garden = add_task("Garden", None, "Gardening", "Low", "To Do", None, None)
+        add_tags(self.report, ["urgent"])
+        add_tags(self.deploy, ["urgent", "blocked"])
+        add_tags(self.garden, ["weekend plans"])
+
+    def titles(self, expression):
+        return [task.title for task in list_tasks(filters={"tag": expression})]
+
+    def test_category_is_free_text_and_a_tag(self):
+        self.assertEqual(get_task_tags(self.garden), ["Gardening", "weekend plans"])
+        update_task(self.garden, {"category": "Home"})
+        self.assertEqual(get_task_tags(self.garden), ["Home", "weekend plans"])
+        self.assertEqual(remove_tags(self.garden, ["home", "Weekend Plans"]), 1)
+        self.assertEqual(get_task_tags(self.garden), ["Home"])
+        self.assertIn(("Work", 2), list_tags())
+
+    def test_tag_expressions(self):
+        self.assertEqual(self.titles("work AND urgent AND NOT blocked"), ["Report"])
+        self.assertEqual(self.titles("urgent NOT blocked"), ["Report"])
+        self.assertEqual(self.titles('blocked OR "weekend plans"'), ["Deploy", "Garden"])
+        self.assertEqual(self.titles("NOT (work OR unknown)"), ["Garden"])
+        self.assertEqual(self.titles("unknown AND work"), [])
+        self.assertEqual(count_tasks({"tag": "urgent", "priority": "High"}), 2)
+        for invalid in ("", "work AND", "(work", 'work "urgent', "OR work"):
+            with self.assertRaises(ValueError):
+                parse_tag_expression(invalid)
+
+    def test_evaluation_starts_from_smallest_posting_list(self):
+        blocked_id = get_connection().execute("SELECT id FROM tags WHERE name = 'blocked'").fetchone()[0]
+        sql, values = tag_filter_sql("work AND urgent AND blocked")
+        self.assertIn("FROM task_tags WHERE tag_id = ?) AS lead_1", sql)
+        self.assertEqual(values[0], blocked_id)
+        self.assertTrue(sql.startswith("tasks.id IN (SELECT"))
+        self.assertTrue(tag_filter_sql("NOT blocked")[0].startswith("NOT EXISTS"))
+
+    def test_migration_drops_category_check_and_seeds_tags(self):
+        close_all_connections()
+        set_db_path(os.path.join(self.tmpdir.name, "legacy.db"))
+        conn = get_connection()
+        conn.execute(CREATE_TASKS_SQL.replace("category TEXT,", "category TEXT CHECK(category IN ('Work', 'Home')),"))
+        for migration in MIGRATIONS[:MIGRATIONS.index(create_tags)]:
+            migration(conn)
+        conn.execute(f"PRAGMA user_version = {MIGRATIONS.index(create_tags)}")
+        for title, category in (("Old", "Work"), ("Older", "Home"), ("Gone", "Work")):
+            add_task(title, None, category, "Low", "To Do", None, None)
+        delete_task(3)
+        with self.assertRaises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO tasks (title, category) VALUES ('Bad', 'Garden')")
+
+        init_db()
+        self.assertEqual(get_task_tags(1), ["Work"])
+        self.assertEqual(self.titles("Work OR Home"), ["Old", "Older"])
+        self.assertEqual(add_task("New", None, "Garden", "Low", "To Do", None, None), 4)
+        self.assertEqual(conn.execute("PRAGMA integrity_check").fetchone()[0], "ok")
+
+
+class ShardTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shards = ShardSet.from_paths([os.path.join(self.tmpdir.name, name) for name in ("work.db", "home.db")])
+        self.shards.map(init_db)
+        fields = ("title", "description", "category", "priority", "status", "due_date", "time")
+        self.shards.run("work", add_tasks, [dict(zip(fields, row)) for row in (
+            ("Report", None, "Work", "High", "To Do", "2024-03-02", None),
+            ("Review", None, "Work", "Low", "Done", None, None))])
+        self.shards.run("home", add_tasks, [dict(zip(fields, row)) for row in (
+            ("Groceries", None, "Home", "Low", "To Do", "2024-03-01", None),
+            ("Taxes", None, "Home", "High", "To Do", "2024-03-03", None))])
+
+    def tearDown(self):
+        self.shards.close()
+        super().tearDown()
+
+    def test_list_merges_shards_in_sort_order(self):
+        tasks = self.shards.list_tasks(sort_by="due_date")
+        self.assertNotIsInstance(tasks, list)  # streamed without a limit
+        self.assertEqual([task.id for task in tasks], ["work:2", "home:1", "work:1", "home:2"])
+        self.assertEqual([task.title for task in self.shards.list_tasks(sort_by="priority,due_date", offset=3)], ["Groceries"])
+        page = self.shards.list_tasks(sort_by="priority,due_date", limit=2, offset=1)
+        self.assertEqual([task.title for task in page], ["Taxes", "Review"])
+
+    def test_unlimited_list_reads_shards_ahead_on_workers(self):
+        for name in self.shards.names:
+            self.shards.run(name, add_tasks, ({"title": f"Bulk {i}", "description": None, "category": "Work", "priority": "Low",
+                                               "status": "To Do", "due_date": None, "time": None} for i in range(DEFAULT_PAGE_SIZE * 3)))
+        self.shards.close()
+        self.assertFalse(any(thread.name.startswith("shard") for thread in threading.enumerate()))
+        tasks = self.shards.list_tasks()
+        self.assertEqual(next(tasks).id, "work:1")
+        self.assertTrue(any(thread.name.startswith("shard") for thread in threading.enumerate()))
+        self.assertEqual(sum(1 for _ in tasks), 2 * (DEFAULT_PAGE_SIZE * 3 + 2) - 1)
+
+        # Closing the shard set releases workers still reading ahead for an unfinished listing
+        tasks = self.shards.list_tasks()
+        next(tasks)
+        self.shards.close()
+        self.assertFalse(any(thread.name.startswith("shard") for thread in threading.enumerate()))
+
+    def test_sharded_commands_are_profiled(self):
+        timings = os.path.join(self.tmpdir.name, "timings.jsonl")
+        databases = [arg for path in self.shards.shards.values() for arg in ("--db", path)]
+        subprocess.run([sys.executable, MAIN_SCRIPT, *databases, "list"], cwd=self.tmpdir.name, check=True,
+                       stdout=subprocess.DEVNULL, env={**os.environ, TIMINGS_ENV: timings})
+        with open(timings, encoding="utf-8") as f:
+            record = json.loads(f.readline())
+        self.assertEqual(record["command"], "list")
+        self.assertIn("shards.map", record["phases"])
+        self.assertIn("display.tasks", record["phases"])
+        self.assertIsNone(record["sql"])
+
+    def test_search_and_summary_cover_every_shard(self):
+        self.assertEqual({task.id for task, _ in self.shards.search_tasks("report OR taxes")}, {"work:1", "home:2"})
+        summary = {entry["status"]: entry["total"] for entry in self.shards.summarize_tasks("status")}
+        self.assertEqual(summary, {"Done": 1, "To Do": 3})
+
+    def test_qualified_ids_address_one_shard(self):
+        self.assertEqual(self.shards.fetch_task("home:1").title, "Groceries")
+        self.shards.update_task("home:1", {"status": "Done"})
+        self.assertEqual(self.shards.run("home", fetch_task, 1).status, "Done")
+        self.assertEqual(self.shards.run("work", fetch_task, 1).status, "To Do")
+        with self.assertRaises(ValueError):
+            self.shards.fetch_task(1)
+
+    def test_writes_are_routed(self):
+        routed = ShardSet(self.shards.shards, routes={"Home": "home"})
+        self.assertEqual(routed.add_task("Laundry", None, "Home", "Low", "To Do", None, None), "home:3")
+        self.assertEqual(routed.add_task("Email", None, "Work", "Low", "To Do", None, None), "work:3")
+        self.assertEqual(routed.add_task("Draft", None, "Home", "Low", "To Do", None, None, parent_id="work:1"), "work:4")
+        self.assertEqual(routed.run("work", fetch_task, 4).parent_id, 1)
+
+
+class ProfileTest(TempDatabaseTestCase):
+    def test_phases_and_statements_are_timed(self):
+        add_task("Timed", "Long description " * 10, "Work", "High", "To Do", None, None)
+        profiler = start_profiling()
+        try:
+            with redirect_stdout(io.StringIO()):
+                display_tasks(list_tasks(use_cache=False))
+        finally:
+            stop_profiling()
+        summary = profiler.summary()
+        self.assertLessEqual({"connect", "db.list_tasks", "db.rows", "display.tasks"}, set(summary["phases"]))
+        self.assertEqual(summary["phases"]["db.rows"]["calls"], 1)
+        self.assertGreaterEqual(summary["sql"]["statements"], 1)
+        self.assertIn("db.list_tasks", profiler.report())
+
+        # Nothing is recorded once profiling has stopped
+        list_tasks(use_cache=False)
+        self.assertEqual(profiler.phases["db.list_tasks"][0], 1)
+
+    def test_timings_written_as_json_lines(self):
+        path = os.path.join(self.tmpdir.name, "timings.jsonl")
+        os.environ[TIMINGS_ENV] = path
+        try:
+            for _ in range(2):
+                start_profiling()
+                fetch_task(1)
+                stop_profiling("show")
+        finally:
+            del os.environ[TIMINGS_ENV]
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record["command"] for record in records], ["show", "show"])
+        self.assertIn("db.fetch_task", records[0]["phases"])
+
+
+class AgendaTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dentist = add_task("Dentist", None, "Personal", "High", "To Do", "2024-05-02", "09:30")
+        self.report = add_task("Report", None, "Work", "High", "To Do", "2024-05-01", None)
+        self.standup = add_task("Standup", None, "Work", "Low", "To Do", "2024-05-01", "10:00", recurrence="daily")
+        self.done = add_task("Filed", None, "Work", "Low", "Done", "2024-05-01", "08:00")
+
+    def entries(self, start, end, **kwargs):
+        return [(due_at, task["id"], projected) for due_at, task, projected in agenda(start, end, **kwargs)]
+
+    def test_window_merges_projected_occurrences(self):
+        self.assertEqual(self.entries("2024-05-01", "2024-05-03"), [
+            ("2024-05-01 00:00:00", self.report, False),
+            ("2024-05-01 10:00:00", self.standup, False),
+            ("2024-05-02 09:30:00", self.dentist, False),
+            ("2024-05-02 10:00:00", self.standup, True),
+        ])
+        self.assertEqual(self.entries("2024-05-01 09:00", "2024-05-01 12:00", include_done=True),
+                         [("2024-05-01 10:00:00", self.standup, False)])
+        self.assertIn(("2024-05-01 08:00:00", self.done, False), self.entries("2024-05-01", "2024-05-02", include_done=True))
+
+    def test_due_at_follows_updates(self):
+        update_task(self.dentist, {"due_date": "2024-06-01", "time": "15:00"})
+        self.assertEqual(self.entries("2024-06-01", "2024-06-02"),
+                         [("2024-06-01 10:00:00", self.standup, True), ("2024-06-01 15:00:00", self.dentist, False)])
+        plan = get_connection().execute("EXPLAIN QUERY PLAN SELECT id FROM tasks WHERE due_at >= ? AND due_at < ? "
+                                        "ORDER BY due_at, id", ("2024-06-01", "2024-06-02")).fetchall()
+        self.assertIn("idx_tasks_due_at", plan[0][3])
+
+
+class RankTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.launch = add_task("Launch", None, "Work", "Medium", "To Do", "2024-05-03", "12:00")
+        self.slides = add_task("Slides", None, "Work", "Low", "To Do", None, None, self.launch)
+        self.venue = add_task("Venue", None, "Work", "Low", "Doing", "2024-06-30", None, dependencies=f"[{self.launch}]")
+        self.taxes = add_task("Taxes", None, "Home", "High", "To Do", "2024-04-01", None)
+        self.someday = add_task("Someday", None, "Home", "High", "To Do", None, None)
+        self.filed = add_task("Filed", None, "Home", "High", "Done", "2024-04-01", None)
+
+    def counters(self, task_id):
+        return get_connection().execute("SELECT open_subtasks, open_dependents FROM tasks WHERE id = ?", (task_id,)).fetchone()
+
+    def test_counters_follow_writes(self):
+        self.assertEqual(self.counters(self.launch), (1, 1))
+        update_task(self.slides, {"status": "Done"})
+        update_task(self.venue, {"status": "Done", "dependencies": f"[{self.taxes}]"})
+        self.assertEqual(self.counters(self.launch), (0, 0))
+        self.assertEqual(self.counters(self.taxes), (0, 0))
+        update_task(self.venue, {"status": "To Do", "parent_id": self.taxes})
+        self.assertEqual(self.counters(self.taxes), (1, 1))
+        delete_task(self.venue)
+        self.assertEqual(self.counters(self.taxes), (0, 0))
+
+    def test_most_urgent_first(self):
+        as_of = datetime(2024, 5, 1, 12, 0)
+        ranked = rank_tasks(as_of=as_of)
+        # Taxes: 6 + 10 overdue + 0.5 x 30 days late; Launch: 3 + 8 x (1 - 2/14) + 0.5 + 2
+        self.assertEqual([entry["task"].title for entry in ranked], ["Taxes", "Launch", "Someday", "Venue", "Slides"])
+        self.assertAlmostEqual(ranked[0]["score"], 31.0)
+        self.assertAlmostEqual(ranked[1]["score"], 3 + 8 * 12 / 14 + 2.5)
+        self.assertEqual((ranked[1]["open_subtasks"], ranked[1]["blocking"]), (1, 1))
+        self.assertEqual([entry["task"].id for entry in rank_tasks(2, {"blocking": 40}, as_of)], [self.launch, self.taxes])
+        self.assertEqual(len(rank_tasks(2, as_of=as_of)), 2)
+        for weights in ({"urgency": 1}, {"due": -1}, {"horizon_days": 0}):
+            with self.assertRaises(ValueError):
+                rank_tasks(weights=weights)
+
+    def test_weights_scoring_overdue_below_due_soon(self):
+        # With overdue < due, the task due soon outscores the overdue one in the same segment
+        soon = add_task("Soon", None, "Home", "High", "To Do", "2024-05-02", "09:00")
+        weights = {"overdue": 0, "overdue_per_day": 0}
+        ranked = rank_tasks(1, weights, datetime(2024, 5, 1, 12, 0))
+        self.assertEqual([entry["task"].id for entry in ranked], [soon])
+        self.assertAlmostEqual(ranked[0]["score"], 6 + 8 * (1 - 0.875 / 14))
+        self.assertEqual([entry["task"].id for entry in rank_tasks(2, weights, datetime(2024, 5, 1, 12, 0))], [soon, self.launch])
+
+    def test_priority_sorts_by_urgency(self):
+        self.assertEqual([task.priority for task in list_tasks(filters={"status": "To Do"}, sort_by="priority")],
+                         ["High", "High", "Medium", "Low"])
+        self.assertEqual([task.id for task in iter_tasks(sort_by="priority,due-date", page_size=2)],
+                         [task.id for task in list_tasks(sort_by="priority,due-date")])
+
+
+class ArchiveTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.finished = add_task("Finished report", None, "Work", "High", "Done", None, None)
+        self.parent = add_task("Parent", None, "Work", "High", "Done", None, None)
+        self.open_child = add_task("Open child", None, "Work", "Low", "To Do", None, None, self.parent)
+        self.reopened = add_task("Reopened report", None, "Home", "Low", "Done", None, None)
+        update_task(self.reopened, {"status": "Doing"})
+        self.series = add_task("Weekly review", None, "Work", "Low", "Done", "2024-05-06", None, recurrence="weekly")
+
+    def test_archives_completed_trees_only(self):
+        self.assertEqual(archive_completed_tasks(older_than_days=1), 0)
+        self.assertEqual(count_archivable(0), 1)
+        self.assertEqual(archive_completed_tasks(older_than_days=0, batch_size=1), 1)
+        live = {task["id"] for task in list_tasks()}
+        self.assertEqual(live, {self.parent, self.open_child, self.reopened, self.series})
+        self.assertIsNone(fetch_task(self.finished))
+
+        # Once its subtask is done the parent goes too, together with the subtask
+        update_task(self.open_child, {"status": "Done"})
+        self.assertEqual(archive_completed_tasks(older_than_days=0), 2)
+        self.assertEqual({task["id"] for task in list_tasks()}, {self.reopened, self.series})
+
+    def test_include_archived(self):
+        archive_completed_tasks(older_than_days=0)
+        every_id = [self.finished, self.parent, self.open_child, self.reopened, self.series]
+        self.assertEqual([task["id"] for task in list_tasks(include_archived=True)], every_id)
+        self.assertEqual([task["id"] for task in iter_tasks(page_size=2, include_archived=True)], every_id)
+        self.assertEqual(sorted(task["id"] for task in list_tasks({"query": "report"}, include_archived=True)),
+                         [self.finished, self.reopened])
+        self.assertEqual([task["id"] for task, _ in search_tasks("report")], [self.reopened])
+        self.assertEqual(len(search_tasks("report", include_archived=True)), 2)
+
+
+class ChangeLogTest(TempDatabaseTestCase):
+    def test_changes_collapse_to_latest_per_task(self):
+        kept = add_task("Kept", None, "Work", "High", "To Do", None, None)
+        dropped = add_task("Dropped", None, "Home", "Low", "To Do", None, None)
+        start = latest_change_seq()
+        update_task(kept, {"status": "Doing"})
+        update_task(kept, {"status": "Done"})
+        delete_task(dropped)
+
+        changes = list(iter_changes(start))
+        self.assertEqual([(c["task_id"], c["op"]) for c in changes], [(kept, "update"), (dropped, "delete")])
+        self.assertEqual(changes[0]["task"]["status"], "Done")
+        self.assertIsNone(changes[1]["task"])
+        self.assertEqual(list(iter_changes(changes[-1]["seq"])), [])
+        self.assertEqual(len(list(iter_changes(0, limit=1))), 1)
+
+    def test_tag_edits_are_logged(self):
+        tagged = add_task("Tagged", None, "Work", "High", "To Do", None, None)
+        start = latest_change_seq()
+        self.assertEqual([c["op"] for c in iter_changes(start - 1)], ["insert"])  # the category tag is not an edit
+        add_tags(tagged, ["urgent"])
+        self.assertEqual([(c["task_id"], c["op"]) for c in iter_changes(start)], [(tagged, "update")])
+        start = latest_change_seq()
+        remove_tags(tagged, ["urgent"])
+        self.assertEqual([(c["task_id"], c["op"]) for c in iter_changes(start)], [(tagged, "update")])
+        add_tags(tagged, ["urgent"])
+        start = latest_change_seq()
+        delete_task(tagged)
+        self.assertEqual([(c["task_id"], c["op"]) for c in iter_changes(start)], [(tagged, "delete")])
+
+    def test_compaction_keeps_what_consumers_see(self):
+        task_id = add_task("Edited", None, "Work", "High", "To Do", None, None)
+        gone = add_task("Gone", None, "Work", "High", "To Do", None, None)
+        for status in ("Doing", "Done"):
+            update_task(task_id, {"status": status})
+        delete_task(gone)
+        before = list(iter_changes())
+
+        self.assertEqual(compact_changes(), 3)
+        self.assertEqual(list(iter_changes()), before)
+        self.assertEqual(compact_changes(purge_deleted=True), 1)
+        self.assertEqual([c["task_id"] for c in iter_changes()], [task_id])
+
+
+class WatchTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.report = add_task("Quarterly report", "Numbers", "Work", "Medium", "To Do", "2024-05-01", None)
+        self.taxes = add_task("Taxes", None, "Home", "High", "To Do", "2024-04-15", None)
+        self.filed = add_task("Filed", None, "Home", "Low", "Done", None, None)
+
+    def write_elsewhere(self, function, *args):
+        # data_version only moves for commits made by other connections
+        thread = threading.Thread(target=function, args=args)
+        thread.start()
+        thread.join()
+
+    def test_view_filters_and_sorts_like_list(self):
+        snapshot = TaskSnapshot.load()
+        for filters, sort_by in (({"status": "To Do"}, "priority,due-date"), ({}, "due-date"), ({"category": "Home"}, None)):
+            self.assertEqual([task.id for task in snapshot.view(filters, sort_by).tasks()],
+                             [task.id for task in list_tasks(filters=filters, sort_by=sort_by)])
+        self.assertEqual([task.id for task in snapshot.view({"task_title": "*REPORT"}).tasks()], [self.report])
+        self.assertEqual([task.id for task in snapshot.view({"query": "numbers"}).tasks()], [self.report])
+        with self.assertRaises(ValueError):
+            snapshot.view({"tag": "urgent"})
+
+    def test_refresh_applies_only_committed_changes(self):
+        snapshot = TaskSnapshot.load()
+        view = snapshot.view({"status": "To Do"}, "priority")
+        self.assertEqual(snapshot.refresh(), set())
+        self.write_elsewhere(update_task, self.filed, {"status": "To Do", "priority": "High"})
+        self.write_elsewhere(delete_task, self.taxes)
+        self.assertEqual(snapshot.refresh(), {self.filed, self.taxes})
+        self.assertEqual([task.title for task in view.tasks()], ["Filed", "Quarterly report"])
+        self.assertEqual([task.title for task in view.tasks(limit=1)], ["Filed"])
+        self.assertEqual(len(view), 2)
+        self.assertEqual(snapshot.candidates({"category": "Home"}), {self.filed})
+
+    def test_paint_rewrites_changed_lines_only(self):
+        written = []
+        paint_changed_lines(["title", "a", "b"], ["title", "a", "c", "d"], written.append)
+        self.assertEqual(written, ["\x1b[3;1Hb\x1b[K", "\x1b[4;1H\x1b[K"])
+
+
+class BackupTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.report = add_task("Quarterly report", "Numbers", "Work", "High", "To Do", "2024-05-01", "09:30")
+        self.draft = add_task("Draft", None, "Work", "Medium", "Doing", None, None, parent_id=self.report)
+        gone = add_task("Gone", None, "Home", "Low", "To Do", None, None, dependencies=json.dumps([self.report]))
+        add_tags(self.report, ["urgent"])
+        delete_task(gone)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_snapshot_round_trip_rebuilds_indexes(self):
+        expected = list_tasks(sort_by="due-date", use_cache=False)
+        snapshot = export_snapshot(self.path("tasks.jsonl.gz"))
+        self.assertEqual(snapshot["rows"]["tasks"], 2)
+        self.assertEqual(verify_backup(self.path("tasks.jsonl.gz"))["tasks"], 2)
+
+        update_task(self.report, {"status": "Done"})
+        add_task("Added later", None, "Home", "Low", "To Do", None, None)
+        generation = table_generation(get_connection())
+        self.assertEqual(restore_database(self.path("tasks.jsonl.gz")), 2)
+
+        conn = get_connection()
+        self.assertGreater(table_generation(conn), generation)
+        self.assertEqual(list_tasks(sort_by="due-date"), expected)
+        self.assertEqual([task.id for task, _ in search_tasks("numbers")], [self.report])
+        self.assertEqual(get_task_tags(self.report), ["urgent", "Work"])
+        self.assertEqual([entry["task"].id for entry in rank_tasks(5)], [self.report, self.draft])
+        self.assertEqual(conn.execute("PRAGMA integrity_check").fetchone()[0], "ok")
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        # AUTOINCREMENT carries on after the highest ID ever used, not the highest restored
+        self.assertEqual(add_task("New", None, "Home", "Low", "To Do", None, None), 4)
+
+    def test_damaged_snapshot_is_rejected_before_anything_changes(self):
+        export_snapshot(self.path("tasks.jsonl.gz"))
+        with gzip.open(self.path("tasks.jsonl.gz"), "rb") as f:
+            content = f.read()
+        with gzip.open(self.path("damaged.jsonl.gz"), "wb") as f:
+            f.write(content.replace(b"Quarterly report", b"Quarterly r3port"))
+        with gzip.open(self.path("truncated.jsonl.gz"), "wb") as f:
+            f.write(content[:content.rindex(b'{"rows"')])
+
+        add_task("Kept", None, "Home", "Low", "To Do", None, None)
+        for name in ("damaged.jsonl.gz", "truncated.jsonl.gz"):
+            with self.assertRaises(ValueError):
+                restore_database(self.path(name))
+        self.assertEqual(count_tasks(), 3)
+        self.assertEqual(os.listdir(self.tmpdir.name).count("tasks.db.restore"), 0)
+
+    def test_online_backup_restores_a_database_copy(self):
+        self.assertGreater(backup_database(self.path("backup.db"), pages=1), 0)
+        backup = verify_backup(self.path("backup.db"))
+        self.assertEqual((backup["kind"], backup["tasks"], backup["schema_version"]), ("sqlite", 2, SCHEMA_VERSION))
+
+        delete_task(self.report)
+        self.assertEqual(restore_database(self.path("backup.db")), 2)
+        self.assertEqual(fetch_task(self.draft).parent_id, self.report)
+        with self.assertRaises(ValueError):
+            verify_backup(self.path("missing.db"))
+
+
+class SummaryTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = add_task("Project", None, "Work", "High", "Doing", "2024-05-01", None)
+        step = add_task("Step", None, "Work", "Medium", "Done", "2024-05-02", "09:00", self.project)
+        add_task("Sub-step", None, "Work", "Low", "To Do", "2024-05-02", "17:00", step)
+        add_task("Errand", None, "Home", "Low", "To Do", None, None)
+
+    def test_group_counts_and_overdue(self):
+        as_of = datetime(2024, 5, 2, 12, 0)
+        by_status = {row["status"]: row for row in summarize_tasks("status", as_of=as_of)}
+        self.assertEqual({status: row["total"] for status, row in by_status.items()}, {"Doing": 1, "Done": 1, "To Do": 2})
+        # Due yesterday counts; due later today and Done tasks do not
+        self.assertEqual(by_status["Doing"]["overdue"], 1)
+        self.assertEqual(by_status["To Do"]["overdue"], 0)
+        self.assertEqual(summarize_tasks(None, as_of=datetime(2024, 5, 2, 18, 0))[0]["overdue"], 2)
+
+        work = summarize_tasks("category,priority", filters={"category": "Work"})
+        self.assertEqual([(row["category"], row["priority"]) for row in work], [("Work", "High"), ("Work", "Low"), ("Work", "Medium")])
+        self.assertEqual(summarize_tasks(None)[0]["percent_done"], 25.0)
+        with self.assertRaises(ValueError):
+            summarize_tasks("title")
+
+    def test_subtree_rollup_counts_every_level(self):
+        rollups = summarize_subtrees()
+        self.assertEqual([(row["id"], row["subtasks"], row["done"]) for row in rollups], [(self.project, 2, 1)])
+        self.assertEqual(rollups[0]["percent_done"], 50.0)
+
+
+class QueryCacheTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        list_cache.clear()
+        self.task_id = add_task("Cached", None, "Work", "High", "To Do", None, None)
+
+    def test_repeated_query_is_served_from_cache(self):
+        hits = list_cache.hits
+        first = list_tasks({"status": "To Do"}, sort_by="due-date")
+        self.assertEqual(list_tasks({"status": "To Do"}, sort_by="due_date"), first)
+        self.assertEqual(list_cache.hits, hits + 1)
+
+    def test_writes_invalidate_cached_results(self):
+        list_tasks({"status": "To Do"})
+        update_task(self.task_id, {"status": "Done"})
+        self.assertEqual(list_tasks({"status": "To Do"}), [])
+        add_tasks([{"title": "Bulk", "description": None, "category": "Home", "priority": "Low",
+                    "status": "To Do", "due_date": None, "time": None}])
+        self.assertEqual([task.title for task in list_tasks({"status": "To Do"})], ["Bulk"])
+
+    def test_write_from_another_process_invalidates(self):
+        list_tasks()
+        # A separate connection stands in for another CLI process
+        other = sqlite3.connect(get_db_path(), isolation_level=None)
+        other.execute("INSERT INTO tasks (title, category, priority, status) VALUES ('Other', 'Work', 'Low', 'To Do')")
+        other.execute("UPDATE table_generations SET generation = generation + 1 WHERE name = 'tasks'")
+        other.close()
+        self.assertEqual(len(list_tasks()), 2)
+
+    def test_cache_is_bounded(self):
+        small = QueryCache(max_entries=2, max_rows=3)
+        small.put("a", 1, [1, 2])
+        small.put("b", 1, [3])
+        small.put("c", 1, [4, 5])
+        self.assertIsNone(small.get("a", 1))
+        self.assertEqual(small.get("c", 1), (4, 5))
+        self.assertEqual(small.stats()["rows"], 3)
+        small.put("huge", 1, range(10))
+        self.assertIsNone(small.get("huge", 1))
+
+
+class AsyncTaskStoreTest(TempDatabaseTestCase):
+    def test_concurrent_writes_share_batches(self):
+        async def scenario():
+            async with AsyncTaskStore(batch_window=0.05) as store:
+                ids = await asyncio.gather(*(store.add_task(f"Task {i}", None, "Work", "Low", "To Do", None, None)
+                                             for i in range(100)))
+                await asyncio.gather(*(store.update_task(task_id, {"status": "Done"}) for task_id in ids[:10]))
+                return ids, await store.list_tasks({"status": "Done"}), await store.fetch_task(ids[-1])
+
+        ids, done, last = asyncio.run(scenario())
+        self.assertEqual(len(set(ids)), 100)
+        self.assertEqual(sorted(task.id for task in done), sorted(ids[:10]))
+        self.assertEqual(last.title, "Task 99")
+
+    def test_failed_write_is_rolled_back_alone(self):
+        def failing_write():
+            with transaction() as conn:
+                conn.execute("INSERT INTO tasks (title) VALUES ('half done')")
+                raise RuntimeError("boom")
+
+        async def scenario():
+            async with AsyncTaskStore(batch_window=0.05) as store:
+                return await asyncio.gather(store.add_task("Kept", None, "Work", "Low", "To Do", None, None),
+                                            store.write(failing_write), return_exceptions=True)
+
+        task_id, error = asyncio.run(scenario())
+        self.assertIsInstance(error, RuntimeError)
+        self.assertEqual([task.id for task in list_tasks()], [task_id])
+
+
+class TaskRecordTest(TempDatabaseTestCase):
+    def test_positional_attribute_and_key_access(self):
+        task_id = add_task("Record", "Row access", "Work", "High", "Doing", "2024-05-01", "09:30", 0)
+        task = fetch_task(task_id)
+        self.assertIsInstance(task, Task)
+        self.assertEqual((task[1], task.title, task["title"]), ("Record",) * 3)
+        self.assertEqual(task.get("missing", "default"), "default")
+        self.assertEqual({**task, "status": "Done"}["status"], "Done")
+        self.assertEqual(dict(task)["due_date"], "2024-05-01")
+        self.assertFalse(hasattr(task, "__dict__"))
+
+    def test_list_and_iter_return_records(self):
+        add_task("Record", None, "Work", "High", "Doing", None, None, 0)
+        self.assertIsInstance(list_tasks()[0], Task)
+        self.assertIsInstance(next(iter_tasks()), Task)
+
+
+class BulkOperationsTest(TempDatabaseTestCase):
+    def _sample(self, count):
+        return ({"title": f"Bulk {i}", "description": None, "category": "Work", "priority": "Low",
+                 "status": "To Do", "due_date": None, "time": None} for i in range(count))
+
+    def test_add_tasks_returns_ids(self):
+        task_ids = add_tasks(self._sample(25), chunk_size=10)
+        self.assertEqual(task_ids, list(range(1, 26)))
+        self.assertEqual(fetch_task(25)["title"], "Bulk 24")
+
+    def test_add_tasks_is_atomic(self):
+        rows = list(self._sample(3))
+        rows[2]["priority"] = "Urgent"  # violates the CHECK constraint
+        self.assertEqual(add_tasks(rows), [])
+        self.assertEqual(list_tasks(), [])
+
+    def test_update_and_delete_tasks(self):
+        task_ids = add_tasks(self._sample(4))
+        updated = update_tasks({task_ids[0]: {"status": "Done"}, task_ids[1]: {"status": "Doing", "priority": "High"}, 999: {"status": "Done"}})
+        self.assertEqual(updated, task_ids[:2])
+        self.assertEqual(fetch_task(task_ids[1])["priority"], "High")
+        self.assertEqual(delete_tasks(task_ids[2:] + [999]), task_ids[2:])
+        self.assertEqual(len(list_tasks()), 2)
+
+    def test_update_where(self):
+        task_ids = add_tasks(self._sample(4))
+        update_task(task_ids[0], {"priority": "High"})
+        update_task(task_ids[1], {"priority": "High", "category": "Home"})
+        filters = {"priority": "High", "category": "Work"}
+        self.assertEqual(count_tasks(filters), 1)
+        self.assertEqual(update_where(filters, {"status": "Doing"}), 1)
+        self.assertEqual([task["id"] for task in list_tasks(filters={"status": "Doing"})], [task_ids[0]])
+        self.assertEqual(update_where({"query": "Bulk"}, {"status": "Done"}), 4)
+        with self.assertRaises(ValueError):
+            update_where({}, {"status": "Done"})
+        with self.assertRaises(ValueError):
+            update_where(filters, {"parent_id": task_ids[1]})
+
+    def test_import_csv_in_chunks(self):
+        path = os.path.join(self.tmpdir.name, "tasks.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("title,category,priority,status,parent_id\n")
+            for i in range(7):
+                f.write(f"Imported {i},Home,Medium,To Do,\n")
+        self.assertEqual(len(import_tasks(path, chunk_size=3)), 7)
+        self.assertEqual(len(list_tasks(filters={"category": "Home"})), 7)
+
+    def test_import_checks_parents_and_dependencies(self):
+        path = os.path.join(self.tmpdir.name, "tasks.jsonl")
+
+        def write_rows(*rows):
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps({"title": "Imported", "priority": "Low", "status": "To Do", **row}) + "\n" for row in rows)
+
+        write_rows({}, {"dependencies": [1]}, {"dependencies": [999], "parent_id": 1})
+        with self.assertRaisesRegex(ValueError, "Row 3: .*999"):
+            import_tasks(path, chunk_size=1)
+        self.assertEqual(load_dependency_graph().depends_on, {2: [1]})
+        write_rows({"parent_id": 555})
+        with self.assertRaisesRegex(ValueError, "Row 1: Parent task 555"):
+            import_tasks(path)
+        self.assertEqual(count_tasks(), 2)
+
+    def test_import_streams_json_arrays(self):
+        path = os.path.join(self.tmpdir.name, "tasks.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([{"title": f"Item {i}", "description": "x" * 100, "priority": "Low", "status": "To Do"}
+                       for i in range(1000)], f, indent=1)
+        self.assertGreater(os.path.getsize(path), 2 * JSON_READ_SIZE)
+        self.assertEqual(len(import_tasks(path)), 1000)
+        self.assertEqual(fetch_task(1000).title, "Item 999")
+        for broken in ('{"title": "Not a list"}', '[{"title": "Cut off"}', '[{"title": "A"} {"title": "B"}]'):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(broken)
+            with self.assertRaises(ValueError):
+                import_tasks(path)
+
+
+class QueryPlanTest(TempDatabaseTestCase):
+    def test_schema_version_recorded(self):
+        self.assertEqual(get_connection().execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+
+    def test_filters_use_indexes(self):
+        plan = " ".join(row[2] for row in explain_list_query({"parent_id": 0, "status": "To Do"}))
+        self.assertIn("idx_tasks_parent_status", plan)
+        plan = " ".join(row[2] for row in explain_list_query(sort_by="due-date,priority"))
+        self.assertIn("idx_tasks_due_priority", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_unknown_sort_field_is_rejected(self):
+        add_task("Sortable", None, "Work", "Low", "To Do", None, None)
+        self.assertEqual(list_tasks(sort_by="id; DROP TABLE tasks"), [])
+        self.assertEqual(len(list_tasks(sort_by="due-date")), 1)
+
+
+class SearchTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.resume_id = add_task("Submit Resume", "Send CV to recruitment agencies", "Careers Related", "High", "To Do", None, None)
+        self.cv_id = add_task("Update CV", "Add the new project", "Careers Related", "Medium", "To Do", None, None)
+        add_task("Water plants", "Balcony and kitchen", "Home", "Low", "Done", None, None)
+
+    def test_search_ranks_title_matches_first(self):
+        results = search_tasks("cv")
+        self.assertEqual([task["id"] for task, _ in results], [self.cv_id, self.resume_id])
+        self.assertIn(HIGHLIGHT_START + "CV" + HIGHLIGHT_END, results[1][1])
+
+    def test_index_follows_updates_and_deletes(self):
+        update_task(self.cv_id, {"title": "Refresh portfolio", "description": None})
+        delete_task(self.resume_id)
+        self.assertEqual(search_tasks("cv"), [])
+        self.assertEqual(len(search_tasks("portfolio")), 1)
+
+    def test_query_filter_combines_with_other_filters(self):
+        tasks = list_tasks(filters={"query": "cv", "priority": "High"})
+        self.assertEqual([task["id"] for task in tasks], [self.resume_id])
+
+    def test_invalid_syntax_falls_back_to_terms(self):
+        self.assertEqual(len(search_tasks("agencies:")), 1)
+
+
+class PaginationTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        due_dates = [None, "2024-01-03", "2024-01-01", None, "2024-01-02", "2024-01-01", "2024-01-03"]
+        add_tasks({"title": f"Task {i}", "description": None, "category": "Work", "priority": "Low",
+                   "status": "To Do", "due_date": due_date, "time": None} for i, due_date in enumerate(due_dates))
+
+    def test_iter_tasks_matches_list_tasks(self):
+        for sort_by in (None, "due-date", "due-date,title", "priority,due-date"):
+            expected = [task["id"] for task in list_tasks(sort_by=sort_by)]
+            for page_size in (1, 2, 3, 100):
+                streamed = [task["id"] for task in iter_tasks(sort_by=sort_by, page_size=page_size)]
+                self.assertEqual(streamed, expected, f"sort_by={sort_by}, page_size={page_size}")
+
+    def test_limit_and_offset(self):
+        expected = [task["id"] for task in list_tasks(sort_by="due-date")][2:5]
+        self.assertEqual([task["id"] for task in list_tasks(sort_by="due-date", limit=3, offset=2)], expected)
+        self.assertEqual([task["id"] for task in iter_tasks(sort_by="due-date", limit=3, offset=2, page_size=2)], expected)
+
+    def test_display_tasks_renders_pages(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            count = display_tasks(iter_tasks(page_size=2), page_size=3)
+        self.assertEqual(count, 7)
+        # One table across pages: a single header block, and one border between rows
+        lines = output.getvalue().splitlines()
+        self.assertEqual(sum(line.startswith("| ID") for line in lines), 1)
+        self.assertEqual(sum(line.startswith("+=") for line in lines), 1)
+        self.assertTrue(lines[1].startswith("| ID"))
+        self.assertFalse(any(line.startswith("+") and following == line for line, following in zip(lines, lines[1:])))
+        self.assertEqual(len({len(line) for line in lines}), 1)
+
+    def test_streaming_formats_write_one_line_per_task(self):
+        add_task("Tab\there", "Line one\nline two", "Work", "High", "To Do", None, None)
+        # plain and tsv start with a header line
+        for output_format, extra in (("plain", 1), ("tsv", 1), ("jsonl", 0)):
+            self.assertEqual(len(lines_of(display_tasks, iter_tasks(), output_format=output_format)), 8 + extra)
+
+        self.assertIn("Tab\\there\tLine one\\nline two\t", lines_of(display_tasks, iter_tasks(), output_format="tsv")[-1])
+        record = json.loads(lines_of(display_tasks, iter_tasks(), output_format="jsonl")[-1])
+        self.assertEqual((record["title"], record["dependencies"]), ("Tab\there", "[]"))
+
+
+class DependencyGraphTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.design = add_task("Design", None, "Development", "High", "Done", None, None)
+        self.build = add_task("Build", None, "Development", "High", "To Do", None, None, dependencies=f"{self.design}")
+        self.test = add_task("Test", None, "Development", "High", "To Do", None, None, dependencies=[self.build])
+        self.docs = add_task("Docs", None, "Development", "Low", "To Do", None, None, dependencies=f"[{self.design}]")
+
+    def test_edges_follow_dependency_list(self):
+        graph = load_dependency_graph()
+        self.assertEqual(graph.depends_on[self.test], [self.build])
+        update_task(self.test, {"dependencies": f"{self.build},{self.docs}"})
+        self.assertEqual(sorted(load_dependency_graph().depends_on[self.test]), [self.build, self.docs])
+        delete_task(self.build)
+        self.assertEqual(load_dependency_graph().depends_on[self.test], [self.docs])
+
+    def test_deleting_a_dependency_releases_dependents(self):
+        update_task(self.test, {"dependencies": [self.build, self.docs]})
+        update_task(self.docs, {"status": "Done"})
+        self.assertFalse(validate_dependencies(self.test))
+        start = latest_change_seq()
+        delete_task(self.build)
+        self.assertEqual(json.loads(fetch_task(self.test).dependencies), [self.docs])
+        self.assertTrue(validate_dependencies(self.test))
+        self.assertIn(self.test, load_dependency_graph().ready_tasks())
+        self.assertEqual([(c["task_id"], c["op"]) for c in iter_changes(start)], [(self.test, "update"), (self.build, "delete")])
+
+        # Archived dependencies stay listed, and no longer block
+        archive_completed_tasks(older_than_days=0)
+        self.assertEqual(json.loads(fetch_task(self.test).dependencies), [self.docs])
+        self.assertTrue(validate_dependencies(self.test))
+
+    def test_readiness_and_topological_order(self):
+        graph = load_dependency_graph()
+        self.assertEqual(graph.ready_tasks(), [self.build, self.docs])
+        self.assertEqual(graph.topological_order(), [self.build, self.test, self.docs])
+        self.assertTrue(validate_dependencies(self.build))
+        self.assertFalse(validate_dependencies(self.test))
+        self.assertFalse(mark_task_as_done_with_dependencies(self.test))
+        self.assertTrue(mark_task_as_done_with_dependencies(self.build))
+        self.assertEqual(fetch_task(self.build).status, "Done")
+
+    def test_cycles_and_missing_tasks_are_rejected(self):
+        with self.assertRaises(ValueError):
+            check_dependencies([self.test], task_id=self.build)
+        with self.assertRaises(ValueError):
+            check_dependencies("999")
+        self.assertEqual(check_dependencies(f"{self.docs}", task_id=self.test), [self.docs])
+
+
+class HierarchyTest(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = add_task("Project", None, "Work", "High", "To Do", None, None)
+        self.phase = add_task("Phase", None, "Work", "High", "To Do", None, None, self.project)
+        self.step = add_task("Step", None, "Work", "High", "To Do", None, None, self.phase)
+        self.other = add_task("Other", None, "Work", "Low", "To Do", None, None)
+
+    def test_descendants_and_ancestors(self):
+        self.assertEqual([task.id for task in get_descendants(self.project)], [self.phase, self.step])
+        self.assertEqual([task.id for task in get_ancestors(self.step)], [self.phase, self.project])
+        tree = get_task_tree()
+        self.assertEqual([(depth, task.id) for depth, task in tree],
+                         [(0, self.project), (1, self.phase), (2, self.step), (0, self.other)])
+
+    def test_cascading_delete_removes_grandchildren(self):
+        self.assertEqual(delete_task(self.project), 3)
+        self.assertEqual([task.id for task in list_tasks()], [self.other])
+
+    def test_parent_cycles_are_rejected(self):
+        with self.assertRaises(ValueError):
+            check_parent(self.project, self.step)
+        check_parent(self.step, self.other)
+
+
+class RecurrenceTest(TempDatabaseTestCase):
+    def test_monthly_next_occurrence_handles_year_and_month_end(self):
+        self.assertEqual(calculate_next_occurrence("monthly", datetime(2024, 11, 15)), "2024-12-15")
+        self.assertEqual(calculate_next_occurrence("monthly", datetime(2024, 12, 15)), "2025-01-15")
+        self.assertEqual(calculate_next_occurrence("monthly", datetime(2024, 1, 31)), "2024-02-29")
+        self.assertIsNone(calculate_next_occurrence("none", datetime(2024, 1, 31)))
+
+    def test_projection_keeps_month_end_anchor(self):
+        dates = list(project_occurrences("monthly", "2024-01-31", "2024-02-01", limit=3))
+        self.assertEqual(dates, [date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)])
+        dates = list(project_occurrences("weekly", "2024-01-01", "2024-01-02", "2024-01-31"))
+        self.assertEqual(dates, [date(2024, 1, 8), date(2024, 1, 15), date(2024, 1, 22), date(2024, 1, 29)])
+
+    def test_rollover_is_batched_and_idempotent(self):
+        daily = add_task("Stand-up", None, "Work", "Medium", "Done", "2024-03-01", None, recurrence="daily")
+        weekly = add_task("Review", None, "Work", "Medium", "Doing", "2024-03-01", None, recurrence="weekly")
+        monthly = add_task("Rent", None, "Home", "High", "Done", "2024-01-31", None, recurrence="monthly")
+        once = add_task("One-off", None, "Home", "Low", "Done", "2024-01-01", None)
+
+        self.assertEqual(rollover_recurring_tasks("2024-03-20"), 3)
+        self.assertEqual(rollover_recurring_tasks("2024-03-20"), 0)
+        self.assertEqual([fetch_task(daily).due_date, fetch_task(daily).next_occurrence], ["2024-03-20", "2024-03-21"])
+        self.assertEqual([fetch_task(weekly).due_date, fetch_task(weekly).next_occurrence], ["2024-03-15", "2024-03-22"])
+        self.assertEqual([fetch_task(monthly).due_date, fetch_task(monthly).next_occurrence], ["2024-02-29", "2024-03-31"])
+        self.assertEqual(fetch_task(monthly).status, "To Do")
+        self.assertEqual(fetch_task(once).status, "Done")
+
+    def test_editing_due_date_restarts_series(self):
+        task_id = add_task("Rent", None, "Home", "High", "To Do", "2024-01-31", None, recurrence="monthly")
+        update_task(task_id, {"due_date": "2024-02-10"})
+        self.assertEqual(fetch_task(task_id).next_occurrence, "2024-03-10")
+
+
 if __name__ == "__main__":
     unittest.main()